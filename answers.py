@@ -0,0 +1,130 @@
+"""
+Разбор ответов пользователя на примеры.
+
+Один разбор для всех трёх попыток: текст нормализуется (пробелы
+убираются, запятая — десятичная точка, "=" — минус, как дети часто
+путают клавиши) и проверяется заранее скомпилированным регулярным
+выражением, а не исключением float(). Сообщение классифицируется (целое,
+дробное, команда, мусор) фильтром AnswerFilter до вызова обработчика,
+и обработчик получает готовый ParsedAnswer.
+
+Ответы повторяются (в основном это небольшие целые числа), поэтому
+результаты разбора коротких сообщений кэшируются.
+"""
+
+import re
+from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple
+
+from aiogram.filters import Filter
+from aiogram.types import Message
+
+# ============================================================================
+# Разбор
+# ============================================================================
+
+# Число: целое или десятичная дробь, с необязательным знаком
+_NUMBER = re.compile(r"[+-]?(?:\d+(\.\d*)?|(\.)\d+)")
+
+
+class AnswerKind(Enum):
+    """Вид сообщения в ответ на пример."""
+
+    INTEGER = "integer"
+    FLOAT = "float"
+    COMMAND = "command"
+    GARBAGE = "garbage"
+    EMPTY = "empty"
+
+
+class ParsedAnswer(NamedTuple):
+    """
+    Результат разбора ответа.
+
+    Attributes:
+        kind: Вид сообщения
+        value: Числовое значение (None, если сообщение не число)
+    """
+
+    kind: AnswerKind
+    value: int | float | None = None
+
+    @property
+    def is_number(self) -> bool:
+        """Является ли сообщение числом."""
+        return self.value is not None
+
+
+_EMPTY = ParsedAnswer(AnswerKind.EMPTY)
+_COMMAND = ParsedAnswer(AnswerKind.COMMAND)
+_GARBAGE = ParsedAnswer(AnswerKind.GARBAGE)
+
+# Сообщения длиннее этого не кэшируются (ответ на пример короче)
+_CACHED_LENGTH = 16
+
+# Сообщения длиннее этого не считаются числом без разбора
+_MAX_LENGTH = 64
+
+
+def parse_answer(text: str | None) -> ParsedAnswer:
+    """
+    Разбирает ответ пользователя.
+
+    Принимает то же, что раньше принимал float() после нормализации,
+    кроме экспоненты, подчёркиваний, "inf" и "nan" (они считаются мусором).
+
+    Args:
+        text: Текст сообщения (None — сообщение без текста)
+
+    Returns:
+        ParsedAnswer: Вид сообщения и число, если это число
+    """
+    if not text:
+        return _EMPTY
+    if len(text) <= _CACHED_LENGTH:
+        return _parse_cached(text)
+    if len(text) > _MAX_LENGTH:
+        return _COMMAND if text[0] == "/" else _GARBAGE
+    return _parse(text)
+
+
+def _parse(text: str) -> ParsedAnswer:
+    """Разбор непустого сообщения без кэша."""
+    if text[0] == "/":
+        return _COMMAND
+    # isdecimal, а не isdigit: надстрочные цифры ("²") int() не принимает
+    if text.isdecimal():
+        return ParsedAnswer(AnswerKind.INTEGER, int(text))
+    normalized: str = (
+        text.replace(" ", "").replace(",", ".").replace("=", "-").strip()
+    )
+    match: re.Match[str] | None = _NUMBER.fullmatch(normalized)
+    if match is None:
+        return _GARBAGE
+    try:
+        if match.group(1) is None and match.group(2) is None:
+            return ParsedAnswer(AnswerKind.INTEGER, int(normalized))
+        return ParsedAnswer(AnswerKind.FLOAT, float(normalized))
+    except ValueError:
+        return _GARBAGE
+
+
+_parse_cached = lru_cache(maxsize=4096)(_parse)
+
+
+# ============================================================================
+# Фильтр
+# ============================================================================
+
+
+class AnswerFilter(Filter):
+    """
+    Фильтр обработчиков ответов: разбирает сообщение один раз.
+
+    Пропускает любое сообщение и передаёт обработчику аргумент
+    parsed_answer (ParsedAnswer).
+    """
+
+    async def __call__(self, message: Message) -> dict[str, ParsedAnswer]:
+        return {"parsed_answer": parse_answer(message.text)}
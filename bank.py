@@ -0,0 +1,286 @@
+"""
+Банк всех простых примеров в файле, отображаемом в память (mmap).
+
+Простое выражение (difficulty=0) — одна операция над числами из
+конечного набора: a + b и a - b для 1..50, 10..99 × 2..9, деление нацело.
+Банк перечисляет их все заранее, а generate() выбирает пример из файла
+за O(1) вместо генерации. Файл собирается один раз:
+
+    python -m bank problems.bank
+
+и при запуске бота только отображается в память (переменная PROBLEM_BANK);
+процессы генерации разделяют одни и те же страницы файла.
+
+Примеры разбиты на разделы: по одному на сложение, вычитание и
+умножение и по одному на каждый делитель (draw_simple выбирает делитель
+равновероятно, а затем частное). Вес раздела — его вероятность в
+generate(0), внутри раздела примеры равновероятны.
+
+Формат (порядок байтов — little-endian):
+    заголовок HEADER: метка, версия, число разделов, число примеров;
+    границы разделов: uint32 × (sections + 1) — индексы первых примеров;
+    веса разделов: uint32 × sections;
+    ответы: int32 × count, внутри раздела по возрастанию;
+    смещения текстов: uint32 × (count + 1);
+    операции разделов: sections байт ("+", "-", "*", "/");
+    тексты примеров в UTF-8 подряд.
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate
+from math import lcm
+from os import getenv
+
+import gen
+from gen import enumerate_simple, render, simple_tree
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Путь к файлу банка (пусто — банк не используется)
+PROBLEM_BANK = getenv("PROBLEM_BANK", "")
+
+MAGIC = b"PBNK"
+VERSION = 1
+
+# Метка, версия, число разделов, число примеров
+HEADER = struct.Struct("<4sHHI")
+
+# Все операции простых выражений
+OPS = "+-*/"
+
+
+# ============================================================================
+# Сборка
+# ============================================================================
+
+
+def build_bank(path: str) -> int:
+    """
+    Перечисляет все простые примеры и записывает банк в файл.
+
+    Файл заменяется атомарно, поэтому работающие процессы продолжают
+    читать старую версию до перезапуска.
+
+    Args:
+        path: Путь к файлу банка
+
+    Returns:
+        int: Число примеров в банке
+    """
+    sections: dict[tuple[str, int], list[tuple[int, str]]] = {}
+    for a, op, b in enumerate_simple():
+        expr: gen.TreeExpression = simple_tree(a, op, b)
+        sections.setdefault((op, b if op == "/" else 0), []).append(
+            (expr.value, render(expr.node))
+        )
+
+    # Операция выбирается равновероятно, её вероятность делится поровну
+    # между её разделами; веса приведены к целым
+    per_op: Counter[str] = Counter(op for op, _ in sections)
+    scale: int = lcm(*per_op.values())
+
+    bounds: array = array("I", [0])
+    weights: array = array("I")
+    answers: array = array("i")
+    offsets: array = array("I", [0])
+    section_ops: bytearray = bytearray()
+    texts: bytearray = bytearray()
+    for (op, _), problems in sections.items():
+        for value, text in sorted(problems):
+            answers.append(value)
+            texts += text.encode("utf-8")
+            offsets.append(len(texts))
+        bounds.append(len(answers))
+        weights.append(scale // per_op[op])
+        section_ops += op.encode("ascii")
+
+    if sys.byteorder != "little":
+        for table in (bounds, weights, answers, offsets):
+            table.byteswap()
+
+    tmp_path: str = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(weights), len(answers)))
+        for table in (bounds, weights, answers, offsets):
+            table.tofile(f)
+        f.write(section_ops)
+        f.write(texts)
+    os.replace(tmp_path, path)
+    _LOGGER.info("Банк примеров записан в %s: %d примеров", path, len(answers))
+    return len(answers)
+
+
+# ============================================================================
+# Чтение
+# ============================================================================
+
+
+class ProblemBank:
+    """
+    Банк примеров, отображённый в память.
+
+    Выбор без фильтров повторяет распределение generate(0): операция
+    выбирается равновероятно, затем пример внутри неё. С фильтрами
+    распределение — то же, но условное (при тех же ответах и операциях).
+
+    Attributes:
+        path: Путь к файлу банка
+        count: Число примеров
+    """
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise ValueError("Problem bank requires a little-endian platform")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, sections, count = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a problem bank of version {VERSION}")
+        self.count: int = count
+
+        self._view = view = memoryview(self._mmap)
+        offset: int = HEADER.size
+        self._bounds = view[offset : offset + 4 * (sections + 1)].cast("I")
+        offset += 4 * (sections + 1)
+        self._weights = view[offset : offset + 4 * sections].cast("I")
+        offset += 4 * sections
+        self._answers = view[offset : offset + 4 * count].cast("i")
+        offset += 4 * count
+        self._offsets = view[offset : offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self._ops: str = self._mmap[offset : offset + sections].decode("ascii")
+        self._texts: int = offset + sections
+
+        # Накопленные веса для выбора раздела без фильтров
+        self._cum_weights: list[int] = list(accumulate(self._weights))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> tuple[str, int]:
+        """Пример с номером index: (выражение, ответ)."""
+        start: int = self._texts + self._offsets[index]
+        end: int = self._texts + self._offsets[index + 1]
+        return self._mmap[start:end].decode("utf-8"), self._answers[index]
+
+    def sample(
+        self,
+        rng: random.Random,
+        min_answer: int | None = None,
+        max_answer: int | None = None,
+        ops: str = OPS,
+    ) -> tuple[str, int]:
+        """
+        Выбирает случайный пример.
+
+        Без фильтров — O(1) (раздел по накопленным весам, затем пример);
+        с фильтром по ответу — двоичный поиск внутри каждого раздела.
+
+        Args:
+            rng: Источник случайных чисел
+            min_answer: Наименьший допустимый ответ
+            max_answer: Наибольший допустимый ответ
+            ops: Допустимые операции ("+-*/")
+
+        Returns:
+            tuple: (выражение, ответ)
+
+        Raises:
+            ValueError: Если под фильтры не подходит ни один пример
+        """
+        if ops == OPS and min_answer is None and max_answer is None:
+            section: int = bisect_right(
+                self._cum_weights, rng.randrange(self._cum_weights[-1])
+            )
+            first: int = self._bounds[section]
+            return self[first + rng.randrange(self._bounds[section + 1] - first)]
+
+        ranges: list[tuple[int, int]] = []
+        weights: list[float] = []
+        for section, op in enumerate(self._ops):
+            if op not in ops:
+                continue
+            lo: int = self._bounds[section]
+            hi: int = self._bounds[section + 1]
+            start: int = lo
+            end: int = hi
+            if min_answer is not None:
+                start = bisect_left(self._answers, min_answer, lo, hi)
+            if max_answer is not None:
+                end = bisect_right(self._answers, max_answer, start, hi)
+            if start < end:
+                ranges.append((start, end))
+                # Вес раздела, умноженный на долю его примеров,
+                # прошедших фильтр
+                weights.append(self._weights[section] * (end - start) / (hi - lo))
+        if not ranges:
+            raise ValueError("No problems in the bank match the filters")
+
+        start, end = rng.choices(ranges, weights)[0]
+        return self[start + rng.randrange(end - start)]
+
+    def close(self) -> None:
+        """Освобождает отображение файла."""
+        for view in (
+            self._bounds,
+            self._weights,
+            self._answers,
+            self._offsets,
+            self._view,
+        ):
+            view.release()
+        self._mmap.close()
+
+
+def install_bank(path: str = PROBLEM_BANK) -> ProblemBank | None:
+    """
+    Открывает банк и подключает его к gen.DEFAULT_GENERATOR.
+
+    Вызывается при запуске бота и в каждом процессе генерации.
+
+    Returns:
+        ProblemBank | None: Банк или None, если путь не задан
+    """
+    if not path:
+        return None
+    bank = ProblemBank(path)
+    gen.DEFAULT_GENERATOR.bank = bank
+    _LOGGER.info("Банк примеров %s подключён: %d примеров", path, bank.count)
+    return bank
+
+
+# ============================================================================
+# Точка входа
+# ============================================================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Собирает банк примеров."""
+    parser = argparse.ArgumentParser(
+        prog="python -m bank", description="Сборка банка простых примеров"
+    )
+    parser.add_argument("path", nargs="?", default=PROBLEM_BANK or "problems.bank")
+    args: argparse.Namespace = parser.parse_args(argv)
+    count: int = build_bank(args.path)
+    print(f"{args.path}: {count} problems, {os.path.getsize(args.path)} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,552 @@
+"""
+Бенчмарк генератора примеров по всем уровням сложности.
+
+Запуск:
+    python -m bench                                  # таблица в консоль
+    python -m bench --output bench_baseline.json     # сохранить базовую линию
+    python -m bench --baseline bench_baseline.json   # сравнить с ней
+    python -m bench --compare-backends               # NumPy против Python
+    python -m bench --parse-answers                  # разбор ответов
+    python -m bench --profile --levels 3 4           # профиль генерации
+    python -m bench --profile --levels-config levels.json
+
+Для каждого уровня измеряет среднее время, p50/p99 generate(d), число
+отказов и повторов, а также распределение длины выражений и величины
+ответов. Отпечаток (sha256) сгенерированных примеров при фиксированном seed
+позволяет заметить ускорение, которое незаметно изменило результат.
+Код возврата 1, если регрессия превышает порог.
+
+С --compare-backends сравнивает пакетную генерацию gen.generate_many на
+Python и NumPy: скорость и расстояние полной вариации между
+распределениями ответов и длин выражений. Для масштаба приводится то же
+расстояние между двумя выборками Python с разными seed.
+
+С --profile печатает профиль генерации (gen.profiling): попытки, отказы
+и выбранные операции по уровням дерева, долю выброшенных листьев, форму
+итоговых деревьев и диапазон ответов. --levels-config подключает файл
+настроек уровней (gen.load_level_configs), чтобы сравнить настройки.
+
+С --parse-answers измеряет разбор ответа пользователя (answers.parse_answer)
+против прежней цепочки replace() и float() на типичных ответах.
+"""
+
+import argparse
+import builtins
+import gc
+import hashlib
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import gen
+
+# ============================================================================
+# Вспомогательные функции
+# ============================================================================
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Возвращает q-й перцентиль (0..100) отсортированного списка."""
+    if not values:
+        return 0.0
+    index: int = min(len(values) - 1, int(len(values) * q / 100))
+    return values[index]
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    """Среднее, p50, p99 и максимум списка значений."""
+    ordered: list[float] = sorted(values)
+    return {
+        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+        "p50": percentile(ordered, 50),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+@contextmanager
+def timed(names: list[str], totals: dict[str, float]) -> Iterator[None]:
+    """
+    Временно оборачивает функции модуля gen, накапливая время их вызовов.
+
+    Функции вызываются внутри gen через глобальные имена модуля, поэтому
+    подмены атрибута достаточно; встроенный eval перекрывается так же.
+    Время включающее: вложенные вызовы входят в время внешней функции.
+    """
+    originals: dict[str, Any] = {}
+    for name in names:
+        original: Callable[..., Any] = gen.__dict__.get(name) or getattr(
+            builtins, name
+        )
+        originals[name] = gen.__dict__.get(name)
+
+        def wrapper(
+            *args: Any, _f: Callable[..., Any] = original, _n: str = name, **kwargs: Any
+        ) -> Any:
+            start: float = time.perf_counter()
+            try:
+                return _f(*args, **kwargs)
+            finally:
+                totals[_n] = totals.get(_n, 0.0) + time.perf_counter() - start
+
+        setattr(gen, name, wrapper)
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            if original is None:
+                delattr(gen, name)
+            else:
+                setattr(gen, name, original)
+
+
+# ============================================================================
+# Измерения
+# ============================================================================
+
+# Функции, время которых выделяется отдельно для каждого движка
+BREAKDOWN: dict[str, list[str]] = {
+    "legacy": ["combine_expressions", "check_intermediate_results", "eval"],
+    "tree": ["combine_trees", "generate_simple_tree", "render"],
+}
+
+ENGINES: dict[str, Callable[[int], tuple[str, int]]] = {
+    "legacy": gen.generate_legacy,
+    "tree": gen.generate,
+}
+
+
+def bench_level(
+    engine: str, difficulty: int, samples: int, seed: int
+) -> dict[str, Any]:
+    """
+    Измеряет генерацию samples примеров одного уровня сложности.
+
+    Returns:
+        dict: Время (мкс), счётчики отказов, распределения и отпечаток вывода
+    """
+    generate: Callable[[int], tuple[str, int]] = ENGINES[engine]
+
+    # Прогрев: первые вызовы заметно медленнее и искажают p99
+    for _ in range(min(samples, 50)):
+        generate(difficulty)
+    gc.collect()
+
+    random.seed(seed)
+    stats: gen.SamplingStats = gen.thread_stats()
+    stats.reset()
+
+    times: list[float] = []
+    digest = hashlib.sha256()
+    lengths: list[float] = []
+    answers: list[float] = []
+    magnitudes: Counter[int] = Counter()
+    for _ in range(samples):
+        start: float = time.perf_counter()
+        expression, answer = generate(difficulty)
+        times.append((time.perf_counter() - start) * 1e6)
+
+        digest.update(f"{expression}={answer}\n".encode())
+        lengths.append(len(expression))
+        answers.append(answer)
+        magnitudes[len(str(answer))] += 1
+
+    return {
+        "time_us": summarize(times),
+        "rejections": sum(stats.rejections.values()),
+        "fallbacks": sum(stats.fallbacks.values()),
+        "retries": sum(stats.retries.values()),
+        "length": summarize(lengths),
+        "answer": summarize(answers),
+        "answer_digits": {str(k): v for k, v in sorted(magnitudes.items())},
+        "digest": digest.hexdigest(),
+    }
+
+
+def bench_breakdown(
+    engine: str, difficulty: int, samples: int, seed: int
+) -> dict[str, float]:
+    """
+    Доля времени generate, проведённая в ключевых функциях движка.
+
+    Returns:
+        dict: {имя_функции: доля от общего времени}
+    """
+    generate: Callable[[int], tuple[str, int]] = ENGINES[engine]
+    random.seed(seed)
+    totals: dict[str, float] = {}
+    with timed(BREAKDOWN[engine], totals):
+        start: float = time.perf_counter()
+        for _ in range(samples):
+            generate(difficulty)
+        total: float = time.perf_counter() - start
+    return {name: totals.get(name, 0.0) / total for name in BREAKDOWN[engine]}
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    """Прогоняет бенчмарк по всем запрошенным уровням."""
+    results: dict[str, Any] = {
+        "engine": args.engine,
+        "samples": args.samples,
+        "seed": args.seed,
+        "python": sys.version.split()[0],
+        "levels": {},
+    }
+    for difficulty in args.levels:
+        level: dict[str, Any] = bench_level(
+            args.engine, difficulty, args.samples, args.seed
+        )
+        if args.breakdown:
+            level["breakdown"] = bench_breakdown(
+                args.engine,
+                difficulty,
+                max(args.samples // 10, 1),
+                args.seed,
+            )
+        results["levels"][str(difficulty)] = level
+    return results
+
+
+# ============================================================================
+# Сравнение backend'ов
+# ============================================================================
+
+
+def total_variation(x: list[Any], y: list[Any]) -> float:
+    """Расстояние полной вариации между эмпирическими распределениями."""
+    cx: Counter[Any] = Counter(x)
+    cy: Counter[Any] = Counter(y)
+    keys: set[Any] = cx.keys() | cy.keys()
+    return sum(abs(cx[k] / len(x) - cy[k] / len(y)) for k in keys) / 2
+
+
+def bench_backends(difficulty: int, samples: int, seed: int) -> dict[str, Any]:
+    """
+    Сравнивает generate_many на Python и NumPy для одного уровня.
+
+    Returns:
+        dict: Скорость (примеров в секунду) и расстояния между распределениями
+    """
+    samples_by_backend: dict[str, tuple[list[str], list[int]]] = {}
+    rates: dict[str, float] = {}
+    for backend in ("python", "numpy"):
+        # Прогрев: у NumPy первый вызов строит таблицу текстов выражений
+        gen.generate_many(difficulty, 100, seed=seed, backend=backend)
+        start: float = time.perf_counter()
+        expressions, answers = gen.generate_many(
+            difficulty, samples, seed=seed, compact=True, backend=backend
+        )
+        rates[backend] = samples / (time.perf_counter() - start)
+        samples_by_backend[backend] = (expressions, answers.tolist())
+
+    # Две независимые выборки одного backend'а: масштаб случайного расхождения
+    reference, reference_answers = gen.generate_many(
+        difficulty, samples, seed=seed + 1, compact=True
+    )
+    expressions, answers = samples_by_backend["python"]
+    numpy_expressions, numpy_answers = samples_by_backend["numpy"]
+    return {
+        "rate": rates,
+        "speedup": rates["numpy"] / rates["python"],
+        "tv_answer": total_variation(answers, numpy_answers),
+        "tv_answer_ref": total_variation(answers, reference_answers.tolist()),
+        "tv_length": total_variation(
+            [len(e) for e in expressions], [len(e) for e in numpy_expressions]
+        ),
+        "tv_length_ref": total_variation(
+            [len(e) for e in expressions], [len(e) for e in reference]
+        ),
+    }
+
+
+def print_backends(results: dict[str, dict[str, Any]]) -> None:
+    """Печатает таблицу сравнения backend'ов."""
+    print(
+        f"{'lvl':>3} {'python/s':>10} {'numpy/s':>10} {'speedup':>8} "
+        f"{'tv ans':>7} {'ref':>6} {'tv len':>7} {'ref':>6}"
+    )
+    for difficulty, level in results.items():
+        print(
+            f"{difficulty:>3} {level['rate']['python']:>10.0f} "
+            f"{level['rate']['numpy']:>10.0f} {level['speedup']:>7.1f}x "
+            f"{level['tv_answer']:>7.4f} {level['tv_answer_ref']:>6.4f} "
+            f"{level['tv_length']:>7.4f} {level['tv_length_ref']:>6.4f}"
+        )
+
+
+def bench_profile(difficulty: int, samples: int, seed: int) -> dict[str, Any]:
+    """
+    Профиль генерации samples примеров одного уровня.
+
+    Returns:
+        dict: Сводка gen.GenerationProfile и время на пример (мкс)
+    """
+    with gen.profiling() as profile:
+        start: float = time.perf_counter()
+        gen.generate_many(difficulty, samples, seed=seed, compact=True)
+        elapsed: float = time.perf_counter() - start
+    summary: dict[str, Any] = profile.summary()[difficulty]
+    summary["time_us"] = elapsed / samples * 1e6
+    return summary
+
+
+def print_profile(results: dict[str, dict[str, Any]]) -> None:
+    """Печатает профиль генерации по уровням сложности."""
+    for difficulty, level in results.items():
+        print(
+            f"difficulty {difficulty}: {level['time_us']:.0f} us/problem, "
+            f"leaves drawn {level['leaves_drawn']:.1f}, "
+            f"kept {level['leaves_kept']:.1f} "
+            f"(wasted {level['wasted']:.0%}), retries {level['retries']}, "
+            f"root fallbacks {level['root_fallbacks']}"
+        )
+        print(
+            f"  shape: height mean {level['height_mean']:.1f} "
+            f"max {level['height_max']}, leaves max {level['leaves_max']}, "
+            f"parens mean {level['parens_mean']:.1f}; answer "
+            f"{level['answer_min']}..{level['answer_max']} "
+            f"(p50 {level['answer_p50']})"
+        )
+        for tree_level, row in level["tree"].items():
+            chosen: dict[str, int] = row["ops"]
+            total: int = sum(chosen.values()) or 1
+            ops: str = " ".join(f"{op}{n / total:.0%}" for op, n in chosen.items())
+            print(
+                f"  level {tree_level}: attempts {row['attempts']}, "
+                f"fallbacks {row['fallbacks']}, ops {ops}"
+            )
+
+
+# Типичные сообщения в ответ на пример
+ANSWER_SAMPLES: dict[str, str] = {
+    "integer": "42",
+    "spaces": " 1 2 0 ",
+    "float": "3,5",
+    "negative": "=7",
+    "garbage": "не знаю",
+    "command": "/help",
+}
+
+
+def _legacy_parse(text: str) -> float | None:
+    """Разбор ответа, как в обработчиках до answers.parse_answer."""
+    try:
+        return float(text.replace(" ", "").replace(",", ".").replace("=", "-"))
+    except (ValueError, TypeError):
+        return None
+
+
+def bench_answers(samples: int) -> dict[str, dict[str, float]]:
+    """
+    Время разбора одного ответа, наносекунды, по видам сообщений.
+
+    parse_answer кэширует короткие сообщения, поэтому отдельно измеряется
+    разбор без кэша (первое появление сообщения).
+
+    Returns:
+        dict: Вид сообщения → {"legacy": ..., "uncached": ..., "parse_answer": ...}
+    """
+    from answers import _parse, parse_answer
+
+    funcs: dict[str, Callable[[str], Any]] = {
+        "legacy": _legacy_parse,
+        "uncached": _parse,
+        "parse_answer": parse_answer,
+    }
+    results: dict[str, dict[str, float]] = {}
+    for name, text in ANSWER_SAMPLES.items():
+        results[name] = {}
+        for label, func in funcs.items():
+            start: float = time.perf_counter()
+            for _ in range(samples):
+                func(text)
+            results[name][label] = (time.perf_counter() - start) / samples * 1e9
+    return results
+
+
+def print_answers(results: dict[str, dict[str, float]]) -> None:
+    """Печатает таблицу разбора ответов."""
+    print(
+        f"{'input':<10} {'legacy ns':>10} {'uncached ns':>12} {'parse ns':>10} "
+        f"{'speedup':>8}"
+    )
+    for name, row in results.items():
+        print(
+            f"{name:<10} {row['legacy']:>10.0f} {row['uncached']:>12.0f} "
+            f"{row['parse_answer']:>10.0f} "
+            f"{row['legacy'] / row['parse_answer']:>7.1f}x"
+        )
+
+
+# ============================================================================
+# Сравнение с базовой линией
+# ============================================================================
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[str]:
+    """
+    Сравнивает результаты с базовой линией.
+
+    Returns:
+        list: Описания регрессий (пустой список — регрессий нет)
+    """
+    problems: list[str] = []
+    same_run: bool = (
+        results["seed"] == baseline.get("seed")
+        and results["samples"] == baseline.get("samples")
+    )
+    for difficulty, level in results["levels"].items():
+        base: dict[str, Any] | None = baseline.get("levels", {}).get(difficulty)
+        if base is None:
+            continue
+        for metric in ("mean", "p99"):
+            new: float = level["time_us"][metric]
+            old: float = base["time_us"][metric]
+            if old and new > old * (1 + threshold):
+                problems.append(
+                    f"level {difficulty}: {metric} {old:.1f}us -> {new:.1f}us "
+                    f"(+{(new / old - 1) * 100:.0f}%)"
+                )
+        if same_run and level["digest"] != base.get("digest"):
+            problems.append(f"level {difficulty}: generated output changed")
+    return problems
+
+
+def print_table(results: dict[str, Any]) -> None:
+    """Печатает сводную таблицу результатов."""
+    print(
+        f"engine={results['engine']} samples={results['samples']} "
+        f"seed={results['seed']}"
+    )
+    print(
+        f"{'lvl':>3} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} "
+        f"{'reject':>7} {'retry':>6} {'len p50':>7} {'ans p50':>7} {'ans max':>8}"
+    )
+    for difficulty, level in results["levels"].items():
+        t: dict[str, float] = level["time_us"]
+        print(
+            f"{difficulty:>3} {t['mean']:>9.1f} {t['p50']:>9.1f} {t['p99']:>9.1f} "
+            f"{level['rejections']:>7} {level['retries']:>6} "
+            f"{level['length']['p50']:>7.0f} {level['answer']['p50']:>7.0f} "
+            f"{level['answer']['max']:>8.0f}"
+        )
+        if "breakdown" in level:
+            shares: str = ", ".join(
+                f"{name} {share * 100:.0f}%"
+                for name, share in level["breakdown"].items()
+            )
+            print(f"{'':>3} {shares}")
+
+
+# ============================================================================
+# Точка входа
+# ============================================================================
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        prog="python -m bench", description="Бенчмарк генератора примеров"
+    )
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="tree")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--levels",
+        type=int,
+        nargs="+",
+        default=list(range(gen.MAX_DIFICULTY + 1)),
+    )
+    parser.add_argument(
+        "--no-breakdown", dest="breakdown", action="store_false",
+        help="не измерять доли времени по функциям",
+    )
+    parser.add_argument("--output", help="записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON базовой линии для сравнения")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25,
+        help="допустимый рост mean/p99 относительно базовой линии (0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--allow-output-change", action="store_true",
+        help="не считать регрессией изменение сгенерированных примеров",
+    )
+    parser.add_argument(
+        "--compare-backends", action="store_true",
+        help="сравнить generate_many на Python и NumPy (нужен numpy)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="профиль генерации: отказы, операции, форма деревьев, ответы",
+    )
+    parser.add_argument(
+        "--levels-config",
+        help="JSON с настройками уровней (см. gen.load_level_configs)",
+    )
+    parser.add_argument(
+        "--parse-answers", action="store_true",
+        help="измерить разбор ответов пользователя",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Запускает бенчмарк и возвращает код возврата."""
+    args: argparse.Namespace = parse_args(argv)
+    logging.disable(logging.INFO)
+
+    if args.levels_config:
+        gen.level_configs().update(gen.load_level_configs(args.levels_config))
+
+    if args.profile:
+        profile_results: dict[str, dict[str, Any]] = {
+            str(d): bench_profile(d, args.samples, args.seed) for d in args.levels
+        }
+        print_profile(profile_results)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(profile_results, f, ensure_ascii=False, indent=2)
+        return 0
+
+    if args.parse_answers:
+        print_answers(bench_answers(max(args.samples, 100_000)))
+        return 0
+
+    if args.compare_backends:
+        print_backends(
+            {
+                str(d): bench_backends(d, args.samples, args.seed)
+                for d in args.levels
+            }
+        )
+        return 0
+
+    results: dict[str, Any] = run(args)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline: dict[str, Any] = json.load(f)
+    problems: list[str] = compare(results, baseline, args.threshold)
+    if args.allow_output_change:
+        problems = [p for p in problems if not p.endswith("output changed")]
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
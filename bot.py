@@ -3,592 +3,247 @@ Telegram бот для тренировки устного счёта у уче
 
 Бот генерирует математические примеры с адаптивной сложностью,
 предоставляет три попытки на каждый пример и систему баллов.
+
+Импорт модуля не имеет побочных эффектов и не загружает aiogram и redis:
+логирование, хранилище, диспетчер и фоновые компоненты создаются в
+create_app(), а тяжёлые модули импортируются там же. Поэтому процессы,
+которым нужен только генератор (например, рабочие процессы пула,
+запущенные через spawn и заново импортирующие главный модуль),
+стартуют быстро. Замер холодного старта: python -m coldstart.
 """
 
 import asyncio
 import logging
-from itertools import repeat
+from functools import partial
 from os import getenv
-from typing import TypedDict, cast
-
-from aiogram import Bot, Dispatcher, F, types
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
-from aiogram.filters import Command, CommandStart
-from aiogram.fsm.context import FSMContext
-from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage
-from aiogram.methods import SendMessage
-from aiogram.types import BufferedInputFile, Message, User
-from aiogram.utils.markdown import hbold
-
-from gen import generate
-from redis_handlers import init_redis
-from states import UserStates
+from typing import TYPE_CHECKING, NamedTuple
 
-# ============================================================================
-# Конфигурация логирования
-# ============================================================================
+if TYPE_CHECKING:
+    from aiogram import Dispatcher
 
-LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
-logging.basicConfig(
-    level=LOG_LEVEL,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
-)
 _LOGGER = logging.getLogger(__name__)
 
 # ============================================================================
-# Типизация данных пользователя
+# Конфигурация
 # ============================================================================
 
 
-class UserData(TypedDict):
+class Config(NamedTuple):
     """
-    Структура данных, сохраняемых в FSM для каждого пользователя.
+    Настройки запуска бота.
 
     Attributes:
-        difficulty: Уровень сложности (0-4, инвертированная шкала: 0=сложный, 4=простой)
-        points: Количество баллов пользователя (0-49, влияет на сложность)
-        expression: Текущее математическое выражение
-        answer: Правильный ответ на текущий пример
-        user_name: Полное имя пользователя из Telegram
-    """
-
-    difficulty: int
-    points: int
-    expression: str
-    answer: int
-    user_name: str
-
-
-# ============================================================================
-# Инициализация бота и диспетчера
-# ============================================================================
-
-TOKEN_API = getenv("TOKEN_API_BOT")
-
-# Инициализация хранилища: Redis с fallback на MemoryStorage
-try:
-    storage: RedisStorage | MemoryStorage = init_redis()
-except Exception as e:
-    _LOGGER.error(f"Redis initialization failed: {e}")
-    storage = MemoryStorage()
-    _LOGGER.warning("Using MemoryStorage instead of Redis")
-
-dp = Dispatcher(storage=storage)
-
-
-# ============================================================================
-# Вспомогательные функции
-# ============================================================================
-
-
-async def message_answer(message: Message, text: str) -> Message:
-    """
-    Отправляет сообщение пользователю.
-
-    Обёртка для асинхронного отправления сообщений.
-
-    Args:
-        message: Объект сообщения от пользователя
-        text: Текст для отправки
-
-    Returns:
-        Отправленное сообщение
-    """
-    return await message.answer(text)
-
-
-async def add_points(state: FSMContext) -> None:
-    """
-    Увеличивает количество баллов пользователя на 1.
-
-    Баллы ограничены диапазоном [0, 49]. При достижении каждого следующего
-    уровня сложности (каждые 10 баллов) уровень сложности увеличивается.
-
-    Args:
-        state: Контекст состояния FSM пользователя
-    """
-    try:
-        data: UserData = cast(UserData, await state.get_data())
-        points: int = data.get("points", 0)
-        user_name: str = data.get("user_name", "Unknown")
-
-        # Увеличиваем баллы с ограничением
-        points += 1
-        points = min(points, 49)
-        points = max(points, 0)
-
-        # Пересчитываем уровень сложности
-        difficulty: int = points // 10
-
-        _LOGGER.info(
-            f"Пользователь {user_name} справился и получил {points} баллов."
-        )
-
-        # Используем asyncio.create_task для неблокирующего обновления
-        asyncio.create_task(
-            state.update_data(difficulty=difficulty, points=points)
+        token: Токен бота от @BotFather
+        mode: Режим получения обновлений: "polling", "webhook" (см. webhook.py)
+            или "sharded" (несколько процессов, см. shards.py)
+        redis: Адрес Redis (None — MemoryStorage, см. redis_handlers.init_redis)
+        log_level: Уровень логирования
+    """
+
+    token: str | None = None
+    mode: str = "polling"
+    redis: str | None = None
+    log_level: str = "INFO"
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        """Читает настройки из переменных окружения."""
+        return cls(
+            token=getenv("TOKEN_API_BOT"),
+            mode=getenv("BOT_MODE", "polling"),
+            redis=getenv("REDIS") or None,
+            log_level=getenv("LOG_LEVEL", "INFO"),
         )
-    except Exception as e:
-        _LOGGER.error(f"Ошибка при добавлении баллов: {e}")
-        # Сбрасываем в дефолтные значения при ошибке
-        asyncio.create_task(state.update_data(difficulty=0, points=0))
 
 
-async def subtract_points(state: FSMContext) -> None:
+def setup_logging(level: str) -> None:
     """
-    Уменьшает количество баллов пользователя на 1.
-
-    Баллы ограничены диапазоном [0, 49]. При уменьшении баллов уровень
-    сложности может понизиться.
+    Настраивает вывод логов в консоль.
 
-    Args:
-        state: Контекст состояния FSM пользователя
+    Записи передаются через очередь в отдельный поток, поэтому вывод
+    не задерживает обработку обновлений (формат и выборка — см. logs.py).
     """
-    try:
-        data: UserData = cast(UserData, await state.get_data())
-        points: int = data.get("points", 1)
-        user_name: str = data.get("user_name", "Unknown")
-
-        # Уменьшаем баллы с ограничением
-        points -= 1
-        points = min(points, 49)
-        points = max(points, 0)
-
-        # Пересчитываем уровень сложности
-        difficulty: int = points // 10
-
-        _LOGGER.info(
-            f"Пользователь {user_name} не справился и получил {points} баллов."
-        )
-
-        # Используем asyncio.create_task для неблокирующего обновления
-        asyncio.create_task(
-            state.update_data(difficulty=difficulty, points=points)
-        )
-    except Exception as e:
-        _LOGGER.error(f"Ошибка при вычитании баллов: {e}")
-        # Сбрасываем в дефолтные значения при ошибке
-        asyncio.create_task(state.update_data(difficulty=0, points=0))
-
-
-async def get_new_task(message: Message, state: FSMContext) -> None:
-    """
-    Генерирует и отправляет пользователю новый математический пример.
-
-    Функция генерирует пример в соответствии с текущим уровнем сложности,
-    сохраняет его в состояние пользователя и отправляет сообщение с примером.
-
-    Args:
-        message: Объект сообщения от пользователя
-        state: Контекст состояния FSM пользователя
-    """
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
-
-    data: UserData = cast(UserData, await state.get_data())
-    difficulty: int = data.get("difficulty", 0)
-
-    # Генерируем новый пример
-    expression: str
-    answer: int
-    expression, answer = generate(difficulty)
-
-    # Сохраняем данные о примере в состоянии
-    asyncio.create_task(
-        state.update_data(
-            expression=expression,
-            answer=answer,
-            user_name=user.full_name,
-        )
-    )
-
-    # Отправляем сообщение с примером
-    asyncio.create_task(
-        message_answer(
-            message,
-            "🔔 Внимание-внимание! Новый примерчик! 🔔\n"
-            f"<code>{expression}</code>\n"
-            "Скорее пиши ответ! ⏱️",
-        )
-    )
+    from logs import setup_logging as setup_queue_logging
 
-    # Переводим пользователя в состояние ожидания первого ответа
-    asyncio.create_task(state.set_state(UserStates.await_1_answer))
+    setup_queue_logging(level)
 
 
 # ============================================================================
-# Обработчики команд
+# Сборка приложения
 # ============================================================================
 
 
-@dp.message(CommandStart())
-async def start_handler(message: Message, state: FSMContext) -> None:
+def create_app(config: Config) -> "Dispatcher":
     """
-    Обработчик команды /start.
+    Собирает диспетчер со всеми обработчиками и фоновыми компонентами.
 
-    Приветствует пользователя (нового или возвращающегося) и начинает игру.
-    Для новых пользователей выводит приветственное сообщение,
-    для возвращающихся - информацию о текущем прогрессе.
+    Соединения не открываются: Redis, пул примеров, планировщик отправки
+    и сервер метрик запускаются в обработчиках startup диспетчера.
 
     Args:
-        message: Объект сообщения с командой /start
-        state: Контекст состояния FSM пользователя
-    """
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
+        config: Настройки запуска
 
-    data: UserData = cast(UserData, await state.get_data())
-    difficulty: int | None = data.get("difficulty")
-
-    if difficulty is None:
-        # Новый пользователь
-        await message_answer(
-            message,
-            f"Приветик, {hbold(user.full_name)}! 🌟\n"
-            "Я твой весёлый помощник в мире вычислений! 🚀\n\n"
-            "Давай начнём с простеньких примеров, а если ты будешь щёлкать их как орешки, "
-            "я подкину тебе задачки посложнее! 😉\n"
-            "Со мной будешь суперзвездой математики! 💫",
-        )
-        asyncio.create_task(state.update_data(difficulty=0))
-        _LOGGER.info(f"Новый пользователь: {user.full_name}, id: {user.id}")
+    Returns:
+        Dispatcher: Диспетчер; пул примеров доступен как dp["problem_pool"]
+
+    Raises:
+        ValueError: Если адрес Redis некорректен
+    """
+    from aiogram import Dispatcher
+    from aiogram.fsm.storage.base import BaseStorage
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    from bank import install_bank
+    from cache import FSM_CACHE_SIZE, CachedStorage
+    from handlers import router
+    from logs import queue_handler
+    from metrics import (
+        HandlerMetricsMiddleware,
+        MetricsServer,
+        register_logging,
+        register_ordering,
+        register_pool,
+        register_sender,
+    )
+    from ordering import KeyedEventIsolation
+    from pool import ProblemPool
+    from redis_handlers import ClusterStorage, init_redis, wait_for_redis
+    from replies import ReplyMiddleware
+    from sender import SendScheduler
+    from session import setup_sessions
+    from workers import GenerationExecutor
+
+    # Инициализация хранилища: Redis, а без адреса Redis — MemoryStorage.
+    # Ошибка в адресе Redis останавливает бот, а недоступный при запуске Redis
+    # ожидается с повторными попытками (см. wait_for_redis)
+    redis_storage: RedisStorage | None = None
+    if config.redis:
+        redis_storage = init_redis(config.redis)
+        storage: BaseStorage = redis_storage
     else:
-        # Возвращающийся пользователь
-        await message_answer(
-            message,
-            f"Снова здравствуй, {hbold(user.full_name)}! 🌈\n"
-            f"Сейчас мы с тобой на уровне сложности: {difficulty} ⚡️",
-        )
-        _LOGGER.info(f"Повторный запуск: {user.full_name}, id: {user.id}")
-
-    # Обновляем имя пользователя и начинаем игру
-    asyncio.create_task(state.update_data(user_name=user.full_name))
-    asyncio.create_task(get_new_task(message, state))
-
-
-@dp.message(Command("stop"))
-async def stop_handler(message: Message, state: FSMContext) -> None:
-    """
-    Обработчик команды /stop.
-
-    Очищает состояние пользователя и отправляет прощальное сообщение.
-
-    Args:
-        message: Объект сообщения с командой /stop
-        state: Контекст состояния FSM пользователя
-    """
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
-
-    try:
-        await state.clear()
-    finally:
-        asyncio.create_task(
-            message_answer(
-                message,
-                f"Пока-пока, {hbold(user.full_name)}! 👋\n"
-                "Я бережно записываю твои успехи... шучу, забыл всё! 🤫\n"
-                "Возвращайся скорее, будем играть ещё! 🎮",
-            )
-        )
-        _LOGGER.info(f"Пользователь {user.full_name} завершил работу с ботом")
+        _LOGGER.warning("REDIS is not set, using MemoryStorage instead of Redis")
+        storage = MemoryStorage()
+
+    # Кэш записей активных пользователей перед Redis (FSM_CACHE_SIZE=0 — без кэша).
+    # В Redis Cluster недоступна подписка на канал инвалидации
+    if (
+        redis_storage is not None
+        and not isinstance(redis_storage, ClusterStorage)
+        and FSM_CACHE_SIZE > 0
+    ):
+        storage = CachedStorage(redis_storage)
+
+    # Обновления одного пользователя обрабатываются по очереди, разных — параллельно
+    events_isolation = KeyedEventIsolation()
+    dp = Dispatcher(storage=storage, events_isolation=events_isolation)
+    if redis_storage is not None:
+        dp.startup.register(partial(wait_for_redis, redis_storage))
+    if isinstance(storage, CachedStorage):
+        dp.startup.register(storage.start)
+        dp.shutdown.register(storage.stop)
+
+    # Одно чтение и одна атомарная запись FSM на обновление
+    setup_sessions(dp)
+
+    # Простые примеры выбираются из заранее собранного банка (см. PROBLEM_BANK)
+    install_bank()
+
+    # Пул готовых примеров: генерация вынесена из обработчиков
+    # (в основном процессе или в пуле процессов, см. GEN_EXECUTOR)
+    generation_executor = GenerationExecutor()
+    problem_pool = ProblemPool(executor=generation_executor)
+    dp["problem_pool"] = problem_pool
+    dp.startup.register(generation_executor.start)
+    dp.startup.register(problem_pool.start)
+    dp.shutdown.register(problem_pool.stop)
+    dp.shutdown.register(generation_executor.stop)
+
+    # Метрики обработчиков, генерации и хранилища (см. METRICS_PORT)
+    dp.message.middleware(HandlerMetricsMiddleware())
+
+    # Ответы на одно сообщение отправляются после обработчика одним пакетом
+    # через планировщик с лимитами Telegram (общим и на каждый чат)
+    send_scheduler = SendScheduler()
+    dp.message.middleware(ReplyMiddleware(send_scheduler))
+    register_sender(send_scheduler)
+    dp.startup.register(send_scheduler.start)
+    dp.shutdown.register(send_scheduler.stop)
+    register_pool(problem_pool)
+    register_ordering(events_isolation)
+    log_handler = queue_handler()
+    if log_handler is not None:
+        register_logging(log_handler)
+    metrics_server = MetricsServer()
+    dp.startup.register(metrics_server.start)
+    dp.shutdown.register(metrics_server.stop)
+
+    dp.include_router(router)
+    return dp
 
 
 # ============================================================================
-# Обработчики ответов пользователя
+# Точка входа
 # ============================================================================
 
 
-@dp.message(UserStates.await_1_answer)
-async def answer1_handler(message: Message, state: FSMContext) -> None:
-    """
-    Обработчик первой попытки ответа.
-
-    Проверяет ответ пользователя на правильность и:
-    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
-    - Если неверно: предлагает попробовать ещё раз, переводит во вторую попытку
-    - Если некорректный ввод: просит ввести число
-
-    Args:
-        message: Объект сообщения с ответом пользователя
-        state: Контекст состояния FSM пользователя
+async def main(config: Config | None = None) -> None:
     """
-    # Безопасное получение текста сообщения
-    text: str | None = message.text
-    if not text:
-        _LOGGER.error("Сообщение без текста")
-        return
-
-    data: UserData = cast(UserData, await state.get_data())
-
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
-
-    try:
-        # Нормализуем ввод: убираем пробелы, заменяем запятую на точку, равно на минус
-        ans_str: str = text.replace(" ", "").replace(",", ".").replace("=", "-")
-        ans: float = float(ans_str)
-        right_answer: int = data.get("answer", 0)
-
-        if ans == right_answer:
-            # Правильный ответ с первой попытки - золотая медаль!
-            messages = [
-                "🤩",
-                "🎉 УРА!!! 🎉",
-                "С ПЕРВОЙ попытки! 🌟\nЭто точно золотая медаль! 🥇",
-            ]
-            await asyncio.gather(
-                *map(message_answer, repeat(message), messages)
-            )
-            _LOGGER.info(
-                f"Пользователь {user.full_name} решил пример с первой попытки"
-            )
-            await add_points(state)
-            asyncio.create_task(get_new_task(message, state))
-        else:
-            # Неправильный ответ - даём вторую попытку
-            asyncio.create_task(
-                message_answer(
-                    message,
-                    "Ой-ой-ой! 🫢\n"
-                    "Кажется, тут маленькая ошибка! 🧐\n"
-                    "Проверь аккуратненько и попробуй ещё раз!\n"
-                    "Вот наш пример:\n"
-                    f"<code>{data.get('expression')}</code>\n"
-                    "Ты обязательно справишься! 💪",
-                )
-            )
-            asyncio.create_task(state.set_state(UserStates.await_2_answer))
-            _LOGGER.info(f"Пользователь {user.full_name} ошибся первый раз")
-    except (ValueError, TypeError):
-        # Некорректный ввод - не число
-        asyncio.create_task(
-            message_answer(
-                message,
-                "Циферки-циферки! 🔢\n"
-                "Давай только числа, как настоящие математики! 🧮\n"
-                "Попробуй ещё разок! 😊\n"
-                "Вот наш пример:\n"
-                f"<code>{data.get('expression')}</code>\n",
-            )
-        )
-        return
-
-
-@dp.message(UserStates.await_2_answer)
-async def answer2_handler(message: Message, state: FSMContext) -> None:
-    """
-    Обработчик второй попытки ответа.
-
-    Проверяет ответ пользователя на правильность и:
-    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
-    - Если неверно: предлагает попробовать ещё раз, переводит в третью попытку
-    - Если некорректный ввод: просит ввести число
-
-    Args:
-        message: Объект сообщения с ответом пользователя
-        state: Контекст состояния FSM пользователя
-    """
-    # Безопасное получение текста сообщения
-    text: str | None = message.text
-    if not text:
-        _LOGGER.error("Сообщение без текста")
-        return
-
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
-
-    ans_str: str = text.replace(" ", "").replace(",", ".").replace("=", "-")
-    data: UserData = cast(UserData, await state.get_data())
-
-    try:
-        ans: float = float(ans_str)
-        right_answer: int = data.get("answer", 0)
-
-        if ans == right_answer:
-            # Правильный ответ со второй попытки - серебряная медалька
-            await message_answer(
-                message,
-                "🎈 Ура! Получилось! 🎈\n"
-                "Со второй попытки - это круто! 😎\n"
-                "Твоя награда - серебряная медалька! 🥈",
-            )
-            _LOGGER.info(
-                f"Пользователь {user.full_name} решил пример со второй попытки"
-            )
-            await add_points(state)
-            asyncio.create_task(get_new_task(message, state))
-        else:
-            # Неправильный ответ - даём третью и последнюю попытку
-            await message_answer(
-                message,
-                "Хм-м... 🤔\n"
-                "Опять маленькая помарка! 🎨\n"
-                "Давай посмотрим внимательнее:\n"
-                f"<code>{data.get('expression')}</code>\n"
-                "Ты почти у цели! 🌈",
-            )
-            asyncio.create_task(state.set_state(UserStates.await_3_answer))
-    except (ValueError, TypeError):
-        # Некорректный ввод - не число
-        asyncio.create_task(
-            message_answer(
-                message,
-                "Ой, это что ли буквы?... а надо цифры! 🔤➡️🔢\n"
-                "Попробуй написать просто число, как мы договаривались! 🤝\n"
-                "Вот наш пример:\n"
-                f"<code>{data.get('expression')}</code>\n",
-            )
-        )
-        return
-
-
-@dp.message(UserStates.await_3_answer)
-async def answer3_handler(message: Message, state: FSMContext) -> None:
-    """
-    Обработчик третьей (последней) попытки ответа.
+    Главная функция для запуска бота.
 
-    Проверяет ответ пользователя на правильность и:
-    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
-    - Если неверно: показывает правильный ответ, вычитает баллы, генерирует новый пример
-    - Если некорректный ввод: просит ввести число
+    Инициализирует экземпляр бота с дефолтным режимом парсинга HTML
+    и начинает поллинг обновлений от Telegram (или запускает webhook-сервер
+    при BOT_MODE=webhook, или рабочие процессы при BOT_MODE=sharded).
 
     Args:
-        message: Объект сообщения с ответом пользователя
-        state: Контекст состояния FSM пользователя
+        config: Настройки запуска (по умолчанию — из переменных окружения)
     """
-    # Безопасное получение текста сообщения
-    text: str | None = message.text
-    if not text:
-        _LOGGER.error("Сообщение без текста")
-        return
-
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
-        return
-
-    ans_str: str = text.replace(" ", "").replace(",", ".").replace("=", "-")
-    data: UserData = cast(UserData, await state.get_data())
-
-    try:
-        ans: float = float(ans_str)
-        right_answer: int = data.get("answer", 0)
-
-        if ans == right_answer:
-            # Правильный ответ с третьей попытки - победа!
-            await message_answer(
-                message,
-                "🎆 ФАНФАРЫ! 🎇\n"
-                "С третьей попытки - это победа! 🏁\n"
-                "Ты настоящий упорный боец! 💥",
-            )
-            await add_points(state)
-            asyncio.create_task(get_new_task(message, state))
-        else:
-            # Неправильный ответ с третьей попытки - показываем ответ и вычитаем баллы
-            await message_answer(message, "🫂 Не грусти!")
-            await message_answer(
-                message,
-                "Этот пример был слишком хитрющим! 🦊\n"
-                f"Правильный ответ: <b>{right_answer}</b>\n"
-                "Давай возьмём новый пример - он точно по зубам! 😉\n"
-                "Уже бегу искать... 🏃",
-            )
-            await subtract_points(state)
-            asyncio.create_task(get_new_task(message, state))
-    except (ValueError, TypeError):
-        # Некорректный ввод - не число
-        asyncio.create_task(
-            message_answer(
-                message,
-                "Кажется, кто-то хочет поиграть в загадки? 🎭\n"
-                "Но мне нужно именно число - давай попробуем ещё раз! 🤗\n"
-                "Вот наш пример:\n"
-                f"<code>{data.get('expression')}</code>\n",
-            )
-        )
-        return
-
-
-# ============================================================================
-# Fallback обработчик
-# ============================================================================
+    if config is None:
+        config = Config.from_env()
+    setup_logging(config.log_level)
 
+    # Проверяем наличие токена
+    if not config.token:
+        _LOGGER.error("TOKEN_API_BOT environment variable is not set")
+        raise ValueError("TOKEN_API_BOT environment variable is not set")
 
-@dp.message()
-async def echo_handler(message: types.Message) -> None:
-    """
-    Fallback-обработчик для всех остальных сообщений.
+    from logs import stop_logging
 
-    Активируется, когда пользователь отправляет сообщение, не соответствующее
-    ни одному из ожидаемых состояний.
+    if config.mode == "sharded":
+        from shards import run_sharded
 
-    Args:
-        message: Объект сообщения от пользователя
-    """
-    # Безопасное получение пользователя
-    user: User | None = message.from_user
-    if not user:
-        _LOGGER.error("Сообщение без пользователя")
+        # Обновления раздаются рабочим процессам, каждый собирает своё
+        # приложение (см. shards.py)
+        try:
+            await run_sharded(config)
+        finally:
+            stop_logging()
         return
 
-    asyncio.create_task(
-        message_answer(
-            message,
-            "🤖 Я понимаю только числовые ответы, давай играть! 🎲\nДля начала используй команду /start",
-        )
-    )
-    _LOGGER.info(f"Пользователь {user.full_name} написал какую-то дичь")
-
-
-# ============================================================================
-# Точка входа
-# ============================================================================
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
 
-
-async def main() -> None:
-    """
-    Главная функция для запуска бота.
-
-    Инициализирует экземпляр бота с дефолтным режимом парсинга HTML
-    и начинает поллинг обновлений от Telegram.
-    """
-    # Проверяем наличие токена
-    if not TOKEN_API:
-        _LOGGER.error("TOKEN_API_BOT environment variable is not set")
-        raise ValueError("TOKEN_API_BOT environment variable is not set")
+    dp: Dispatcher = create_app(config)
 
     # Инициализируем бота с HTML-режимом парсинга
     bot = Bot(
-        TOKEN_API, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        config.token, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     try:
-        # Запускаем поллинг обновлений от Telegram
-        await dp.start_polling(bot)
+        if config.mode == "webhook":
+            from webhook import run_webhook
+
+            # Принимаем обновления через aiohttp-сервер
+            await run_webhook(dp, bot)
+        else:
+            # Запускаем поллинг обновлений от Telegram
+            await dp.start_polling(bot)
     finally:
         # Закрываем сессию бота при завершении работы
         await bot.session.close()
+        # Выводим записи, оставшиеся в очереди логов
+        stop_logging()
 
 
 if __name__ == "__main__":
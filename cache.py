@@ -0,0 +1,270 @@
+"""
+Кэш записей FSM в памяти процесса перед RedisStorage.
+
+Сообщения одного пользователя приходят друг за другом и обычно попадают
+в один процесс, поэтому состояние и данные активных пользователей хранятся
+в ограниченном LRU с TTL. Запись идёт сквозная (write-through): каждое
+изменение сохраняется в Redis, а в той же транзакции публикуется сообщение
+об инвалидации, по которому остальные реплики удаляют свою копию.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Any, NamedTuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from metrics import Counter
+from session import load_record, save_record
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Максимум пользователей в кэше (0 — кэш выключен)
+FSM_CACHE_SIZE = int(getenv("FSM_CACHE_SIZE", "10000"))
+
+# Время жизни записи в кэше, секунды (верхняя граница устаревания,
+# если сообщение об инвалидации потерялось)
+FSM_CACHE_TTL = float(getenv("FSM_CACHE_TTL", "60"))
+
+# Канал Redis для сообщений об инвалидации между репликами
+FSM_CACHE_CHANNEL = getenv("FSM_CACHE_CHANNEL", "fsm:invalidate")
+
+# Пауза перед повторной подпиской после потери соединения, секунды
+_RESUBSCRIBE_DELAY = 1.0
+
+CACHE_REQUESTS = Counter(
+    "fsm_cache_requests_total", "Чтения записей FSM через кэш", ("result",)
+)
+
+
+class CacheEntry(NamedTuple):
+    """Запись кэша: срок годности, состояние и данные пользователя."""
+
+    expires: float
+    state: str | None
+    data: dict[str, Any]
+
+
+# ============================================================================
+# Хранилище с кэшем
+# ============================================================================
+
+
+class CachedStorage(BaseStorage):
+    """
+    Обёртка над RedisStorage с кэшем записей пользователей в памяти.
+
+    Кэш используется только пока процесс подписан на канал инвалидации:
+    без подписки нельзя узнать об изменениях, сделанных другими репликами,
+    поэтому чтения идут напрямую в Redis.
+
+    Attributes:
+        storage: Исходное хранилище Redis
+        size: Максимум записей в кэше (0 — кэш выключен: чтения идут
+              в Redis, но об изменениях другие реплики по-прежнему узнают)
+        ttl: Время жизни записи, секунды
+        channel: Канал инвалидации
+    """
+
+    def __init__(
+        self,
+        storage: RedisStorage,
+        size: int = FSM_CACHE_SIZE,
+        ttl: float = FSM_CACHE_TTL,
+        channel: str = FSM_CACHE_CHANNEL,
+    ) -> None:
+        self.storage = storage
+        self.size = max(size, 0)
+        self.ttl = ttl
+        self.channel = channel
+        # Идентификатор реплики: свои сообщения об инвалидации пропускаются
+        self.replica = f"{os.getpid()}-{os.urandom(4).hex()}"
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._subscribed = False
+        # Растёт при каждой инвалидации от других реплик
+        self._generation = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------------
+    # Операции с кэшем
+    # ------------------------------------------------------------------------
+
+    def _cache_key(self, key: StorageKey) -> str:
+        return self.storage.key_builder.build(key)
+
+    def _get(self, cache_key: str) -> CacheEntry | None:
+        """Возвращает запись кэша, если она есть и не устарела."""
+        entry: CacheEntry | None = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            del self._entries[cache_key]
+            return None
+        self._entries.move_to_end(cache_key)
+        return entry
+
+    def _put(self, cache_key: str, state: str | None, data: dict[str, Any]) -> None:
+        """Кладёт запись в кэш, вытесняя самую давнюю при переполнении."""
+        if not self._subscribed or not self.size:
+            return
+        self._entries[cache_key] = CacheEntry(
+            time.monotonic() + self.ttl, state, data.copy()
+        )
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, cache_key: str | None = None) -> None:
+        """Удаляет запись из кэша (без аргумента — очищает весь кэш)."""
+        self._generation += 1
+        if cache_key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(cache_key, None)
+
+    # ------------------------------------------------------------------------
+    # Запись пользователя целиком (см. session.RecordStorage)
+    # ------------------------------------------------------------------------
+
+    async def load_record(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        """Читает запись из кэша, при промахе — из Redis."""
+        cache_key: str = self._cache_key(key)
+        entry: CacheEntry | None = self._get(cache_key)
+        if entry is not None:
+            CACHE_REQUESTS.inc("hit")
+            return entry.state, entry.data.copy()
+
+        CACHE_REQUESTS.inc("miss")
+        generation: int = self._generation
+        state, data = await load_record(self.storage, key)
+        # Пока шло чтение, могла прийти инвалидация: такой ответ не кэшируем
+        if generation == self._generation:
+            self._put(cache_key, state, data)
+        return state, data
+
+    async def save_record(
+        self,
+        key: StorageKey,
+        state: str | None,
+        data: dict[str, Any] | None,
+        *,
+        state_changed: bool,
+        data_changed: bool,
+    ) -> None:
+        """
+        Записывает изменения в Redis и обновляет кэш.
+
+        Если изменена только одна часть записи, а другой нет в кэше,
+        запись из кэша удаляется, чтобы не хранить её наполовину.
+        """
+        cache_key: str = self._cache_key(key)
+        # Удаляем копию до записи: при ошибке кэш не разойдётся с Redis
+        entry: CacheEntry | None = self._get(cache_key)
+        self.invalidate(cache_key)
+        await save_record(
+            self.storage,
+            key,
+            state,
+            data,
+            state_changed=state_changed,
+            data_changed=data_changed,
+            publish=(self.channel, f"{self.replica} {cache_key}"),
+        )
+
+        if state_changed and data_changed:
+            self._put(cache_key, state, data or {})
+        elif entry is not None:
+            self._put(
+                cache_key,
+                state if state_changed else entry.state,
+                (data or {}) if data_changed else entry.data,
+            )
+
+    # ------------------------------------------------------------------------
+    # Интерфейс BaseStorage
+    # ------------------------------------------------------------------------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.save_record(
+            key,
+            state.state if isinstance(state, State) else state,
+            None,
+            state_changed=True,
+            data_changed=False,
+        )
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self.load_record(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self.save_record(key, None, data, state_changed=False, data_changed=True)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self.load_record(key)
+        return data
+
+    async def close(self) -> None:
+        await self.stop()
+        await self.storage.close()
+
+    # ------------------------------------------------------------------------
+    # Подписка на инвалидацию
+    # ------------------------------------------------------------------------
+
+    async def _listen(self) -> None:
+        """Слушает канал инвалидации, переподписываясь при обрыве связи."""
+        while True:
+            try:
+                async with self.storage.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self._subscribed = True
+                    _LOGGER.info("Кэш FSM подписан на канал %s", self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        payload: str | bytes = message["data"]
+                        if isinstance(payload, bytes):
+                            payload = payload.decode("utf-8")
+                        replica, _, cache_key = payload.partition(" ")
+                        if replica != self.replica:
+                            self.invalidate(cache_key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                _LOGGER.error("Подписка кэша FSM прервана: %s", e)
+            finally:
+                # Без подписки изменения других реплик не видны
+                self._subscribed = False
+                self.invalidate()
+            await asyncio.sleep(_RESUBSCRIBE_DELAY)
+
+    async def start(self) -> None:
+        """Запускает подписку на канал инвалидации (если кэш включён)."""
+        if self._task is not None or not self.size:
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Останавливает подписку и очищает кэш."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
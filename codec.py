@@ -0,0 +1,194 @@
+"""
+Компактная бинарная сериализация данных пользователя (UserData) для Redis.
+
+Формат: байт-метка, байт флагов присутствия полей, затем присутствующие
+поля по порядку: difficulty (int8), points (int16), answer (int32),
+expression и user_name (длина uint16 + UTF-8), recent (число uint8 +
+хэши uint16). Знаки × и ÷ в выражении хранятся как однобайтовые * и /.
+
+Записи в JSON читаются прозрачно и при следующей записи сохраняются
+в новом формате. Данные, которые не укладываются в формат (лишние ключи,
+другие типы, числа вне диапазона), по-прежнему пишутся в JSON.
+"""
+
+import json
+import struct
+from collections.abc import Callable
+from os import getenv
+from typing import Any, cast
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Формат записи данных FSM: "binary" или "json" (чтение поддерживает оба)
+FSM_CODEC = getenv("FSM_CODEC", "binary")
+
+# Первый байт бинарной записи. В UTF-8 не может начинать символ,
+# поэтому не пересекается с JSON
+MAGIC = 0xB1
+
+# Поля в порядке записи: (имя, формат struct для чисел или None для строк)
+FIELDS: tuple[tuple[str, str | None], ...] = (
+    ("difficulty", "<b"),
+    ("points", "<h"),
+    ("answer", "<i"),
+    ("expression", None),
+    ("user_name", None),
+)
+
+# Флаг: знаки × и ÷ выражения записаны как * и /
+_ASCII_OPS = 1 << len(FIELDS)
+
+# Флаг и поле: хэши недавних примеров пользователя (см. pool.remember_problem).
+# Записывается после полей FIELDS; бит после _ASCII_OPS сохраняет
+# совместимость с записями без этого поля
+_RECENT = _ASCII_OPS << 1
+RECENT_FIELD = "recent"
+_MAX_RECENT = 0xFF
+
+_TO_ASCII = str.maketrans("×÷", "*/")
+_FROM_ASCII = str.maketrans("*/", "×÷")
+
+_NAMES: frozenset[str] = frozenset(name for name, _ in FIELDS) | {RECENT_FIELD}
+
+_LENGTH = struct.Struct("<H")
+_INT_RANGES: dict[str, tuple[int, int]] = {
+    "<b": (-(2**7), 2**7 - 1),
+    "<h": (-(2**15), 2**15 - 1),
+    "<i": (-(2**31), 2**31 - 1),
+}
+
+
+# ============================================================================
+# Кодирование
+# ============================================================================
+
+
+def pack_user_data(data: dict[str, Any]) -> bytes | None:
+    """
+    Упаковывает данные пользователя в бинарный формат.
+
+    Returns:
+        bytes | None: Запись или None, если данные не укладываются в формат
+    """
+    if not data.keys() <= _NAMES:
+        return None
+
+    flags: int = 0
+    parts: list[bytes] = []
+    for bit, (name, fmt) in enumerate(FIELDS):
+        if name not in data:
+            continue
+        value: Any = data[name]
+        flags |= 1 << bit
+        if fmt is not None:
+            low, high = _INT_RANGES[fmt]
+            if type(value) is not int or not low <= value <= high:
+                return None
+            parts.append(struct.pack(fmt, value))
+            continue
+
+        if not isinstance(value, str):
+            return None
+        if name == "expression" and "*" not in value and "/" not in value:
+            value = value.translate(_TO_ASCII)
+            flags |= _ASCII_OPS
+        encoded: bytes = value.encode("utf-8")
+        if len(encoded) > 0xFFFF:
+            return None
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+
+    if RECENT_FIELD in data:
+        recent: Any = data[RECENT_FIELD]
+        if (
+            not isinstance(recent, list)
+            or len(recent) > _MAX_RECENT
+            or not all(type(h) is int and 0 <= h <= 0xFFFF for h in recent)
+        ):
+            return None
+        flags |= _RECENT
+        parts.append(bytes((len(recent),)))
+        parts.append(struct.pack(f"<{len(recent)}H", *recent))
+
+    return bytes((MAGIC, flags)) + b"".join(parts)
+
+
+def unpack_user_data(raw: bytes) -> dict[str, Any]:
+    """Распаковывает бинарную запись, созданную pack_user_data."""
+    flags: int = raw[1]
+    offset: int = 2
+    data: dict[str, Any] = {}
+    for bit, (name, fmt) in enumerate(FIELDS):
+        if not flags & (1 << bit):
+            continue
+        if fmt is not None:
+            (data[name],) = struct.unpack_from(fmt, raw, offset)
+            offset += struct.calcsize(fmt)
+            continue
+
+        (length,) = _LENGTH.unpack_from(raw, offset)
+        offset += _LENGTH.size
+        value: str = raw[offset : offset + length].decode("utf-8")
+        offset += length
+        if name == "expression" and flags & _ASCII_OPS:
+            value = value.translate(_FROM_ASCII)
+        data[name] = value
+
+    if flags & _RECENT:
+        count: int = raw[offset]
+        data[RECENT_FIELD] = list(struct.unpack_from(f"<{count}H", raw, offset + 1))
+    return data
+
+
+def encode_data(
+    data: dict[str, Any],
+    json_dumps: Callable[..., str] = json.dumps,
+    codec: str = FSM_CODEC,
+) -> bytes | str:
+    """Кодирует данные FSM в бинарный формат или JSON (см. FSM_CODEC)."""
+    if codec == "binary":
+        packed: bytes | None = pack_user_data(data)
+        if packed is not None:
+            return packed
+    return json_dumps(data)
+
+
+def decode_data(
+    raw: bytes | str, json_loads: Callable[..., Any] = json.loads
+) -> dict[str, Any]:
+    """Декодирует данные FSM из бинарного формата или JSON."""
+    if isinstance(raw, bytes):
+        if raw[:1] == bytes((MAGIC,)):
+            return unpack_user_data(raw)
+        raw = raw.decode("utf-8")
+    return cast(dict[str, Any], json_loads(raw))
+
+
+# ============================================================================
+# Хранилище
+# ============================================================================
+
+
+class CompactRedisStorage(RedisStorage):
+    """RedisStorage, хранящий данные пользователей в компактном формате."""
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        redis_key: str = self.key_builder.build(key, "data")
+        if not data:
+            await self.redis.delete(redis_key)
+            return
+        await self.redis.set(
+            redis_key, encode_data(data, self.json_dumps), ex=self.data_ttl
+        )
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        redis_key: str = self.key_builder.build(key, "data")
+        value: bytes | str | None = await self.redis.get(redis_key)
+        if value is None:
+            return {}
+        return decode_data(value, self.json_loads)
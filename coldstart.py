@@ -0,0 +1,140 @@
+"""
+Замер холодного старта: импорт модулей и сборка приложения.
+
+Запуск:
+    python -m coldstart                 # таблица в консоль
+    python -m coldstart --runs 10       # больше запусков на шаг
+    python -m coldstart --output cold.json
+
+Каждый шаг выполняется в новом процессе интерпретатора, поэтому кэш
+импортов не мешает замеру. Для шага выводится медиана времени внутри
+процесса и медиана полного времени процесса (вместе с запуском самого
+интерпретатора). Для сборки приложения дополнительно выводятся самые
+долгие импорты верхнего уровня (по python -X importtime).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+# ============================================================================
+# Шаги замера
+# ============================================================================
+
+# Шаг: код, время которого измеряется в новом процессе
+STEPS: dict[str, str] = {
+    "interpreter": "pass",
+    "import gen": "import gen",
+    "import workers": "import workers",
+    "import bot": "import bot",
+    "import handlers": "import handlers",
+    "create_app": "import bot; bot.create_app(bot.Config())",
+}
+
+# Обёртка: печатает время выполнения кода шага в миллисекундах
+_TIMER = (
+    "import time; _start = time.perf_counter()\n"
+    "{code}\n"
+    "print((time.perf_counter() - _start) * 1000)"
+)
+
+
+def _env() -> dict[str, str]:
+    """Окружение без внешних сервисов: MemoryStorage, без метрик и банка."""
+    env: dict[str, str] = dict(os.environ)
+    for name in ("REDIS", "METRICS_PORT", "PROBLEM_BANK"):
+        env.pop(name, None)
+    return env
+
+
+def measure(code: str, runs: int) -> dict[str, float]:
+    """
+    Выполняет code в runs новых процессах.
+
+    Returns:
+        dict: Медианы времени кода и всего процесса, миллисекунды
+    """
+    inner: list[float] = []
+    wall: list[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", _TIMER.format(code=code)],
+            capture_output=True,
+            text=True,
+            env=_env(),
+            check=True,
+        )
+        wall.append((time.perf_counter() - start) * 1000)
+        inner.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"code_ms": statistics.median(inner), "process_ms": statistics.median(wall)}
+
+
+def top_imports(code: str, limit: int) -> list[tuple[str, float]]:
+    """
+    Самые долгие импорты верхнего уровня при выполнении code.
+
+    Returns:
+        list: [(модуль, накопленное время в миллисекундах), ...]
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=_env(),
+        check=True,
+    )
+    imports: list[tuple[str, float]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Вложенные импорты выводятся с отступом
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:limit]
+
+
+# ============================================================================
+# Точка входа
+# ============================================================================
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Измеряет холодный старт и печатает отчёт."""
+    parser = argparse.ArgumentParser(
+        prog="python -m coldstart", description="Замер холодного старта бота"
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--output", help="записать результаты в JSON")
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    results: dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "steps": {name: measure(code, args.runs) for name, code in STEPS.items()},
+        "create_app_imports": top_imports(STEPS["create_app"], args.top),
+    }
+
+    print(f"{'step':<16} {'code ms':>9} {'process ms':>11}")
+    for name, step in results["steps"].items():
+        print(f"{name:<16} {step['code_ms']:>9.1f} {step['process_ms']:>11.1f}")
+    print("\ncreate_app: slowest top-level imports")
+    for module, ms in results["create_app_imports"]:
+        print(f"  {module:<40} {ms:>9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,10 +6,21 @@
 """
 
 import ast
+import json
 import logging
 import random
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
 from enum import Enum
-from typing import NamedTuple
+from math import isqrt
+from os import getenv
+from typing import TYPE_CHECKING, Literal, NamedTuple, cast, overload
+
+if TYPE_CHECKING:
+    from bank import ProblemBank
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,6 +31,25 @@ _LOGGER = logging.getLogger(__name__)
 # Максимальная глубина рекурсии при генерации сложных выражений
 MAX_DIFICULTY = 5
 
+# Максимум попыток получить выражение, не являющееся просто числом;
+# после него корень строится как простая операция a op b
+MAX_ATTEMPTS = 4
+
+# Диапазон операндов простых выражений (кроме умножения)
+_MAX_OPERAND = 50
+
+# Число пар (a, b) с 1 <= b <= a <= _MAX_OPERAND для вычитания
+_SUB_PAIRS = _MAX_OPERAND * (_MAX_OPERAND + 1) // 2
+
+# Модуль random с интерфейсом random.Random (глобальное состояние)
+_GLOBAL_RANDOM = cast(random.Random, random)
+
+# Операции в порядке весов LevelConfig.op_weights
+_OPS = ("+", "-", "*", "/")
+
+# JSON-файл с настройками уровней сложности (см. load_level_configs)
+GEN_LEVELS = getenv("GEN_LEVELS", "")
+
 # ============================================================================
 # Перечисления и типы
 # ============================================================================
@@ -46,60 +76,426 @@ class Expression(NamedTuple):
     priority: OpPriority | None = None
 
 
+class LevelConfig(NamedTuple):
+    """
+    Настройки генерации примеров одного уровня сложности.
+
+    Значения по умолчанию воспроизводят исходный генератор: при них
+    последовательность обращений к random и результаты не меняются.
+
+    Attributes:
+        number_share: Доля листьев-чисел среди листьев дерева
+        max_operand: Наибольшее слагаемое, уменьшаемое и частное
+        mul_left: Диапазон первого множителя (включительно)
+        mul_right: Диапазон второго множителя (включительно)
+        divisor: Диапазон делителя (включительно)
+        op_weights: Веса операций "+", "-", "*", "/" при выборе операции
+                    листа и порядка объединения (None — равновероятно,
+                    0 — операция не используется)
+        max_answer: Наибольший результат объединения поддеревьев (None —
+                    без ограничения); простые операции ограничены
+                    диапазонами операндов
+    """
+
+    number_share: float = 0.5
+    max_operand: int = _MAX_OPERAND
+    mul_left: tuple[int, int] = (10, 99)
+    mul_right: tuple[int, int] = (2, 9)
+    divisor: tuple[int, int] = (2, 10)
+    op_weights: tuple[float, float, float, float] | None = None
+    max_answer: int | None = None
+
+    def validate(self) -> "LevelConfig":
+        """
+        Проверяет согласованность настроек.
+
+        Returns:
+            LevelConfig: Эти же настройки
+
+        Raises:
+            ValueError: Если диапазоны пусты, оба множителя могут быть
+                        больше 10 или веса некорректны
+        """
+        if not 0.0 <= self.number_share < 1.0:
+            raise ValueError("number_share must be in [0, 1)")
+        for name in ("mul_left", "mul_right", "divisor"):
+            low, high = getattr(self, name)
+            if not 1 <= low <= high:
+                raise ValueError(f"{name} must be a non-empty range of positive ints")
+        if self.divisor[1] > self.max_operand:
+            raise ValueError("divisor must not exceed max_operand")
+        # Один из множителей не больше 10: на этом строятся проверки
+        # объединения поддеревьев и маски gen_numpy
+        if self.mul_left[1] > 10 and self.mul_right[1] > 10:
+            raise ValueError("mul_left or mul_right must not exceed 10")
+        if self.op_weights is not None and (
+            len(self.op_weights) != len(_OPS)
+            or min(self.op_weights) < 0
+            or not any(self.op_weights)
+        ):
+            raise ValueError("op_weights must be 4 non-negative weights, not all 0")
+        return self
+
+
+# Настройки по умолчанию (исходный генератор)
+DEFAULT_LEVEL = LevelConfig()
+
+
+def load_level_configs(path: str) -> dict[int, LevelConfig]:
+    """
+    Читает настройки уровней из JSON-файла.
+
+    Формат: {"3": {"max_operand": 30, "op_weights": [2, 2, 1, 0]}, ...};
+    не указанные поля и уровни берутся по умолчанию.
+
+    Args:
+        path: Путь к файлу (пусто — настройки по умолчанию)
+
+    Returns:
+        dict: Сложность → настройки (только для указанных уровней)
+
+    Raises:
+        ValueError: Если файл не JSON-объект, уровень вне 0..MAX_DIFICULTY,
+                    поле неизвестно или настройки некорректны
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        try:
+            raw: object = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: invalid JSON: {e}") from e
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: expected an object of levels")
+
+    configs: dict[int, LevelConfig] = {}
+    for key, fields in raw.items():
+        try:
+            difficulty: int = int(key)
+        except ValueError:
+            raise ValueError(f"{path}: level {key!r} is not an integer") from None
+        if not 0 <= difficulty <= MAX_DIFICULTY:
+            raise ValueError(f"{path}: level {key!r} must be in 0..{MAX_DIFICULTY}")
+        if not isinstance(fields, dict):
+            raise ValueError(f"{path}: level {key!r} must be an object of fields")
+        unknown: list[str] = sorted(set(fields) - set(LevelConfig._fields))
+        if unknown:
+            raise ValueError(f"{path}: level {key!r}: unknown fields {unknown}")
+        try:
+            configs[difficulty] = LevelConfig(
+                **{
+                    name: tuple(value) if isinstance(value, list) else value
+                    for name, value in fields.items()
+                }
+            ).validate()
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: level {key!r}: {e}") from e
+    return configs
+
+
+# Настройки уровней сложности (уровни без записи — DEFAULT_LEVEL); файл
+# GEN_LEVELS читается при первом обращении, а не при импорте модуля
+_LEVEL_CONFIGS: dict[int, LevelConfig] | None = None
+
+
+def level_configs() -> dict[int, LevelConfig]:
+    """
+    Настройки уровней сложности (загружаются из GEN_LEVELS при первом вызове).
+
+    Словарь можно изменять: так bench подставляет настройки из файла.
+
+    Raises:
+        ValueError: Если файл GEN_LEVELS некорректен (см. load_level_configs)
+    """
+    global _LEVEL_CONFIGS
+    if _LEVEL_CONFIGS is None:
+        _LEVEL_CONFIGS = load_level_configs(GEN_LEVELS)
+    return _LEVEL_CONFIGS
+
+
+def level_config(difficulty: int) -> LevelConfig:
+    """Настройки генерации для уровня сложности."""
+    return level_configs().get(difficulty, DEFAULT_LEVEL)
+
+
+class SamplingStats:
+    """
+    Счётчики попыток и отказов при генерации.
+
+    Attributes:
+        attempts: Попытки объединить поддеревья по уровням дерева
+                  (MAX_DIFICULTY — листья, меньшие значения — ближе к корню)
+        rejections: Отклонённые операции по уровням дерева
+        fallbacks: Замены узла простым выражением по уровням дерева
+        retries: Повторные генерации из-за результата-числа по сложности
+    """
+
+    def __init__(self) -> None:
+        self.attempts: Counter[int] = Counter()
+        self.rejections: Counter[int] = Counter()
+        self.fallbacks: Counter[int] = Counter()
+        self.retries: Counter[int] = Counter()
+
+    def rejection_rates(self) -> dict[int, float]:
+        """Доля отклонённых операций по уровням дерева."""
+        return {
+            level: self.rejections[level] / attempts
+            for level, attempts in sorted(self.attempts.items())
+        }
+
+    def reset(self) -> None:
+        """Обнуляет все счётчики."""
+        for counter in (self.attempts, self.rejections, self.fallbacks, self.retries):
+            counter.clear()
+
+
+# Счётчики генерации по потокам: пачки примеров генерируются в пуле потоков
+# параллельно, и приращения общих счётчиков смешивали бы чужие пачки
+_THREAD_STATS = threading.local()
+
+
+def thread_stats() -> SamplingStats:
+    """Счётчики генерации в текущем потоке."""
+    stats: SamplingStats | None = getattr(_THREAD_STATS, "stats", None)
+    if stats is None:
+        stats = _THREAD_STATS.stats = SamplingStats()
+    return stats
+
+
+# Счётчики генерации в потоке, импортировавшем модуль (обычно основном)
+STATS = thread_stats()
+
+
+class GenerationProfile:
+    """
+    Подробный профиль генерации по уровням сложности (см. profiling()).
+
+    Счётчики дерева ведутся по парам (сложность, уровень дерева), где
+    уровень, как в SamplingStats, — MAX_DIFICULTY у листьев и меньше
+    ближе к корню.
+
+    Attributes:
+        attempts: Попытки объединить поддеревья
+        fallbacks: Замены узла простым выражением после отказа всех операций
+        ops: Выбранные операции объединения: (сложность, уровень, операция)
+        leaves: Числа во всех сгенерированных простых выражениях по сложности
+                (включая выброшенные поддеревья)
+        retries: Перестроения дерева, давшего просто число, по сложности
+        root_fallbacks: Примеры, заменённые простой операцией после
+                        MAX_ATTEMPTS перестроений, по сложности
+        shapes: Итоговые примеры: (листья, высота, пары скобок, ответ)
+    """
+
+    def __init__(self) -> None:
+        self.attempts: Counter[tuple[int, int]] = Counter()
+        self.fallbacks: Counter[tuple[int, int]] = Counter()
+        self.ops: Counter[tuple[int, int, str]] = Counter()
+        self.leaves: Counter[int] = Counter()
+        self.retries: Counter[int] = Counter()
+        self.root_fallbacks: Counter[int] = Counter()
+        self.shapes: dict[int, list[tuple[int, int, int, int]]] = {}
+
+    def observe(self, difficulty: int, expr: "TreeExpression") -> None:
+        """Учитывает итоговый пример."""
+        leaves: int = 0
+        parens: int = 0
+        height: int = 0
+        stack: list[tuple[Node, int]] = [(expr.node, 0)]
+        while stack:
+            node, level = stack.pop()
+            if node.op is None:
+                leaves += 1
+                height = max(height, level)
+            elif node.op == _PAREN:
+                parens += 1
+                stack.append((node.left, level))  # type: ignore[arg-type]
+            else:
+                stack.append((node.left, level + 1))  # type: ignore[arg-type]
+                stack.append((node.right, level + 1))  # type: ignore[arg-type]
+        self.shapes.setdefault(difficulty, []).append(
+            (leaves, height, parens, expr.value)
+        )
+
+    def summary(self) -> dict[int, dict[str, object]]:
+        """
+        Сводка по уровням сложности.
+
+        Returns:
+            dict: Сложность → число примеров, листья на пример и доля
+                  выброшенных листьев, перестроения, размеры дерева,
+                  диапазон ответов и счётчики по уровням дерева
+        """
+        result: dict[int, dict[str, object]] = {}
+        for difficulty, shapes in sorted(self.shapes.items()):
+            count: int = len(shapes)
+            kept: int = sum(shape[0] for shape in shapes)
+            drawn: int = self.leaves[difficulty]
+            answers: list[int] = sorted(shape[3] for shape in shapes)
+            tree: dict[int, dict[str, object]] = {}
+            for (d, level), attempts in sorted(self.attempts.items()):
+                if d != difficulty:
+                    continue
+                chosen: Counter[str] = Counter(
+                    {op: n for (d2, l2, op), n in self.ops.items()
+                     if d2 == d and l2 == level}
+                )
+                tree[level] = {
+                    "attempts": attempts,
+                    "fallbacks": self.fallbacks[d, level],
+                    "ops": dict(sorted(chosen.items())),
+                }
+            result[difficulty] = {
+                "problems": count,
+                "leaves_drawn": drawn / count,
+                "leaves_kept": kept / count,
+                "wasted": 1 - kept / drawn if drawn else 0.0,
+                "retries": self.retries[difficulty],
+                "root_fallbacks": self.root_fallbacks[difficulty],
+                "height_mean": sum(shape[1] for shape in shapes) / count,
+                "height_max": max(shape[1] for shape in shapes),
+                "leaves_max": max(shape[0] for shape in shapes),
+                "parens_mean": sum(shape[2] for shape in shapes) / count,
+                "answer_min": answers[0],
+                "answer_p50": answers[count // 2],
+                "answer_max": answers[-1],
+                "tree": tree,
+            }
+        return result
+
+
+# Активный профиль (None — профилирование выключено)
+PROFILE: GenerationProfile | None = None
+
+
+@contextmanager
+def profiling() -> Iterator[GenerationProfile]:
+    """
+    Включает подробный профиль генерации в текущем процессе.
+
+    Examples:
+        >>> with profiling() as profile:
+        ...     _ = generate_many(3, 100, seed=1)
+        >>> profile.summary()[3]["problems"]
+        100
+    """
+    global PROFILE
+    profile = GenerationProfile()
+    PROFILE = profile
+    try:
+        yield profile
+    finally:
+        PROFILE = None
+
+
 # ============================================================================
 # Генерация простых выражений
 # ============================================================================
 
 
-def generate_simple_expression() -> Expression:
+def draw_simple(
+    rng: random.Random = _GLOBAL_RANDOM,
+    allow_number: bool = True,
+    config: LevelConfig = DEFAULT_LEVEL,
+) -> tuple[int, str | None, int]:
+    """
+    Выбирает операнды простого выражения сразу корректными, без повторов.
+
+    Args:
+        rng: Источник случайных чисел
+        allow_number: Разрешено ли вернуть просто число
+        config: Диапазоны операндов и веса операций
+
+    Returns:
+        tuple: (a, op, b); для просто числа op равен None, а b — 0
+
+    Note:
+        - Вычитание: пара a >= b выбирается равномерно среди всех таких пар
+        - Деление: сначала частное, затем делимое a = b * частное
+    """
+    max_operand: int = config.max_operand
+    if allow_number and rng.random() < config.number_share:
+        return rng.randint(1, max_operand), None, 0
+
+    op: str = (
+        rng.choice(_OPS)
+        if config.op_weights is None
+        else rng.choices(_OPS, config.op_weights)[0]
+    )
+    if op == "+":
+        return rng.randint(1, max_operand), op, rng.randint(1, max_operand)
+    if op == "-":
+        # k-я пара в порядке (1,1), (2,1), (2,2), (3,1), ...
+        k: int = rng.randrange(
+            _SUB_PAIRS if max_operand == _MAX_OPERAND
+            else max_operand * (max_operand + 1) // 2
+        )
+        a: int = (isqrt(8 * k + 1) + 1) // 2
+        return a, op, k - a * (a - 1) // 2 + 1
+    if op == "*":
+        # Для умножения один множитель должен быть ≤ 10
+        return rng.randint(*config.mul_left), op, rng.randint(*config.mul_right)
+    # Для деления результат должен быть целым
+    b: int = rng.randint(*config.divisor)
+    return b * rng.randint(1, max_operand // b), op, b
+
+
+def enumerate_simple() -> Iterator[tuple[int, str, int]]:
+    """
+    Перечисляет все исходы draw_simple(allow_number=False) с настройками
+    по умолчанию (DEFAULT_LEVEL), каждый один раз.
+
+    Returns:
+        Iterator: (a, op, b) по операциям "+", "-", "*", "/"
+    """
+    for a in range(1, _MAX_OPERAND + 1):
+        for b in range(1, _MAX_OPERAND + 1):
+            yield a, "+", b
+    for a in range(1, _MAX_OPERAND + 1):
+        for b in range(1, a + 1):
+            yield a, "-", b
+    for a in range(10, 100):
+        for b in range(2, 10):
+            yield a, "*", b
+    for b in range(2, 11):
+        for quotient in range(1, _MAX_OPERAND // b + 1):
+            yield b * quotient, "/", b
+
+
+def generate_simple_expression(allow_number: bool = True) -> Expression:
     """
     Генерирует простое выражение: одиночное число или бинарную операцию a op b.
 
+    Args:
+        allow_number: Разрешено ли вернуть просто число
+
     Returns:
         Expression: Выражение со строкой, значением и приоритетом операции.
 
     Note:
         - Для умножения: первый множитель 10-99, второй 2-9 (ограничение для устного счёта)
         - Для деления: результат всегда целый, делитель 2-10
-        - Отрицательные и дробные результаты отклоняются (рекурсивная попытка заново)
+        - Операнды выбираются сразу корректными (см. draw_simple)
     """
-    if random.random() < 0.5:
+    a: int
+    op: str | None
+    b: int
+    a, op, b = draw_simple(allow_number=allow_number)
+    if op is None:
         # Случай 1: просто число
-        num: int = random.randint(1, 50)
-        return Expression(str(num), num)
-    else:
-        # Случай 2: бинарная операция a op b
-        a: int = random.randint(1, 50)
-        b: int = random.randint(1, 50)
-        op: str = random.choice(["+", "-", "*", "/"])
-
-        # Проверка ограничений для операции
-        if op == "*":
-            # Для умножения один множитель должен быть ≤ 10
-            a = random.randint(10, 99)
-            b = random.randint(2, 9)
-        elif op == "/":
-            # Для деления результат должен быть целым
-            b = random.randint(2, 10)
-            a = b * random.randint(1, 50 // b)
-
-        expr_str: str = f"{a} {op} {b}"
-        try:
-            value: float = eval(expr_str)
-            if value < 0 or value != int(value):
-                return generate_simple_expression()
-            value = int(value)
-        except (ZeroDivisionError, ValueError, TypeError):
-            return generate_simple_expression()
-
-        priority: OpPriority = (
-            OpPriority.MUL_DIV if op in ["*", "/"] else OpPriority.ADD_SUB
-        )
-        return Expression(
-            f"({expr_str})" if priority == OpPriority.ADD_SUB else expr_str,
-            value,
-            priority,
-        )
+        return Expression(str(a), a)
+
+    # Случай 2: бинарная операция a op b
+    expr_str: str = f"{a} {op} {b}"
+    value: int = int(eval(expr_str))
+
+    priority: OpPriority = (
+        OpPriority.MUL_DIV if op in ["*", "/"] else OpPriority.ADD_SUB
+    )
+    return Expression(
+        f"({expr_str})" if priority == OpPriority.ADD_SUB else expr_str,
+        value,
+        priority,
+    )
 
 
 # ============================================================================
@@ -276,30 +672,544 @@ def check_intermediate_results(expression: str) -> bool:
         evaluate_node(tree.body)
         return True
     except (ValueError, ZeroDivisionError, NotImplementedError, TypeError):
-        _LOGGER.debug(f"Expression rejected: {expression}")
+        _LOGGER.debug("Expression rejected: %s", expression)
         return False
     except Exception as e:
-        _LOGGER.error(
-            f"Unexpected error checking expression '{expression}': {e}"
-        )
+        _LOGGER.error("Unexpected error checking expression '%s': %s", expression, e)
         return False
 
 
+# ============================================================================
+# Генерация через дерево выражений
+# ============================================================================
+
+# Приоритеты операций в терминах разбора строки (левоассоциативные операции)
+_PRECEDENCE: dict[str, int] = {"+": 1, "-": 1, "*": 2, "/": 2}
+
+# Узел-скобки: подвыражение, обёрнутое в "(...)"
+_PAREN = "()"
+
+# Символы для "учебного" отображения операций
+_DISPLAY: dict[str, str] = {"*": "×", "/": "÷"}
+
+
+class Node:
+    """
+    Узел дерева разбора выражения с заранее вычисленным значением.
+
+    Дерево в точности соответствует тому, как Python разобрал бы итоговую
+    строку: скобки представлены отдельными узлами, а операции одного
+    приоритета левоассоциативны.
+
+    Attributes:
+        op: None для числа, "()" для скобок, иначе символ операции
+        left: Левый операнд (или содержимое скобок)
+        right: Правый операнд
+        value: Значение поддерева
+    """
+
+    __slots__ = ("op", "left", "right", "value")
+
+    def __init__(
+        self,
+        op: str | None,
+        value: int,
+        left: "Node | None" = None,
+        right: "Node | None" = None,
+    ) -> None:
+        self.op = op
+        self.value = value
+        self.left = left
+        self.right = right
+
+
+class TreeExpression(NamedTuple):
+    """
+    Выражение в виде дерева — аналог Expression без строкового представления.
+
+    Attributes:
+        node: Корень дерева разбора
+        priority: Приоритет операции, которой выражение было собрано
+        has_div: Содержит ли выражение деление
+        lparen: Начинается ли текст выражения со скобки
+        rparen: Заканчивается ли текст выражения скобкой
+    """
+
+    node: Node
+    priority: OpPriority | None = None
+    has_div: bool = False
+    lparen: bool = False
+    rparen: bool = False
+
+    @property
+    def value(self) -> int:
+        """Значение выражения."""
+        return self.node.value
+
+
+def make_node(left: Node, op: str, right: Node) -> Node | None:
+    """
+    Создаёт узел бинарной операции, проверяя ограничения устного счёта.
+
+    Те же ограничения, что и в check_intermediate_results, но только для
+    одного нового узла: значения операндов уже вычислены и проверены.
+
+    Returns:
+        Node: Новый узел или None, если операция нарушает ограничения
+    """
+    a: int = left.value
+    b: int = right.value
+    if op == "+":
+        return Node(op, a + b, left, right)
+    if op == "-":
+        if a < b:
+            return None
+        return Node(op, a - b, left, right)
+    if op == "*":
+        if a > 10 and b > 10:
+            return None
+        return Node(op, a * b, left, right)
+    if b == 0 or a % b != 0:
+        return None
+    return Node(op, a // b, left, right)
+
+
+def splice(left: Node, op: str, right: Node) -> Node | None:
+    """
+    Строит дерево разбора строки "left op right" без повторного парсинга.
+
+    Если подвыражения не обёрнуты в скобки, операция op может "зацепить"
+    только крайние операнды соседей (например, "a + b" * "c" даёт a + b * c).
+    Функция спускается по правому краю левого дерева и левому краю правого,
+    пересобирает только затронутые узлы и проверяет ограничения для каждого
+    из них — O(высота дерева) вместо O(длина строки).
+
+    Returns:
+        Node: Корень нового дерева или None, если нарушены ограничения
+    """
+    prec: int = _PRECEDENCE[op]
+
+    # Узлы левого дерева, которые окажутся выше новой операции
+    pending_left: list[Node] = []
+    a: Node = left
+    while a.op in _PRECEDENCE and _PRECEDENCE[a.op] < prec:
+        pending_left.append(a)
+        a = a.right  # type: ignore[assignment]
+
+    # Узлы правого дерева, которые окажутся выше новой операции
+    pending_right: list[Node] = []
+    b: Node = right
+    while b.op in _PRECEDENCE and _PRECEDENCE[b.op] <= prec:
+        pending_right.append(b)
+        b = b.left  # type: ignore[assignment]
+
+    node: Node | None = make_node(a, op, b)
+
+    # Пересобираем затронутые узлы изнутри наружу с учётом приоритетов
+    while node is not None and (pending_left or pending_right):
+        if pending_left and (
+            not pending_right
+            or _PRECEDENCE[pending_left[-1].op]  # type: ignore[index]
+            >= _PRECEDENCE[pending_right[-1].op]  # type: ignore[index]
+        ):
+            outer: Node = pending_left.pop()
+            node = make_node(outer.left, outer.op, node)  # type: ignore[arg-type]
+        else:
+            outer = pending_right.pop()
+            node = make_node(node, outer.op, outer.right)  # type: ignore[arg-type]
+    return node
+
+
+def generate_simple_tree(
+    rng: random.Random = _GLOBAL_RANDOM,
+    allow_number: bool = True,
+    config: LevelConfig = DEFAULT_LEVEL,
+) -> TreeExpression:
+    """
+    Генерирует простое выражение в виде дерева.
+
+    Использует тот же draw_simple, что и generate_simple_expression, поэтому
+    при одинаковом seed (и настройках по умолчанию) результаты совпадают.
+
+    Args:
+        rng: Источник случайных чисел (по умолчанию — глобальный random)
+        allow_number: Разрешено ли вернуть просто число
+        config: Настройки уровня (см. LevelConfig)
+    """
+    return simple_tree(*draw_simple(rng, allow_number, config))
+
+
+def simple_tree(a: int, op: str | None, b: int) -> TreeExpression:
+    """
+    Строит дерево простого выражения по результату draw_simple.
+
+    Args:
+        a: Первый операнд (или само число)
+        op: Операция или None для просто числа
+        b: Второй операнд
+    """
+    if op is None:
+        # Случай 1: просто число
+        return TreeExpression(Node(None, a))
+
+    # Случай 2: бинарная операция a op b (операнды заведомо корректны)
+    node: Node = cast(Node, make_node(Node(None, a), op, Node(None, b)))
+    if op in ("*", "/"):
+        return TreeExpression(node, OpPriority.MUL_DIV, has_div=op == "/")
+    return TreeExpression(
+        Node(_PAREN, node.value, node),
+        OpPriority.ADD_SUB,
+        lparen=True,
+        rparen=True,
+    )
+
+
+def _wrap_if_needed(expr: TreeExpression, parent_priority: OpPriority) -> Node:
+    """Аналог maybe_parenthesize: возвращает узел, при необходимости в скобках."""
+    if (
+        not (expr.lparen and expr.rparen)
+        and expr.priority
+        and expr.priority.value < parent_priority.value
+    ):
+        return Node(_PAREN, expr.node.value, expr.node)
+    return expr.node
+
+
+def combine_trees(
+    expr1: TreeExpression,
+    expr2: TreeExpression,
+    op: str,
+    max_answer: int | None = None,
+) -> TreeExpression | None:
+    """
+    Объединяет два выражения-дерева бинарной операцией.
+
+    Повторяет семантику combine_expressions: скобки расставляются так же,
+    а выражения с делением отклоняются (eval вернул бы нецелое число).
+    Результат больше max_answer (если задан) тоже отклоняется.
+
+    Returns:
+        TreeExpression: Объединённое выражение или None, если результат некорректен
+    """
+    if op == "/" or expr1.has_div or expr2.has_div:
+        return None
+
+    new_priority: OpPriority = (
+        OpPriority.MUL_DIV if op == "*" else OpPriority.ADD_SUB
+    )
+    left: Node = _wrap_if_needed(expr1, new_priority)
+    right: Node = _wrap_if_needed(expr2, new_priority)
+
+    node: Node | None = splice(left, op, right)
+    if node is None or max_answer is not None and node.value > max_answer:
+        return None
+    return TreeExpression(
+        node,
+        new_priority,
+        lparen=left.op == _PAREN or expr1.lparen,
+        rparen=right.op == _PAREN or expr2.rparen,
+    )
+
+
+def _numbers(expr: TreeExpression) -> int:
+    """Число чисел в простом выражении: 1 для числа, 2 для a op b."""
+    return 1 if expr.priority is None else 2
+
+
+def _weighted_order(
+    rng: random.Random, weights: tuple[float, float, float, float]
+) -> list[str]:
+    """Случайный порядок операций с ненулевым весом: тяжёлые чаще раньше."""
+    ops: list[str] = [op for op, w in zip(_OPS, weights) if w > 0]
+    remaining: list[float] = [w for w in weights if w > 0]
+    order: list[str] = []
+    while ops:
+        i: int = rng.choices(range(len(ops)), remaining)[0]
+        order.append(ops.pop(i))
+        remaining.pop(i)
+    return order
+
+
+def generate_tree(
+    depth: int = 0,
+    rng: random.Random = _GLOBAL_RANDOM,
+    config: LevelConfig = DEFAULT_LEVEL,
+) -> TreeExpression:
+    """
+    Генерирует выражение-дерево заданной глубины без рекурсии.
+
+    Дерево полное, поэтому обход в порядке "левое, правое, корень" сводится
+    к стеку готовых поддеревьев: два соседних поддерева одного уровня сразу
+    объединяются. Порядок обращений к random совпадает с generate_expression
+    (при настройках по умолчанию).
+
+    Args:
+        depth: Начальная глубина (MAX_DIFICULTY даёт простое выражение)
+        rng: Источник случайных чисел (по умолчанию — глобальный random)
+        config: Настройки уровня (см. LevelConfig)
+
+    Returns:
+        TreeExpression: Сгенерированное выражение
+    """
+    ops: list[str] = list(_OPS)
+    stats: SamplingStats = thread_stats()
+    weights: tuple[float, float, float, float] | None = config.op_weights
+    max_answer: int | None = config.max_answer
+    profile: GenerationProfile | None = PROFILE
+    difficulty: int = MAX_DIFICULTY - depth
+    stack: list[tuple[int, TreeExpression]] = []
+    while True:
+        expr: TreeExpression = generate_simple_tree(rng, True, config)
+        if profile is not None:
+            profile.leaves[difficulty] += _numbers(expr)
+        level: int = MAX_DIFICULTY
+        while level > depth and stack and stack[-1][0] == level:
+            left: TreeExpression = stack.pop()[1]
+            level -= 1
+            order: list[str] = (
+                rng.sample(ops, k=4) if weights is None
+                else _weighted_order(rng, weights)
+            )
+            for op in order:
+                stats.attempts[level] += 1
+                new_expr: TreeExpression | None = combine_trees(
+                    left, expr, op, max_answer
+                )
+                if profile is not None:
+                    profile.attempts[difficulty, level] += 1
+                if new_expr:
+                    expr = new_expr
+                    if profile is not None:
+                        profile.ops[difficulty, level, op] += 1
+                    break
+                stats.rejections[level] += 1
+            else:
+                stats.fallbacks[level] += 1
+                expr = generate_simple_tree(rng, True, config)
+                if profile is not None:
+                    profile.fallbacks[difficulty, level] += 1
+                    profile.leaves[difficulty] += _numbers(expr)
+        if level <= depth:
+            return expr
+        stack.append((level, expr))
+
+
+def render(node: Node) -> str:
+    """
+    Превращает дерево в строку для отображения (× и ÷ вместо * и /).
+
+    Args:
+        node: Корень дерева разбора
+
+    Returns:
+        Строка выражения, например "12 × 3 + (5 - 2)"
+    """
+    parts: list[str] = []
+    stack: list[Node | str] = [node]
+    while stack:
+        item: Node | str = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif item.op is None:
+            parts.append(str(item.value))
+        elif item.op == _PAREN:
+            stack.append(")")
+            stack.append(item.left)  # type: ignore[arg-type]
+            parts.append("(")
+        else:
+            stack.append(item.right)  # type: ignore[arg-type]
+            stack.append(f" {_DISPLAY.get(item.op, item.op)} ")
+            stack.append(item.left)  # type: ignore[arg-type]
+    return "".join(parts)
+
+
 # ============================================================================
 # Главная функция генерации
 # ============================================================================
 
 
+def generate_problem(
+    difficulty: int,
+    rng: random.Random = _GLOBAL_RANDOM,
+    config: LevelConfig | None = None,
+) -> TreeExpression:
+    """
+    Генерирует выражение-дерево, содержащее хотя бы одну операцию.
+
+    Для простейшего уровня "просто число" исключается сразу. Для остальных
+    дерево строится не более MAX_ATTEMPTS раз, после чего корнем становится
+    простая операция — время генерации ограничено сверху.
+
+    Args:
+        difficulty: Уровень сложности (0..MAX_DIFICULTY)
+        rng: Источник случайных чисел (по умолчанию — глобальный random)
+        config: Настройки уровня (по умолчанию — level_config(difficulty))
+
+    Returns:
+        TreeExpression: Выражение, не являющееся просто числом
+    """
+    if config is None:
+        config = level_config(difficulty)
+    depth: int = MAX_DIFICULTY - difficulty
+    expr: TreeExpression
+    if depth >= MAX_DIFICULTY:
+        expr = generate_simple_tree(rng, False, config)
+        if PROFILE is not None:
+            PROFILE.leaves[difficulty] += _numbers(expr)
+            PROFILE.observe(difficulty, expr)
+        return expr
+
+    for _ in range(MAX_ATTEMPTS):
+        expr = generate_tree(depth, rng, config)
+        if expr.node.op is not None:
+            break
+        thread_stats().retries[difficulty] += 1
+        if PROFILE is not None:
+            PROFILE.retries[difficulty] += 1
+    else:
+        expr = generate_simple_tree(rng, False, config)
+        if PROFILE is not None:
+            PROFILE.root_fallbacks[difficulty] += 1
+            PROFILE.leaves[difficulty] += _numbers(expr)
+    if PROFILE is not None:
+        PROFILE.observe(difficulty, expr)
+    return expr
+
+
+class ProblemGenerator:
+    """
+    Генератор примеров с собственным источником случайных чисел.
+
+    Экземпляры независимы друг от друга и от глобального random: их можно
+    использовать в разных потоках и процессах, а при одинаковом seed они
+    выдают одинаковые последовательности примеров.
+
+    Attributes:
+        seed: Seed, с которым создан генератор (None — случайный)
+        rng: Источник случайных чисел
+        bank: Банк простых примеров (см. bank.py): если задан, простые
+              выражения выбираются из него, а не генерируются
+
+    Examples:
+        >>> a, b = ProblemGenerator(seed=1), ProblemGenerator(seed=1)
+        >>> a.generate(2) == b.generate(2)
+        True
+    """
+
+    def __init__(
+        self, seed: int | None = None, rng: random.Random | None = None
+    ) -> None:
+        self.seed = seed
+        self.rng: random.Random = rng if rng is not None else random.Random(seed)
+        self.bank: "ProblemBank | None" = None
+
+    def spawn(self, n: int) -> list["ProblemGenerator"]:
+        """
+        Создаёт n независимых генераторов с seed из потока этого генератора.
+
+        Удобно для параллельной генерации: набор дочерних генераторов
+        воспроизводится по seed родителя.
+        """
+        return [ProblemGenerator(self.rng.getrandbits(64)) for _ in range(n)]
+
+    def _use_bank(self, difficulty: int) -> bool:
+        """
+        Выбирать ли пример из банка: только простые выражения, только
+        при настройках по умолчанию (банк перечисляет именно их) и не при
+        профилировании (профиль учитывает построенные деревья).
+        """
+        return (
+            self.bank is not None
+            and MAX_DIFICULTY - difficulty >= MAX_DIFICULTY
+            and level_config(difficulty) == DEFAULT_LEVEL
+            and PROFILE is None
+        )
+
+    def problem(self, difficulty: int) -> TreeExpression:
+        """Генерирует выражение-дерево (см. generate_problem)."""
+        return generate_problem(difficulty, self.rng)
+
+    def generate(self, difficulty: int) -> tuple[str, int]:
+        """
+        Генерирует пример заданной сложности для устного счёта.
+
+        Сложность инвертирована: difficulty=0 даёт максимальную сложность,
+        difficulty=MAX_DIFICULTY — простое выражение.
+
+        Args:
+            difficulty: Уровень сложности (0..MAX_DIFICULTY)
+
+        Returns:
+            tuple: (выражение_с_заменёнными_символами, ответ)
+                   Пример: ("12 × 3 + 5 = ?", 41)
+        """
+        # Инвертируем сложность: difficulty=0 → максимальная глубина
+        depth: int = MAX_DIFICULTY - difficulty
+
+        _LOGGER.info(
+            "Генерация примера сложности %d (глубина %d)",
+            difficulty,
+            depth,
+            extra={"difficulty": difficulty},
+        )
+
+        if self._use_bank(difficulty):
+            str_expr, value = self.bank.sample(self.rng)  # type: ignore[union-attr]
+        else:
+            expr: TreeExpression = generate_problem(difficulty, self.rng)
+            # Строка строится один раз, сразу с "учебными" символами
+            str_expr, value = render(expr.node), expr.value
+
+        _LOGGER.info("Пример: %s", str_expr, extra={"difficulty": difficulty})
+        _LOGGER.info("Ответ: %d", value, extra={"difficulty": difficulty})
+
+        return str_expr, value
+
+    def generate_many(self, difficulty: int, n: int) -> tuple[list[str], array]:
+        """
+        Генерирует пачку из n примеров заданной сложности.
+
+        Настройка и логирование выполняются один раз на всю пачку;
+        результат совпадает с n последовательными вызовами generate.
+
+        Returns:
+            tuple: (список выражений, array("i") ответов)
+        """
+        depth: int = MAX_DIFICULTY - difficulty
+        _LOGGER.info(
+            "Генерация %d примеров сложности %d (глубина %d)",
+            n,
+            difficulty,
+            depth,
+            extra={"difficulty": difficulty},
+        )
+
+        expressions: list[str] = []
+        answers: array = array("i")
+        if self._use_bank(difficulty):
+            for _ in range(n):
+                expression, answer = self.bank.sample(self.rng)  # type: ignore[union-attr]
+                expressions.append(expression)
+                answers.append(answer)
+            return expressions, answers
+
+        for _ in range(n):
+            expr: TreeExpression = generate_problem(difficulty, self.rng)
+            expressions.append(render(expr.node))
+            answers.append(expr.value)
+        return expressions, answers
+
+
+# Генератор модульных функций: использует глобальный random, поэтому
+# random.seed() по-прежнему управляет generate() и generate_many()
+DEFAULT_GENERATOR = ProblemGenerator(rng=_GLOBAL_RANDOM)
+
+
 def generate(difficulty: int) -> tuple[str, int]:
     """
     Генерирует пример заданной сложности для устного счёта.
 
-    Сложность инвертирована: difficulty=0 даёт максимальную сложность,
-    difficulty=MAX_DIFICULTY — простое выражение.
-
-    Алгоритм поиска:
-        - Генерирует выражения до тех пор, пока не найдётся сложное
-          (т.е. содержащее хотя бы одну операцию, не являющееся просто числом)
+    Обёртка над DEFAULT_GENERATOR.generate (глобальный random).
 
     Args:
         difficulty: Уровень сложности (0..MAX_DIFICULTY)
@@ -308,27 +1218,109 @@ def generate(difficulty: int) -> tuple[str, int]:
         tuple: (выражение_с_заменёнными_символами, ответ)
                Пример: ("12 × 3 + 5 = ?", 41)
     """
-    # Инвертируем сложность: difficulty=0 → максимальная глубина
-    depth: int = MAX_DIFICULTY - difficulty
+    return DEFAULT_GENERATOR.generate(difficulty)
+
+
+@overload
+def generate_many(
+    difficulty: int,
+    n: int,
+    *,
+    seed: int | None = None,
+    compact: Literal[False] = False,
+    backend: Literal["python", "numpy"] = "python",
+) -> list[tuple[str, int]]: ...
+
+
+@overload
+def generate_many(
+    difficulty: int,
+    n: int,
+    *,
+    seed: int | None = None,
+    compact: Literal[True],
+    backend: Literal["python", "numpy"] = "python",
+) -> tuple[list[str], array]: ...
+
+
+def generate_many(
+    difficulty: int,
+    n: int,
+    *,
+    seed: int | None = None,
+    compact: bool = False,
+    backend: Literal["python", "numpy"] = "python",
+) -> list[tuple[str, int]] | tuple[list[str], array]:
+    """
+    Генерирует пачку из n примеров заданной сложности за один вызов.
 
-    _LOGGER.info(f"Генерация примера сложности {difficulty} (глубина {depth})")
+    Без seed используется DEFAULT_GENERATOR (глобальный random), и результат
+    совпадает с n последовательными вызовами generate(difficulty).
 
-    # Генерируем выражения, пока не найдём достаточно сложное
-    # (содержащее операции, а не просто число)
-    while True:
-        expr: Expression = generate_expression(depth=depth)
-        try:
-            # Если выражение — просто число, продолжаем поиск
-            if int(expr.expr) == expr.value:
-                continue
-        except (ValueError, TypeError):
-            # Выражение содержит операции — это то, что нужно
-            break
+    Args:
+        difficulty: Уровень сложности (0..MAX_DIFICULTY)
+        n: Количество примеров
+        seed: Seed для независимого воспроизводимого потока (глобальный random
+              при этом не затрагивается)
+        compact: Вернуть параллельные массивы вместо списка пар
+        backend: "numpy" — векторная генерация (см. gen_numpy): то же
+                 распределение, но другой поток случайных чисел; глобальный
+                 random не используется
 
-    # Заменяем символы на более "учебные" варианты для отображения
-    str_expr: str = expr.expr.replace("*", "×").replace("/", "÷")
+    Returns:
+        list: [(выражение, ответ), ...]
+        или при compact=True — (список выражений, array("i") ответов)
+
+    Raises:
+        ImportError: Если backend="numpy", а NumPy не установлен
+    """
+    expressions: list[str]
+    answers: array
+    if backend == "numpy":
+        # Импорт здесь: NumPy — необязательная зависимость
+        import gen_numpy
+
+        expressions, answers = gen_numpy.generate_many(difficulty, n, seed)
+    else:
+        generator: ProblemGenerator = (
+            DEFAULT_GENERATOR if seed is None else ProblemGenerator(seed)
+        )
+        expressions, answers = generator.generate_many(difficulty, n)
+    if compact:
+        return expressions, answers
+    return list(zip(expressions, answers))
 
-    _LOGGER.info(f"Пример: {str_expr}")
-    _LOGGER.info(f"Ответ: {expr.value}")
 
+def generate_legacy(difficulty: int) -> tuple[str, int]:
+    """
+    Эталонная генерация через строки, eval и ast.parse.
+
+    Работает медленнее generate, но даёт тот же результат при одинаковом
+    состоянии random. Используется для проверки эквивалентности и бенчмарков.
+
+    Args:
+        difficulty: Уровень сложности (0..MAX_DIFICULTY)
+
+    Returns:
+        tuple: (выражение_с_заменёнными_символами, ответ)
+    """
+    depth: int = MAX_DIFICULTY - difficulty
+
+    if depth >= MAX_DIFICULTY:
+        expr: Expression = generate_simple_expression(allow_number=False)
+    else:
+        for _ in range(MAX_ATTEMPTS):
+            expr = generate_expression(depth=depth)
+            try:
+                # Если выражение — просто число, продолжаем поиск
+                if int(expr.expr) == expr.value:
+                    continue
+            except (ValueError, TypeError):
+                # Выражение содержит операции — это то, что нужно
+                break
+        else:
+            expr = generate_simple_expression(allow_number=False)
+
+    # Заменяем символы на более "учебные" варианты для отображения
+    str_expr: str = expr.expr.replace("*", "×").replace("/", "÷")
     return str_expr, expr.value
@@ -0,0 +1,340 @@
+"""
+Векторизованная генерация примеров на NumPy для массового производства.
+
+Необязательный backend для gen.generate_many(..., backend="numpy"): операнды
+сразу для всей пачки выбираются массивами, ограничения (неотрицательные
+промежуточные результаты, множитель ≤ 10, деление нацело) проверяются
+масками, и в строки превращаются только итоговые примеры.
+
+Распределение примеров совпадает с gen.generate() (проверка:
+python -m bench --compare-backends), но последовательность при том же seed
+другая — используется numpy.random.Generator, а не random.Random.
+
+Векторизованы уровни VECTORIZED_LEVELS: простое выражение (difficulty=0)
+и одно объединение двух простых выражений (difficulty=1). На более
+глубоких уровнях значение зависит от того, как операция "цепляет"
+соседние поддеревья (см. gen.splice), поэтому они генерируются скалярным
+движком. Так же генерируются уровни с собственными настройками
+(gen.level_configs()): векторный код реализует только настройки по умолчанию.
+
+NumPy не входит в requirements.txt: pip install numpy.
+"""
+
+import logging
+from array import array
+from functools import cache
+from math import isqrt
+from typing import Any, cast
+
+from gen import (
+    _MAX_OPERAND,
+    _SUB_PAIRS,
+    DEFAULT_LEVEL,
+    MAX_ATTEMPTS,
+    MAX_DIFICULTY,
+    ProblemGenerator,
+    level_config,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Константы
+# ============================================================================
+
+HAS_NUMPY: bool = np is not None
+
+# Уровни сложности, которые генерируются векторно
+VECTORIZED_LEVELS: frozenset[int] = frozenset({0, 1})
+
+# Коды операций; _NUMBER — лист "просто число"
+_ADD, _SUB, _MUL, _DIV, _NUMBER = range(5)
+
+# Шаблоны простых выражений по коду операции (как их выводит gen.render)
+_SIMPLE_FORMATS: tuple[str, ...] = ("({} + {})", "({} - {})", "{} × {}", "{} ÷ {}")
+
+# Знаки операций объединения по коду операции
+_SIGNS: tuple[str, ...] = ("+", "-", "×", "÷")
+
+
+# ============================================================================
+# Простые выражения
+# ============================================================================
+
+# Простые выражения пронумерованы: сложение, вычитание, умножение, деление,
+# затем просто числа. Номер строки — индекс в таблице текстов _texts()
+_SUB_CODE = _MAX_OPERAND * _MAX_OPERAND
+_MUL_CODE = _SUB_CODE + _SUB_PAIRS
+_DIV_CODE = _MUL_CODE + 90 * 8  # множители 10..99 и 2..9
+_DIVISORS = range(2, 11)
+_NUMBER_CODE = _DIV_CODE + sum(_MAX_OPERAND // b for b in _DIVISORS)
+
+
+@cache
+def _texts() -> Any:
+    """Тексты всех простых выражений в порядке их номеров (object-массив)."""
+    texts: list[str] = [
+        _SIMPLE_FORMATS[_ADD].format(a, b)
+        for a in range(1, _MAX_OPERAND + 1)
+        for b in range(1, _MAX_OPERAND + 1)
+    ]
+    for k in range(_SUB_PAIRS):
+        a: int = (isqrt(8 * k + 1) + 1) // 2
+        texts.append(_SIMPLE_FORMATS[_SUB].format(a, k - a * (a - 1) // 2 + 1))
+    texts += [
+        _SIMPLE_FORMATS[_MUL].format(a, b) for a in range(10, 100) for b in range(2, 10)
+    ]
+    texts += [
+        _SIMPLE_FORMATS[_DIV].format(b * q, b)
+        for b in _DIVISORS
+        for q in range(1, _MAX_OPERAND // b + 1)
+    ]
+    texts += [str(a) for a in range(1, _MAX_OPERAND + 1)]
+    return np.array(texts, dtype=object)
+
+
+@cache
+def _div_offsets() -> Any:
+    """Номер первого деления на b для каждого делителя b (индекс — b)."""
+    offsets = np.zeros(_DIVISORS.stop, dtype=np.int64)
+    offset: int = _DIV_CODE
+    for b in _DIVISORS:
+        offsets[b] = offset
+        offset += _MAX_OPERAND // b
+    return offsets
+
+
+class _Leaves:
+    """
+    Пачка простых выражений в виде параллельных массивов.
+
+    Attributes:
+        op: Код операции (_NUMBER для просто числа)
+        a: Первый операнд (или само число)
+        value: Значение выражения
+        code: Номер выражения в таблице текстов
+    """
+
+    __slots__ = ("op", "a", "value", "code")
+
+    def __init__(self, op: Any, a: Any, value: Any, code: Any) -> None:
+        self.op = op
+        self.a = a
+        self.value = value
+        self.code = code
+
+    def take(self, mask: Any, other: "_Leaves") -> "_Leaves":
+        """Пачка, в которой строки mask взяты из other."""
+        return _Leaves(
+            *(
+                np.where(mask, getattr(other, name), getattr(self, name))
+                for name in self.__slots__
+            )
+        )
+
+    def assign(self, rows: Any, other: "_Leaves") -> None:
+        """Заменяет строки rows строками other."""
+        for name in self.__slots__:
+            getattr(self, name)[rows] = getattr(other, name)
+
+    def render(self) -> list[str]:
+        """Строки выражений, как их выводит gen.render."""
+        return cast(list[str], _texts()[self.code].tolist())
+
+
+def draw_simple(rng: Any, n: int, allow_number: bool = True) -> _Leaves:
+    """
+    Векторный аналог gen.draw_simple: n простых выражений сразу.
+
+    Для каждой операции операнды выбираются для всех строк, после чего
+    каждая строка берёт операнды своей операции — отказов нет.
+
+    Args:
+        rng: numpy.random.Generator
+        n: Размер пачки
+        allow_number: Разрешено ли вернуть просто число
+    """
+    op = rng.integers(0, 4, n)
+
+    add_a = rng.integers(1, _MAX_OPERAND + 1, n)
+    add_b = rng.integers(1, _MAX_OPERAND + 1, n)
+
+    # k-я пара в порядке (1,1), (2,1), (2,2), (3,1), ... (как в gen.draw_simple)
+    k = rng.integers(0, _SUB_PAIRS, n)
+    sub_a = (np.sqrt(8 * k + 1).astype(np.int64) + 1) // 2
+    sub_b = k - sub_a * (sub_a - 1) // 2 + 1
+
+    mul_a = rng.integers(10, 100, n)
+    mul_b = rng.integers(2, 10, n)
+
+    # Деление: сначала делитель, затем частное 1.._MAX_OPERAND // делитель
+    div_b = rng.integers(2, 11, n)
+    quotient = (rng.random(n) * (_MAX_OPERAND // div_b)).astype(np.int64) + 1
+
+    a = np.choose(op, (add_a, sub_a, mul_a, div_b * quotient))
+    value = np.choose(op, (add_a + add_b, sub_a - sub_b, mul_a * mul_b, quotient))
+    code = np.choose(
+        op,
+        (
+            (add_a - 1) * _MAX_OPERAND + add_b - 1,
+            _SUB_CODE + k,
+            _MUL_CODE + (mul_a - 10) * 8 + mul_b - 2,
+            _div_offsets()[div_b] + quotient - 1,
+        ),
+    )
+
+    if allow_number:
+        number = rng.random(n) < 0.5
+        numbers = rng.integers(1, _MAX_OPERAND + 1, n)
+        op = np.where(number, _NUMBER, op)
+        a = np.where(number, numbers, a)
+        value = np.where(number, numbers, value)
+        code = np.where(number, _NUMBER_CODE + numbers - 1, code)
+    return _Leaves(op, a, value, code)
+
+
+# ============================================================================
+# Объединение двух простых выражений
+# ============================================================================
+
+
+def _combine_level(rng: Any, n: int) -> tuple[Any, Any, _Leaves, _Leaves, Any]:
+    """
+    Одна попытка gen.generate_tree для глубины MAX_DIFICULTY - 1.
+
+    Два листа объединяются первой допустимой операцией из случайной
+    перестановки "+", "-", "*", "/"; если допустимой нет, результатом
+    становится новый лист (fallback).
+
+    Returns:
+        tuple: (код выбранной операции или -1, значение, левый лист,
+                правый лист или fallback, маска успешного объединения)
+    """
+    left: _Leaves = draw_simple(rng, n)
+    right: _Leaves = draw_simple(rng, n)
+
+    # Выражения с делением не объединяются (см. gen.combine_trees)
+    plain = (left.op != _DIV) & (right.op != _DIV)
+
+    # "x * (c × d)" разбирается как (x * c) × d: проверяется первый множитель
+    factor = np.where(right.op == _MUL, right.a, right.value)
+    valid = np.stack(
+        (
+            plain,
+            plain & (left.value >= right.value),
+            plain & ~((left.value > 10) & (factor > 10)),
+            np.zeros(n, dtype=bool),
+        ),
+        axis=1,
+    )
+
+    # Перебор операций в случайном порядке: берётся первая допустимая
+    order = np.argsort(rng.random((n, 4)), axis=1)
+    valid_in_order = np.take_along_axis(valid, order, axis=1)
+    combined = valid_in_order.any(axis=1)
+    first = valid_in_order.argmax(axis=1)
+    op = np.where(combined, order[np.arange(n), first], -1)
+
+    value = np.choose(
+        np.maximum(op, 0),
+        (
+            left.value + right.value,
+            left.value - right.value,
+            left.value * right.value,
+            left.value,
+        ),
+    )
+    fallback: _Leaves = draw_simple(rng, n)
+    right = right.take(~combined, fallback)
+    value = np.where(combined, value, fallback.value)
+    return op, value, left, right, combined
+
+
+def _generate_combined(rng: Any, n: int) -> tuple[list[str], Any]:
+    """Векторный аналог gen.generate_problem для difficulty=1."""
+    op, value, left, right, combined = _combine_level(rng, n)
+
+    # Результат "просто число" строится заново, не более MAX_ATTEMPTS раз
+    pending = ~combined & (right.op == _NUMBER)
+    for _ in range(MAX_ATTEMPTS - 1):
+        rows = np.flatnonzero(pending)
+        if not rows.size:
+            break
+        retry = _combine_level(rng, rows.size)
+        op[rows], value[rows], combined[rows] = retry[0], retry[1], retry[4]
+        left.assign(rows, retry[2])
+        right.assign(rows, retry[3])
+        pending[rows] = ~retry[4] & (retry[3].op == _NUMBER)
+
+    rows = np.flatnonzero(pending)
+    if rows.size:
+        simple: _Leaves = draw_simple(rng, rows.size, allow_number=False)
+        right.assign(rows, simple)
+        value[rows] = simple.value
+
+    left_text: list[str] = left.render()
+    right_text: list[str] = right.render()
+    expressions: list[str] = [
+        f"{lhs} {_SIGNS[code]} {rhs}" if code >= 0 else rhs
+        for code, lhs, rhs in zip(op.tolist(), left_text, right_text)
+    ]
+    return expressions, value
+
+
+# ============================================================================
+# Пачка примеров
+# ============================================================================
+
+
+def generate_many(
+    difficulty: int, n: int, seed: int | None = None
+) -> tuple[list[str], array]:
+    """
+    Генерирует пачку из n примеров заданной сложности.
+
+    Уровни вне VECTORIZED_LEVELS и уровни с настройками, отличными от
+    gen.DEFAULT_LEVEL (см. gen.level_configs), генерируются скалярным
+    ProblemGenerator с тем же seed.
+
+    Args:
+        difficulty: Уровень сложности (0..MAX_DIFICULTY)
+        n: Количество примеров
+        seed: Seed для numpy.random.default_rng (None — случайный)
+
+    Returns:
+        tuple: (список выражений, array("i") ответов)
+
+    Raises:
+        ImportError: Если NumPy не установлен
+    """
+    if np is None:
+        raise ImportError("NumPy backend requires numpy: pip install numpy")
+    if (
+        difficulty not in VECTORIZED_LEVELS
+        or level_config(difficulty) != DEFAULT_LEVEL
+    ):
+        return ProblemGenerator(seed).generate_many(difficulty, n)
+
+    depth: int = MAX_DIFICULTY - difficulty
+    _LOGGER.info(
+        "Векторная генерация %d примеров сложности %d (глубина %d)",
+        n,
+        difficulty,
+        depth,
+        extra={"difficulty": difficulty},
+    )
+    rng = np.random.default_rng(seed)
+    if depth >= MAX_DIFICULTY:
+        leaves: _Leaves = draw_simple(rng, n, allow_number=False)
+        expressions, values = leaves.render(), leaves.value
+    else:
+        expressions, values = _generate_combined(rng, n)
+
+    answers: array = array("i")
+    answers.frombytes(values.astype(np.intc).tobytes())
+    return expressions, answers
@@ -0,0 +1,569 @@
+"""
+Обработчики сообщений бота для тренировки устного счёта.
+
+Обработчики зарегистрированы на router; диспетчер собирается в
+bot.create_app(), который также кладёт в его данные problem_pool —
+aiogram передаёт его обработчикам по имени аргумента.
+"""
+
+import logging
+from typing import TypedDict, cast
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, User
+from aiogram.utils.markdown import hbold
+
+from answers import AnswerFilter, AnswerKind, ParsedAnswer
+from pool import ProblemPool, remember_problem
+from replies import reply
+from sender import Priority
+from states import UserStates
+
+_LOGGER = logging.getLogger(__name__)
+
+router = Router(name=__name__)
+
+# ============================================================================
+# Типизация данных пользователя
+# ============================================================================
+
+
+class UserData(TypedDict):
+    """
+    Структура данных, сохраняемых в FSM для каждого пользователя.
+
+    Attributes:
+        difficulty: Уровень сложности (0-4, инвертированная шкала: 0=сложный, 4=простой)
+        points: Количество баллов пользователя (0-49, влияет на сложность)
+        expression: Текущее математическое выражение
+        answer: Правильный ответ на текущий пример
+        user_name: Полное имя пользователя из Telegram
+        recent: Хэши последних выданных примеров (см. pool.remember_problem)
+    """
+
+    difficulty: int
+    points: int
+    expression: str
+    answer: int
+    user_name: str
+    recent: list[int]
+
+
+# ============================================================================
+# Вспомогательные функции
+# ============================================================================
+
+
+async def message_answer(
+    message: Message,
+    text: str,
+    *,
+    separate: bool = False,
+    priority: int = Priority.NORMAL,
+) -> None:
+    """
+    Отправляет сообщение пользователю.
+
+    Внутри обработчика ответы копятся и после его завершения отправляются
+    минимальным числом сообщений (см. replies.py).
+
+    Args:
+        message: Объект сообщения от пользователя
+        text: Текст для отправки
+        separate: Отправить отдельным сообщением, не склеивая с соседними
+        priority: Приоритет отправки (новый пример уходит раньше поздравлений)
+    """
+    await reply(message, text, separate=separate, priority=priority)
+
+
+async def add_points(state: FSMContext) -> None:
+    """
+    Увеличивает количество баллов пользователя на 1.
+
+    Баллы ограничены диапазоном [0, 49]. При достижении каждого следующего
+    уровня сложности (каждые 10 баллов) уровень сложности увеличивается.
+
+    Args:
+        state: Контекст состояния FSM пользователя
+    """
+    try:
+        data: UserData = cast(UserData, await state.get_data())
+        points: int = data.get("points", 0)
+        user_name: str = data.get("user_name", "Unknown")
+
+        # Увеличиваем баллы с ограничением
+        points += 1
+        points = min(points, 49)
+        points = max(points, 0)
+
+        # Пересчитываем уровень сложности
+        difficulty: int = points // 10
+
+        _LOGGER.info(
+            "Пользователь %s справился и получил %d баллов.",
+            user_name,
+            points,
+            extra={"user_id": state.key.user_id, "difficulty": difficulty},
+        )
+
+        # Изменения копятся в сессии и сохраняются по завершении обработки
+        await state.update_data(difficulty=difficulty, points=points)
+    except Exception as e:
+        _LOGGER.error("Ошибка при добавлении баллов: %s", e)
+        # Сбрасываем в дефолтные значения при ошибке
+        await state.update_data(difficulty=0, points=0)
+
+
+async def subtract_points(state: FSMContext) -> None:
+    """
+    Уменьшает количество баллов пользователя на 1.
+
+    Баллы ограничены диапазоном [0, 49]. При уменьшении баллов уровень
+    сложности может понизиться.
+
+    Args:
+        state: Контекст состояния FSM пользователя
+    """
+    try:
+        data: UserData = cast(UserData, await state.get_data())
+        points: int = data.get("points", 1)
+        user_name: str = data.get("user_name", "Unknown")
+
+        # Уменьшаем баллы с ограничением
+        points -= 1
+        points = min(points, 49)
+        points = max(points, 0)
+
+        # Пересчитываем уровень сложности
+        difficulty: int = points // 10
+
+        _LOGGER.info(
+            "Пользователь %s не справился и получил %d баллов.",
+            user_name,
+            points,
+            extra={"user_id": state.key.user_id, "difficulty": difficulty},
+        )
+
+        # Изменения копятся в сессии и сохраняются по завершении обработки
+        await state.update_data(difficulty=difficulty, points=points)
+    except Exception as e:
+        _LOGGER.error("Ошибка при вычитании баллов: %s", e)
+        # Сбрасываем в дефолтные значения при ошибке
+        await state.update_data(difficulty=0, points=0)
+
+
+async def get_new_task(
+    message: Message, state: FSMContext, problem_pool: ProblemPool
+) -> None:
+    """
+    Генерирует и отправляет пользователю новый математический пример.
+
+    Функция генерирует пример в соответствии с текущим уровнем сложности,
+    сохраняет его в состояние пользователя и отправляет сообщение с примером.
+
+    Args:
+        message: Объект сообщения от пользователя
+        state: Контекст состояния FSM пользователя
+        problem_pool: Пул готовых примеров
+    """
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    data: UserData = cast(UserData, await state.get_data())
+    difficulty: int = data.get("difficulty", 0)
+
+    # Берём готовый пример из пула, пропуская недавно выданные пользователю
+    recent: list[int] = data.get("recent", [])
+    expression: str
+    answer: int
+    expression, answer = problem_pool.get(difficulty, recent)
+
+    # Сохраняем данные о примере в состоянии
+    await state.update_data(
+        expression=expression,
+        answer=answer,
+        user_name=user.full_name,
+        recent=remember_problem(recent, expression),
+    )
+
+    # Отправляем сообщение с примером
+    await message_answer(
+        message,
+        "🔔 Внимание-внимание! Новый примерчик! 🔔\n"
+        f"<code>{expression}</code>\n"
+        "Скорее пиши ответ! ⏱️",
+        priority=Priority.PROBLEM,
+    )
+
+    # Переводим пользователя в состояние ожидания первого ответа
+    await state.set_state(UserStates.await_1_answer)
+
+
+# ============================================================================
+# Обработчики команд
+# ============================================================================
+
+
+@router.message(CommandStart())
+async def start_handler(
+    message: Message, state: FSMContext, problem_pool: ProblemPool
+) -> None:
+    """
+    Обработчик команды /start.
+
+    Приветствует пользователя (нового или возвращающегося) и начинает игру.
+    Для новых пользователей выводит приветственное сообщение,
+    для возвращающихся - информацию о текущем прогрессе.
+
+    Args:
+        message: Объект сообщения с командой /start
+        state: Контекст состояния FSM пользователя
+        problem_pool: Пул готовых примеров
+    """
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    data: UserData = cast(UserData, await state.get_data())
+    difficulty: int | None = data.get("difficulty")
+
+    if difficulty is None:
+        # Новый пользователь
+        await message_answer(
+            message,
+            f"Приветик, {hbold(user.full_name)}! 🌟\n"
+            "Я твой весёлый помощник в мире вычислений! 🚀\n\n"
+            "Давай начнём с простеньких примеров, а если ты будешь щёлкать их как орешки, "
+            "я подкину тебе задачки посложнее! 😉\n"
+            "Со мной будешь суперзвездой математики! 💫",
+        )
+        await state.update_data(difficulty=0)
+        _LOGGER.info(
+            "Новый пользователь: %s, id: %d",
+            user.full_name,
+            user.id,
+            extra={"user_id": user.id},
+        )
+    else:
+        # Возвращающийся пользователь
+        await message_answer(
+            message,
+            f"Снова здравствуй, {hbold(user.full_name)}! 🌈\n"
+            f"Сейчас мы с тобой на уровне сложности: {difficulty} ⚡️",
+        )
+        _LOGGER.info(
+            "Повторный запуск: %s, id: %d",
+            user.full_name,
+            user.id,
+            extra={"user_id": user.id, "difficulty": difficulty},
+        )
+
+    # Обновляем имя пользователя и начинаем игру
+    await state.update_data(user_name=user.full_name)
+    await get_new_task(message, state, problem_pool)
+
+
+@router.message(Command("stop"))
+async def stop_handler(message: Message, state: FSMContext) -> None:
+    """
+    Обработчик команды /stop.
+
+    Очищает состояние пользователя и отправляет прощальное сообщение.
+
+    Args:
+        message: Объект сообщения с командой /stop
+        state: Контекст состояния FSM пользователя
+    """
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    try:
+        await state.clear()
+    finally:
+        await message_answer(
+            message,
+            f"Пока-пока, {hbold(user.full_name)}! 👋\n"
+            "Я бережно записываю твои успехи... шучу, забыл всё! 🤫\n"
+            "Возвращайся скорее, будем играть ещё! 🎮",
+        )
+        _LOGGER.info(
+            "Пользователь %s завершил работу с ботом",
+            user.full_name,
+            extra={"user_id": user.id},
+        )
+
+
+# ============================================================================
+# Обработчики ответов пользователя
+# ============================================================================
+
+
+@router.message(UserStates.await_1_answer, AnswerFilter())
+async def answer1_handler(
+    message: Message,
+    state: FSMContext,
+    problem_pool: ProblemPool,
+    parsed_answer: ParsedAnswer,
+) -> None:
+    """
+    Обработчик первой попытки ответа.
+
+    Проверяет ответ пользователя на правильность и:
+    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
+    - Если неверно: предлагает попробовать ещё раз, переводит во вторую попытку
+    - Если некорректный ввод: просит ввести число
+
+    Args:
+        message: Объект сообщения с ответом пользователя
+        state: Контекст состояния FSM пользователя
+        problem_pool: Пул готовых примеров
+        parsed_answer: Разобранный ответ (см. AnswerFilter)
+    """
+    # Сообщение без текста (стикер, фото)
+    if parsed_answer.kind is AnswerKind.EMPTY:
+        _LOGGER.error("Сообщение без текста")
+        return
+
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    data: UserData = cast(UserData, await state.get_data())
+
+    if not parsed_answer.is_number:
+        # Некорректный ввод - не число
+        await message_answer(
+            message,
+            "Циферки-циферки! 🔢\n"
+            "Давай только числа, как настоящие математики! 🧮\n"
+            "Попробуй ещё разок! 😊\n"
+            "Вот наш пример:\n"
+            f"<code>{data.get('expression')}</code>\n",
+        )
+        return
+
+    right_answer: int = data.get("answer", 0)
+
+    if parsed_answer.value == right_answer:
+        # Правильный ответ с первой попытки - золотая медаль!
+        # Одиночный эмодзи — отдельным сообщением, чтобы Telegram показал его крупно
+        await message_answer(message, "🤩", separate=True)
+        await message_answer(message, "🎉 УРА!!! 🎉")
+        await message_answer(
+            message, "С ПЕРВОЙ попытки! 🌟\nЭто точно золотая медаль! 🥇"
+        )
+        _LOGGER.info(
+            "Пользователь %s решил пример с первой попытки",
+            user.full_name,
+            extra={"user_id": user.id},
+        )
+        await add_points(state)
+        await get_new_task(message, state, problem_pool)
+    else:
+        # Неправильный ответ - даём вторую попытку
+        await message_answer(
+            message,
+            "Ой-ой-ой! 🫢\n"
+            "Кажется, тут маленькая ошибка! 🧐\n"
+            "Проверь аккуратненько и попробуй ещё раз!\n"
+            "Вот наш пример:\n"
+            f"<code>{data.get('expression')}</code>\n"
+            "Ты обязательно справишься! 💪",
+        )
+        await state.set_state(UserStates.await_2_answer)
+        _LOGGER.info(
+            "Пользователь %s ошибся первый раз",
+            user.full_name,
+            extra={"user_id": user.id},
+        )
+
+
+@router.message(UserStates.await_2_answer, AnswerFilter())
+async def answer2_handler(
+    message: Message,
+    state: FSMContext,
+    problem_pool: ProblemPool,
+    parsed_answer: ParsedAnswer,
+) -> None:
+    """
+    Обработчик второй попытки ответа.
+
+    Проверяет ответ пользователя на правильность и:
+    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
+    - Если неверно: предлагает попробовать ещё раз, переводит в третью попытку
+    - Если некорректный ввод: просит ввести число
+
+    Args:
+        message: Объект сообщения с ответом пользователя
+        state: Контекст состояния FSM пользователя
+        problem_pool: Пул готовых примеров
+        parsed_answer: Разобранный ответ (см. AnswerFilter)
+    """
+    # Сообщение без текста (стикер, фото)
+    if parsed_answer.kind is AnswerKind.EMPTY:
+        _LOGGER.error("Сообщение без текста")
+        return
+
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    data: UserData = cast(UserData, await state.get_data())
+
+    if not parsed_answer.is_number:
+        # Некорректный ввод - не число
+        await message_answer(
+            message,
+            "Ой, это что ли буквы?... а надо цифры! 🔤➡️🔢\n"
+            "Попробуй написать просто число, как мы договаривались! 🤝\n"
+            "Вот наш пример:\n"
+            f"<code>{data.get('expression')}</code>\n",
+        )
+        return
+
+    right_answer: int = data.get("answer", 0)
+
+    if parsed_answer.value == right_answer:
+        # Правильный ответ со второй попытки - серебряная медалька
+        await message_answer(
+            message,
+            "🎈 Ура! Получилось! 🎈\n"
+            "Со второй попытки - это круто! 😎\n"
+            "Твоя награда - серебряная медалька! 🥈",
+        )
+        _LOGGER.info(
+            "Пользователь %s решил пример со второй попытки",
+            user.full_name,
+            extra={"user_id": user.id},
+        )
+        await add_points(state)
+        await get_new_task(message, state, problem_pool)
+    else:
+        # Неправильный ответ - даём третью и последнюю попытку
+        await message_answer(
+            message,
+            "Хм-м... 🤔\n"
+            "Опять маленькая помарка! 🎨\n"
+            "Давай посмотрим внимательнее:\n"
+            f"<code>{data.get('expression')}</code>\n"
+            "Ты почти у цели! 🌈",
+        )
+        await state.set_state(UserStates.await_3_answer)
+
+
+@router.message(UserStates.await_3_answer, AnswerFilter())
+async def answer3_handler(
+    message: Message,
+    state: FSMContext,
+    problem_pool: ProblemPool,
+    parsed_answer: ParsedAnswer,
+) -> None:
+    """
+    Обработчик третьей (последней) попытки ответа.
+
+    Проверяет ответ пользователя на правильность и:
+    - Если верно: поздравляет, добавляет баллы, генерирует новый пример
+    - Если неверно: показывает правильный ответ, вычитает баллы, генерирует новый пример
+    - Если некорректный ввод: просит ввести число
+
+    Args:
+        message: Объект сообщения с ответом пользователя
+        state: Контекст состояния FSM пользователя
+        problem_pool: Пул готовых примеров
+        parsed_answer: Разобранный ответ (см. AnswerFilter)
+    """
+    # Сообщение без текста (стикер, фото)
+    if parsed_answer.kind is AnswerKind.EMPTY:
+        _LOGGER.error("Сообщение без текста")
+        return
+
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    data: UserData = cast(UserData, await state.get_data())
+
+    if not parsed_answer.is_number:
+        # Некорректный ввод - не число
+        await message_answer(
+            message,
+            "Кажется, кто-то хочет поиграть в загадки? 🎭\n"
+            "Но мне нужно именно число - давай попробуем ещё раз! 🤗\n"
+            "Вот наш пример:\n"
+            f"<code>{data.get('expression')}</code>\n",
+        )
+        return
+
+    right_answer: int = data.get("answer", 0)
+
+    if parsed_answer.value == right_answer:
+        # Правильный ответ с третьей попытки - победа!
+        await message_answer(
+            message,
+            "🎆 ФАНФАРЫ! 🎇\n"
+            "С третьей попытки - это победа! 🏁\n"
+            "Ты настоящий упорный боец! 💥",
+        )
+        await add_points(state)
+        await get_new_task(message, state, problem_pool)
+    else:
+        # Неправильный ответ с третьей попытки - показываем ответ и вычитаем баллы
+        await message_answer(message, "🫂 Не грусти!")
+        await message_answer(
+            message,
+            "Этот пример был слишком хитрющим! 🦊\n"
+            f"Правильный ответ: <b>{right_answer}</b>\n"
+            "Давай возьмём новый пример - он точно по зубам! 😉\n"
+            "Уже бегу искать... 🏃",
+        )
+        await subtract_points(state)
+        await get_new_task(message, state, problem_pool)
+
+
+# ============================================================================
+# Fallback обработчик
+# ============================================================================
+
+
+@router.message()
+async def echo_handler(message: types.Message) -> None:
+    """
+    Fallback-обработчик для всех остальных сообщений.
+
+    Активируется, когда пользователь отправляет сообщение, не соответствующее
+    ни одному из ожидаемых состояний.
+
+    Args:
+        message: Объект сообщения от пользователя
+    """
+    # Безопасное получение пользователя
+    user: User | None = message.from_user
+    if not user:
+        _LOGGER.error("Сообщение без пользователя")
+        return
+
+    await message_answer(
+        message,
+        "🤖 Я понимаю только числовые ответы, давай играть! 🎲\nДля начала используй команду /start",
+    )
+    _LOGGER.info(
+        "Пользователь %s написал какую-то дичь",
+        user.full_name,
+        extra={"user_id": user.id},
+    )
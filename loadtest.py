@@ -0,0 +1,435 @@
+"""
+Нагрузочный тест бота с локальной заглушкой Telegram Bot API.
+
+Запуск:
+    python -m loadtest --students 100 1000 5000          # по прогону на число
+    python -m loadtest --students 2000 --accuracy 0.6 --flood-rate 0.01
+    python -m loadtest --send-rate 1000 --output load.json
+
+Три части:
+    FakeTelegram — aiohttp-сервер вместо api.telegram.org: getUpdates,
+        sendMessage (с задержкой и инъекцией ответов 429) и getMe;
+    student() — ученик: /start, затем rounds ответов на примеры,
+        правильных с вероятностью accuracy (проходит состояния
+        await_1..3_answer);
+    отчёт — обновления в секунду, перцентили задержки первого ответа,
+        число команд Redis на обновление (INFO commandstats, если задан REDIS).
+
+Бот собирается через bot.create_app и получает обновления long polling'ом,
+как в рабочем режиме. Лимиты отправки (SEND_*) действуют как в проде;
+--send-rate поднимает общий лимит, чтобы измерить сам бот.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from itertools import count
+from typing import Any
+
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+# Фиктивный токен: сервер принимает любой
+TOKEN = "42:LOADTEST"
+
+# Выражение текущего примера в ответе бота
+_CODE = re.compile(r"<code>(.*?)</code>", re.S)
+
+# Сколько секунд ученик ждёт ответа бота, прежде чем сдаться
+REPLY_TIMEOUT = 60.0
+
+
+# ============================================================================
+# Заглушка Bot API
+# ============================================================================
+
+
+class FakeTelegram:
+    """
+    Локальный Bot API: выдаёт обновления учеников и принимает ответы бота.
+
+    Attributes:
+        latency: Задержка ответа на sendMessage, секунды
+        flood_rate: Доля sendMessage, на которые отвечается 429
+        retry_after: retry_after в ответе 429, секунды
+        delivered: Число обновлений, выданных боту
+        sent: Число принятых сообщений бота
+        flooded: Число ответов 429
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: int | None = None,
+    ) -> None:
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.delivered = 0
+        self.sent = 0
+        self.flooded = 0
+        self._rng = random.Random(seed)
+        self._ids = count(1)
+        self._pending: list[dict[str, Any]] = []
+        self._arrived = asyncio.Event()
+        self._inboxes: defaultdict[int, asyncio.Queue[str]] = defaultdict(
+            asyncio.Queue
+        )
+
+    def app(self) -> web.Application:
+        """aiohttp-приложение с маршрутами Bot API."""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        return app
+
+    # ------------------------------------------------------------------------
+    # Сторона учеников
+    # ------------------------------------------------------------------------
+
+    def push(self, chat_id: int, text: str) -> None:
+        """Ставит сообщение ученика в очередь обновлений."""
+        message: dict[str, Any] = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"S{chat_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text)}
+            ]
+        self._pending.append({"update_id": next(self._ids), "message": message})
+        self._arrived.set()
+
+    async def receive(self, chat_id: int) -> str:
+        """Ждёт следующего сообщения бота в чат ученика."""
+        return await self._inboxes[chat_id].get()
+
+    # ------------------------------------------------------------------------
+    # Сторона бота
+    # ------------------------------------------------------------------------
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method: str = request.match_info["method"].lower()
+        params: dict[str, Any] = dict(await request.post())
+        if method == "getupdates":
+            return self._ok(await self._get_updates(params))
+        if method == "sendmessage":
+            return await self._send_message(params)
+        if method == "getme":
+            return self._ok({"id": 42, "is_bot": True, "first_name": "LoadTest"})
+        return self._ok(True)
+
+    async def _get_updates(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        """getUpdates: подтверждает offset и ждёт новых обновлений до timeout."""
+        offset: int = int(params.get("offset") or 0)
+        if offset:
+            self._pending = [u for u in self._pending if u["update_id"] >= offset]
+        if not self._pending:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(
+                    self._arrived.wait(), float(params.get("timeout") or 0)
+                )
+            except asyncio.TimeoutError:
+                return []
+        updates: list[dict[str, Any]] = self._pending[: int(params.get("limit") or 100)]
+        self.delivered += len(updates)
+        return updates
+
+    async def _send_message(self, params: dict[str, Any]) -> web.Response:
+        """sendMessage: задержка, при необходимости 429, доставка ученику."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_rate and self._rng.random() < self.flood_rate:
+            self.flooded += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after "
+                    f"{self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            )
+        chat_id: int = int(params["chat_id"])
+        text: str = str(params["text"])
+        self.sent += 1
+        self._inboxes[chat_id].put_nowait(text)
+        return self._ok(
+            {
+                "message_id": next(self._ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": text,
+            }
+        )
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+
+# ============================================================================
+# Ученики
+# ============================================================================
+
+
+def solve(expression: str) -> int:
+    """Правильный ответ на пример в "учебной" записи."""
+    return round(eval(expression.replace("×", "*").replace("÷", "/")))
+
+
+async def student(
+    api: FakeTelegram,
+    chat_id: int,
+    rounds: int,
+    accuracy: float,
+    think: float,
+    latencies: list[float],
+    rng: random.Random,
+) -> bool:
+    """
+    Играет за одного ученика: /start и rounds ответов.
+
+    После каждого сообщения ученик ждёт ответа с примером (<code>...</code>),
+    записывая задержку до первого сообщения бота.
+
+    Returns:
+        bool: Дошёл ли ученик до конца (False — бот не ответил вовремя)
+    """
+    text: str = "/start"
+    for _ in range(rounds + 1):
+        api.push(chat_id, text)
+        start: float = time.perf_counter()
+        expression: str | None = None
+        try:
+            while expression is None:
+                reply: str = await asyncio.wait_for(
+                    api.receive(chat_id), REPLY_TIMEOUT
+                )
+                if start:
+                    latencies.append(time.perf_counter() - start)
+                    start = 0.0
+                codes: list[str] = _CODE.findall(reply)
+                if codes:
+                    expression = codes[-1]
+        except asyncio.TimeoutError:
+            return False
+
+        answer: int = solve(expression)
+        text = str(answer if rng.random() < accuracy else answer + 1)
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+    return True
+
+
+# ============================================================================
+# Прогон
+# ============================================================================
+
+
+def percentile(values: list[float], q: float) -> float:
+    """q-й перцентиль (0..100) списка значений."""
+    if not values:
+        return 0.0
+    ordered: list[float] = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+async def redis_commands(url: str | None) -> int | None:
+    """Суммарное число выполненных команд Redis (None — Redis не задан)."""
+    if not url or "://" in url and not url.startswith(("redis://", "rediss://")):
+        return None
+    from redis.asyncio import Redis
+
+    client: Redis = Redis.from_url(url if "://" in url else f"redis://{url}")
+    try:
+        stats: dict[str, Any] = await client.info("commandstats")
+    finally:
+        await client.aclose()
+    return sum(
+        int(value["calls"])
+        for name, value in stats.items()
+        if name != "cmdstat_info"
+    )
+
+
+async def run(
+    dp: Any, students: int, args: argparse.Namespace, redis: str | None
+) -> dict[str, Any]:
+    """
+    Прогоняет students учеников через бота и возвращает отчёт.
+
+    Returns:
+        dict: Пропускная способность, задержки и команды Redis на обновление
+    """
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    api = FakeTelegram(args.latency, args.flood_rate, args.retry_after, args.seed)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port: int = runner.addresses[0][1]
+
+    bot = Bot(
+        TOKEN,
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"),
+            limit=args.connections,
+        ),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    polling: asyncio.Task[None] = asyncio.create_task(
+        dp.start_polling(bot, polling_timeout=1, handle_signals=False)
+    )
+    # Ждём запуска: прогрева пула и первого getUpdates
+    while not api.delivered and not polling.done():
+        api.push(0, "/stop")
+        await asyncio.sleep(0.2)
+
+    rng = random.Random(args.seed)
+    latencies: list[float] = []
+    redis_before: int | None = await redis_commands(redis)
+    delivered_before: int = api.delivered
+    start: float = time.perf_counter()
+    finished: list[bool] = await asyncio.gather(
+        *(
+            student(
+                api,
+                chat_id,
+                args.rounds,
+                args.accuracy,
+                args.think,
+                latencies,
+                random.Random(rng.random()),
+            )
+            for chat_id in range(1, students + 1)
+        )
+    )
+    elapsed: float = time.perf_counter() - start
+    updates: int = api.delivered - delivered_before
+    redis_after: int | None = await redis_commands(redis)
+
+    await dp.stop_polling()
+    await polling
+    await runner.cleanup()
+
+    return {
+        "students": students,
+        "finished": sum(finished),
+        "seconds": elapsed,
+        "updates": updates,
+        "updates_per_s": updates / elapsed,
+        "messages_per_s": api.sent / elapsed,
+        "flooded": api.flooded,
+        "latency_ms": {
+            f"p{q}": percentile(latencies, q) * 1000 for q in (50, 95, 99)
+        },
+        "redis_per_update": (
+            (redis_after - redis_before) / updates
+            if redis_before is not None and redis_after is not None and updates
+            else None
+        ),
+    }
+
+
+def print_report(reports: list[dict[str, Any]]) -> None:
+    """Печатает таблицу прогонов."""
+    print(
+        f"{'students':>8} {'done':>6} {'upd/s':>8} {'msg/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'429':>5} {'redis/upd':>9}"
+    )
+    for r in reports:
+        redis: str = (
+            f"{r['redis_per_update']:.2f}" if r["redis_per_update"] is not None else "-"
+        )
+        lat: dict[str, float] = r["latency_ms"]
+        print(
+            f"{r['students']:>8} {r['finished']:>6} {r['updates_per_s']:>8.1f} "
+            f"{r['messages_per_s']:>8.1f} {lat['p50']:>8.1f} {lat['p95']:>8.1f} "
+            f"{lat['p99']:>8.1f} {r['flooded']:>5} {redis:>9}"
+        )
+
+
+# ============================================================================
+# Точка входа
+# ============================================================================
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest", description="Нагрузочный тест бота"
+    )
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--rounds", type=int, default=10, help="ответов на ученика")
+    parser.add_argument("--accuracy", type=float, default=0.7)
+    parser.add_argument(
+        "--think", type=float, default=1.0,
+        help="средняя пауза ученика перед ответом, секунды",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05,
+        help="задержка ответа Bot API на sendMessage, секунды",
+    )
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument(
+        "--send-rate", type=float,
+        help="общий лимит отправки, сообщений в секунду (SEND_GLOBAL_RATE)",
+    )
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="записать отчёт в JSON")
+    return parser.parse_args(argv)
+
+
+async def amain(args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Собирает приложение и выполняет прогоны."""
+    # Переменные окружения читаются модулями при импорте в create_app
+    if args.send_rate:
+        os.environ["SEND_GLOBAL_RATE"] = str(args.send_rate)
+    from bot import Config, create_app
+
+    config: Config = Config.from_env()._replace(token=TOKEN)
+    dp = create_app(config)
+    reports: list[dict[str, Any]] = []
+    for students in args.students:
+        report: dict[str, Any] = await run(dp, students, args, config.redis)
+        print_report([report])
+        reports.append(report)
+    return reports
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Запускает нагрузочный тест и печатает отчёт."""
+    args: argparse.Namespace = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    reports: list[dict[str, Any]] = asyncio.run(amain(args))
+    print()
+    print_report(reports)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 0 if all(r["finished"] == r["students"] for r in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Неблокирующее логирование: очередь, отдельный поток записи и JSON.
+
+Обработчики и генератор только кладут запись в очередь (QueueHandler);
+форматирование и запись в stderr выполняет поток QueueListener, поэтому
+вывод логов не задерживает ответы под нагрузкой. Сообщения логируются
+с ленивым %-форматированием, а поля записи передаются через extra:
+
+    _LOGGER.info("Пример: %s", expression, extra={"difficulty": difficulty})
+
+Настройки (переменные окружения):
+    LOG_FORMAT — "text" (по умолчанию) или "json": запись в одну строку
+        JSON с полями STRUCTURED_FIELDS, если они заданы;
+    LOG_SAMPLE — доля записей ниже WARNING, которые выводятся, по логгерам:
+        "gen=0.01,handlers=0.1" (логгер и все вложенные в него);
+    LOG_QUEUE_SIZE — размер очереди; при переполнении записи отбрасываются
+        (и учитываются в метрике log_records_dropped_total), а не ждут.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv
+from typing import Any
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Формат вывода: "text" или "json"
+LOG_FORMAT = getenv("LOG_FORMAT", "text")
+
+# Доля выводимых записей ниже WARNING по логгерам: "gen=0.01,handlers=0.1"
+LOG_SAMPLE = getenv("LOG_SAMPLE", "")
+
+# Максимальное число записей в очереди
+LOG_QUEUE_SIZE = int(getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Поля, которые переносятся из extra в JSON-запись
+STRUCTURED_FIELDS = ("user_id", "handler", "difficulty", "latency_ms")
+
+
+def parse_sample(spec: str) -> dict[str, float]:
+    """
+    Разбирает LOG_SAMPLE.
+
+    Args:
+        spec: Строка вида "gen=0.01,handlers=0.1"
+
+    Returns:
+        dict: Имя логгера → доля выводимых записей (0..1)
+
+    Raises:
+        ValueError: Если доля не число или вне диапазона 0..1
+    """
+    rates: dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        value: float = float(rate)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"LOG_SAMPLE rate for {name!r} must be in 0..1")
+        rates[name.strip()] = value
+    return rates
+
+
+# ============================================================================
+# Форматирование и выборка
+# ============================================================================
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value: Any = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает заданную долю записей ниже WARNING для выбранных логгеров.
+
+    Выборка детерминированная: для доли 0.1 проходит каждая десятая
+    запись логгера. Предупреждения и ошибки проходят всегда.
+
+    Attributes:
+        rates: Имя логгера → доля выводимых записей
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self._credit: dict[str, float] = {}
+        # Доля для каждого встреченного имени (с учётом родительских логгеров)
+        self._resolved: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate: float | None = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            parts: list[str] = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix: str = ".".join(parts[:i])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate: float = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        credit: float = self._credit.get(record.name, 1.0 - rate) + rate
+        if credit >= 1.0:
+            self._credit[record.name] = credit - 1.0
+            return True
+        self._credit[record.name] = credit
+        return False
+
+
+# ============================================================================
+# Очередь
+# ============================================================================
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке и без ожидания.
+
+    Стандартный QueueHandler.prepare форматирует сообщение до постановки
+    в очередь; здесь запись передаётся как есть, а сообщение собирается
+    в потоке QueueListener. Поэтому аргументы записи должны быть
+    неизменяемыми (числа, строки), что верно для логов этого проекта.
+
+    Attributes:
+        dropped: Число записей, отброшенных из-за переполнения очереди
+    """
+
+    def __init__(self, records: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener, который при остановке ждёт места в заполненной очереди."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+# Обработчик текущей конфигурации (см. setup_logging)
+_HANDLER: AsyncQueueHandler | None = None
+_LISTENER: QueueListener | None = None
+
+
+def queue_handler() -> AsyncQueueHandler | None:
+    """Обработчик-очередь, установленный setup_logging (или None)."""
+    return _HANDLER
+
+
+def setup_logging(
+    level: str | int = "INFO",
+    fmt: str = LOG_FORMAT,
+    sample: str = LOG_SAMPLE,
+    queue_size: int = LOG_QUEUE_SIZE,
+) -> QueueListener:
+    """
+    Направляет корневой логгер в очередь и запускает поток записи в stderr.
+
+    Повторный вызов заменяет прежнюю конфигурацию. Поток останавливается
+    (с выводом оставшихся записей) при завершении интерпретатора
+    или вызовом stop_logging().
+
+    Args:
+        level: Уровень корневого логгера
+        fmt: "text" или "json"
+        sample: Доли выводимых записей по логгерам (см. parse_sample)
+        queue_size: Размер очереди записей
+
+    Returns:
+        QueueListener: Запущенный поток записи
+
+    Raises:
+        ValueError: Если формат или LOG_SAMPLE некорректны
+    """
+    global _HANDLER, _LISTENER
+
+    if fmt not in ("text", "json"):
+        raise ValueError(f"Unknown LOG_FORMAT: {fmt!r}")
+    formatter: logging.Formatter = (
+        JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(formatter)
+
+    handler = AsyncQueueHandler(queue.Queue(queue_size))
+    rates: dict[str, float] = parse_sample(sample)
+    if rates:
+        # Фильтр на обработчике-очереди: отброшенные записи не попадают в очередь
+        handler.addFilter(SamplingFilter(rates))
+
+    stop_logging()
+    root: logging.Logger = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _HANDLER = handler
+    _LISTENER = DrainingQueueListener(
+        handler.queue, stream, respect_handler_level=True
+    )
+    _LISTENER.start()
+    return _LISTENER
+
+
+def stop_logging() -> None:
+    """Выводит оставшиеся в очереди записи и останавливает поток записи."""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,449 @@
+"""
+Метрики в текстовом формате Prometheus и эндпоинт /metrics.
+
+Собирает задержки обработчиков (через middleware диспетчера), задержки и
+отказы генерации по уровням сложности, задержки и ошибки обращений к
+хранилищу FSM. Сервер метрик включается переменной окружения METRICS_PORT.
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from os import getenv
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Порт HTTP-сервера метрик (пусто — сервер не запускается)
+METRICS_PORT = getenv("METRICS_PORT", "")
+
+# Адрес HTTP-сервера метрик
+METRICS_HOST = getenv("METRICS_HOST", "0.0.0.0")
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Границы корзин для генерации примеров (секунды)
+GENERATION_BUCKETS: tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+)
+
+LabelValues = tuple[str, ...]
+
+
+# ============================================================================
+# Типы метрик
+# ============================================================================
+
+
+def _escape(value: str) -> str:
+    """Экранирует значение метки."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    """Форматирует метки в виде {name="value",...}."""
+    pairs: list[str] = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    Базовый класс метрики с метками.
+
+    Attributes:
+        name: Имя метрики
+        help: Описание для строки # HELP
+        labels: Имена меток
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.register(self)
+
+    def samples(self) -> Iterator[str]:
+        """Строки со значениями метрики."""
+        return iter(())
+
+    def render(self) -> list[str]:
+        """Метрика в текстовом формате Prometheus."""
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1.0) -> None:
+        """Увеличивает счётчик для заданных значений меток."""
+        key: LabelValues = tuple(str(v) for v in label_values)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *label_values: Any) -> float:
+        """Текущее значение счётчика."""
+        return self._values.get(tuple(str(v) for v in label_values), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: [счётчики корзин..., +Inf], сумма
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        """Добавляет наблюдение."""
+        key: LabelValues = tuple(str(v) for v in label_values)
+        counts: list[int] | None = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, *label_values: Any) -> Iterator[None]:
+        """Измеряет длительность блока with."""
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values: Any) -> int:
+        """Число наблюдений."""
+        return sum(self._counts.get(tuple(str(v) for v in label_values), ()))
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in sorted(self._counts.items()):
+            cumulative: int = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le: str = "+Inf" if bound == float("inf") else repr(bound)
+                labels: str = _format_labels(self.labels, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {self._sums[key]}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class CallbackMetric(Metric):
+    """Метрика, значения которой читаются функцией в момент сбора."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...],
+        kind: str,
+        collect: Callable[[], dict[LabelValues, float]],
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self._collect = collect
+
+    def samples(self) -> Iterator[str]:
+        try:
+            values: dict[LabelValues, float] = self._collect()
+        except Exception as e:
+            _LOGGER.error("Ошибка сбора метрики %s: %s", self.name, e)
+            return
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Registry:
+    """Набор зарегистрированных метрик."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        """Регистрирует метрику (повторная регистрация имени заменяет её)."""
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ============================================================================
+# Метрики бота
+# ============================================================================
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_latency_seconds", "Время работы обработчика", ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)
+)
+GENERATION_LATENCY = Histogram(
+    "gen_generation_latency_seconds",
+    "Время генерации одного примера",
+    ("difficulty",),
+    GENERATION_BUCKETS,
+)
+GENERATION_REJECTIONS = Counter(
+    "gen_rejections_total", "Отклонённые операции при генерации", ("difficulty",)
+)
+GENERATION_RETRIES = Counter(
+    "gen_retries_total", "Повторные генерации из-за результата-числа", ("difficulty",)
+)
+STORAGE_LATENCY = Histogram(
+    "fsm_storage_latency_seconds", "Время обращения к хранилищу FSM", ("operation",)
+)
+STORAGE_ERRORS = Counter(
+    "fsm_storage_errors_total", "Ошибки обращения к хранилищу FSM", ("operation",)
+)
+
+
+@contextmanager
+def storage_call(operation: str) -> Iterator[None]:
+    """Измеряет обращение к хранилищу и считает ошибки."""
+    start: float = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STORAGE_ERRORS.inc(operation)
+        raise
+    finally:
+        STORAGE_LATENCY.observe(time.perf_counter() - start, operation)
+
+
+def register_pool(pool: Any) -> None:
+    """
+    Регистрирует метрики пула примеров (размер очередей, попадания, промахи).
+
+    Args:
+        pool: Объект с методом stats() -> {уровень: {"size", "hits", "misses"}}
+    """
+
+    def collect(field: str) -> Callable[[], dict[LabelValues, float]]:
+        return lambda: {
+            (str(level),): float(stats[field]) for level, stats in pool.stats().items()
+        }
+
+    labels: tuple[str, ...] = ("difficulty",)
+    CallbackMetric(
+        "pool_size", "Готовых примеров в очереди", labels, "gauge", collect("size")
+    )
+    CallbackMetric(
+        "pool_hits_total", "Выдачи из пула", labels, "counter", collect("hits")
+    )
+    CallbackMetric(
+        "pool_misses_total",
+        "Синхронные генерации при пустом пуле",
+        labels,
+        "counter",
+        collect("misses"),
+    )
+
+
+def register_ordering(isolation: Any) -> None:
+    """
+    Регистрирует метрики последовательной обработки обновлений.
+
+    Args:
+        isolation: Объект со свойствами active_keys и waiting
+    """
+    CallbackMetric(
+        "ordering_active_keys",
+        "Пользователи с обновлениями в обработке",
+        (),
+        "gauge",
+        lambda: {(): float(isolation.active_keys)},
+    )
+    CallbackMetric(
+        "ordering_waiting_updates",
+        "Обновления, ждущие завершения предыдущих того же пользователя",
+        (),
+        "gauge",
+        lambda: {(): float(isolation.waiting)},
+    )
+
+
+def register_logging(handler: Any) -> None:
+    """
+    Регистрирует метрики очереди логов.
+
+    Args:
+        handler: Обработчик-очередь со свойствами queue и dropped (см. logs.py)
+    """
+    CallbackMetric(
+        "log_queue_size",
+        "Записи логов, ожидающие вывода",
+        (),
+        "gauge",
+        lambda: {(): float(handler.queue.qsize())},
+    )
+    CallbackMetric(
+        "log_records_dropped_total",
+        "Записи логов, отброшенные из-за переполнения очереди",
+        (),
+        "counter",
+        lambda: {(): float(handler.dropped)},
+    )
+
+
+def register_sender(scheduler: Any) -> None:
+    """
+    Регистрирует метрику глубины очереди исходящих сообщений.
+
+    Args:
+        scheduler: Объект с методом depth() -> {приоритет: число сообщений}
+    """
+    CallbackMetric(
+        "bot_send_queue_depth",
+        "Сообщения в очереди на отправку",
+        ("priority",),
+        "gauge",
+        lambda: {
+            (str(priority),): float(size)
+            for priority, size in scheduler.depth().items()
+        },
+    )
+
+
+def observe_generation(
+    difficulty: int, durations: list[float], rejections: int, retries: int
+) -> None:
+    """Учитывает результаты генерации пачки примеров одного уровня."""
+    for duration in durations:
+        GENERATION_LATENCY.observe(duration, difficulty)
+    if rejections:
+        GENERATION_REJECTIONS.inc(difficulty, amount=rejections)
+    if retries:
+        GENERATION_RETRIES.inc(difficulty, amount=retries)
+
+
+# ============================================================================
+# Middleware и HTTP-эндпоинт
+# ============================================================================
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: измеряет время и ошибки каждого обработчика."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object: HandlerObject | None = data.get("handler")
+        name: str = (
+            getattr(handler_object.callback, "__name__", "unknown")
+            if handler_object
+            else "unknown"
+        )
+        start: float = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed: float = time.perf_counter() - start
+            HANDLER_LATENCY.observe(elapsed, name)
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                user: Any = data.get("event_from_user")
+                _LOGGER.debug(
+                    "Обработчик %s: %.1f мс",
+                    name,
+                    elapsed * 1000,
+                    extra={
+                        "handler": name,
+                        "user_id": getattr(user, "id", None),
+                        "latency_ms": round(elapsed * 1000, 3),
+                    },
+                )
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """Отдаёт все метрики в текстовом формате Prometheus."""
+    return web.Response(
+        text=REGISTRY.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+class MetricsServer:
+    """
+    HTTP-сервер с эндпоинтом /metrics.
+
+    Attributes:
+        host: Адрес сервера
+        port: Порт сервера (пусто — сервер не запускается)
+    """
+
+    def __init__(self, host: str = METRICS_HOST, port: str = METRICS_PORT) -> None:
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        """Запускает сервер, если задан порт."""
+        if not self.port or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, int(self.port)).start()
+        _LOGGER.info("Метрики доступны на %s:%d/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        """Останавливает сервер."""
+        if self._runner is None:
+            return
+        runner: web.AppRunner = self._runner
+        self._runner = None
+        await runner.cleanup()
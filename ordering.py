@@ -0,0 +1,67 @@
+"""
+Последовательная обработка обновлений одного пользователя.
+
+Обновления с одинаковым ключом FSM (чат и пользователь) выполняются строго
+по очереди, обновления разных пользователей — параллельно. Блокировка
+берётся в SessionMiddleware через events_isolation диспетчера, поэтому
+следующее сообщение пользователя видит уже сохранённое состояние.
+"""
+
+import asyncio
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+
+class _KeyLock:
+    """Блокировка ключа и число обновлений, которые её держат или ждут."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedEventIsolation(BaseEventIsolation):
+    """
+    Изоляция событий с блокировкой на каждый ключ FSM.
+
+    В отличие от SimpleEventIsolation, блокировка удаляется, как только её
+    никто не держит и не ждёт, поэтому память пропорциональна числу
+    обновлений в обработке, а не числу пользователей за всё время работы.
+    Ожидающие обновления получают блокировку в порядке поступления.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[StorageKey, _KeyLock] = {}
+
+    @property
+    def active_keys(self) -> int:
+        """Число ключей, для которых есть обновления в обработке."""
+        return len(self._locks)
+
+    @property
+    def waiting(self) -> int:
+        """Число обновлений, ожидающих своей очереди."""
+        return sum(entry.users - 1 for entry in self._locks.values())
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry: _KeyLock | None = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _KeyLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users and self._locks.get(key) is entry:
+                self._locks.pop(key, None)
+
+    async def close(self) -> None:
+        # Обновления, которые ещё держат или ждут блокировку, удалят её сами
+        for key in [key for key, entry in self._locks.items() if not entry.users]:
+            self._locks.pop(key, None)
@@ -0,0 +1,247 @@
+"""
+Пул заранее сгенерированных примеров для каждого уровня сложности.
+
+Обработчики берут готовый пример за O(1), а фоновая задача дополняет
+очереди через GenerationExecutor (поток или пул процессов), когда они
+опускаются ниже порога. Время генерации и отказы попадают в метрики.
+"""
+
+import asyncio
+import logging
+import zlib
+from collections import deque
+from collections.abc import Callable, Collection, Iterable
+from os import getenv
+
+from gen import MAX_DIFICULTY, generate_many
+from metrics import Counter, observe_generation
+from workers import GeneratedBatch, GenerationExecutor, generate_batch
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Максимальное число готовых примеров на один уровень сложности
+POOL_SIZE = int(getenv("POOL_SIZE", "50"))
+
+# Порог, ниже которого очередь уровня начинает дополняться
+POOL_LOW_WATER = int(getenv("POOL_LOW_WATER", "10"))
+
+# Сколько примеров генерируется за один вызов исполнителя
+POOL_BATCH = int(getenv("POOL_BATCH", "10"))
+
+# Уровни сложности пользователей (points // 10 даёт 0..4)
+LEVELS = range(MAX_DIFICULTY)
+
+# Сколько байт данных пользователя отводится под недавние примеры
+# (2 байта на пример, 0 — повторы не отслеживаются)
+RECENT_BYTES = int(getenv("RECENT_BYTES", "64"))
+RECENT_CAPACITY = min(RECENT_BYTES // 2, 255)
+
+# Сколько недавних примеров пропустить, прежде чем выдать повтор
+_MAX_SKIPS = 8
+
+REPEATS_SKIPPED = Counter(
+    "problem_repeats_skipped_total",
+    "Примеры, пропущенные как недавно выданные пользователю",
+    ("difficulty",),
+)
+
+
+# ============================================================================
+# Недавние примеры пользователя
+# ============================================================================
+
+
+def problem_hash(expression: str) -> int:
+    """16-битный хэш выражения, одинаковый во всех процессах."""
+    return zlib.crc32(expression.encode("utf-8")) & 0xFFFF
+
+
+def remember_problem(
+    recent: list[int], expression: str, capacity: int = RECENT_CAPACITY
+) -> list[int]:
+    """
+    Добавляет пример в кольцевой буфер недавних примеров пользователя.
+
+    Буфер хранится в данных FSM как список хэшей (старые — в начале)
+    и не превышает capacity элементов.
+
+    Returns:
+        list: Новый буфер (исходный не изменяется)
+    """
+    if capacity <= 0:
+        return []
+    return [*recent, problem_hash(expression)][-capacity:]
+
+
+# ============================================================================
+# Пул примеров
+# ============================================================================
+
+
+class ProblemPool:
+    """
+    Ограниченные очереди готовых пар (выражение, ответ) по уровням сложности.
+
+    Attributes:
+        size: Максимальный размер очереди каждого уровня
+        low_water: Порог, при котором запускается дозаполнение
+        hits: Число выдач из очереди по уровням
+        misses: Число синхронных генераций при пустой очереди по уровням
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        low_water: int = POOL_LOW_WATER,
+        batch: int = POOL_BATCH,
+        levels: Iterable[int] = LEVELS,
+        generator: Callable[[int, int], list[tuple[str, int]]] = generate_many,
+        executor: GenerationExecutor | None = None,
+    ) -> None:
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.batch = max(batch, 1)
+        self._generator = generator
+        self._executor = executor or GenerationExecutor("inline")
+        self._queues: dict[int, deque[tuple[str, int]]] = {
+            level: deque(maxlen=size) for level in levels
+        }
+        self.hits: dict[int, int] = dict.fromkeys(self._queues, 0)
+        self.misses: dict[int, int] = dict.fromkeys(self._queues, 0)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def get(self, difficulty: int, recent: Collection[int] = ()) -> tuple[str, int]:
+        """
+        Выдаёт готовый пример заданной сложности.
+
+        Если очередь пуста (или уровень не обслуживается пулом), пример
+        генерируется синхронно — это считается промахом.
+
+        Примеры, хэши которых есть в recent, пользователю не выдаются:
+        такой пример возвращается в конец очереди (он пригодится другим)
+        и берётся следующий, а если подходящих нет — генерируется новый.
+        После _MAX_SKIPS попыток повтор всё же выдаётся, поэтому время
+        выдачи ограничено.
+
+        Args:
+            difficulty: Уровень сложности
+            recent: Хэши недавних примеров пользователя (см. problem_hash)
+
+        Returns:
+            tuple: (выражение, ответ)
+        """
+        queue: deque[tuple[str, int]] | None = self._queues.get(difficulty)
+        if queue is None:
+            return self._fresh(difficulty, recent)
+
+        problem: tuple[str, int] | None = None
+        for _ in range(min(len(queue), _MAX_SKIPS)):
+            candidate: tuple[str, int] = queue.popleft()
+            if not recent or problem_hash(candidate[0]) not in recent:
+                problem = candidate
+                break
+            queue.append(candidate)
+            REPEATS_SKIPPED.inc(str(difficulty))
+
+        if problem is not None:
+            self.hits[difficulty] += 1
+        else:
+            self.misses[difficulty] += 1
+            if not queue:
+                _LOGGER.warning(
+                    "Пул уровня %d пуст, генерируем на месте",
+                    difficulty,
+                    extra={"difficulty": difficulty},
+                )
+            problem = self._fresh(difficulty, recent)
+
+        if len(queue) < self.low_water:
+            self._wakeup.set()
+        return problem
+
+    def _fresh(self, difficulty: int, recent: Collection[int]) -> tuple[str, int]:
+        """Синхронно генерирует пример, по возможности не из recent."""
+        problem: tuple[str, int] = self._generate(difficulty, 1)[0]
+        for _ in range(_MAX_SKIPS):
+            if not recent or problem_hash(problem[0]) not in recent:
+                break
+            REPEATS_SKIPPED.inc(str(difficulty))
+            problem = self._generate(difficulty, 1)[0]
+        return problem
+
+    def _generate(self, difficulty: int, count: int) -> list[tuple[str, int]]:
+        """Синхронно генерирует примеры, учитывая их в метриках."""
+        batch: GeneratedBatch = generate_batch(self._generator, difficulty, count)
+        observe_generation(
+            difficulty, batch.durations, batch.rejections, batch.retries
+        )
+        return batch.problems
+
+    def stats(self) -> dict[int, dict[str, int]]:
+        """Возвращает размер очереди, попадания и промахи по уровням."""
+        return {
+            level: {
+                "size": len(queue),
+                "hits": self.hits[level],
+                "misses": self.misses[level],
+            }
+            for level, queue in self._queues.items()
+        }
+
+    # ------------------------------------------------------------------------
+    # Фоновое дозаполнение
+    # ------------------------------------------------------------------------
+
+    async def refill(self) -> None:
+        """Дозаполняет до size все очереди, опустившиеся ниже low_water."""
+        for level, queue in self._queues.items():
+            if len(queue) >= self.low_water:
+                continue
+            while len(queue) < self.size:
+                count: int = min(self.batch, self.size - len(queue))
+                batch: GeneratedBatch = await self._executor.run(
+                    generate_batch, self._generator, level, count
+                )
+                observe_generation(
+                    level, batch.durations, batch.rejections, batch.retries
+                )
+                queue.extend(batch.problems)
+
+    async def _refill_loop(self) -> None:
+        """Ждёт сигнала о нехватке примеров и дозаполняет очереди."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.refill()
+            except Exception as e:
+                _LOGGER.error("Ошибка при дозаполнении пула: %s", e)
+
+    async def start(self) -> None:
+        """Заполняет все очереди и запускает фоновую задачу дозаполнения."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        await self.refill()
+        self._task = asyncio.create_task(self._refill_loop())
+        _LOGGER.info(
+            "Пул примеров запущен: %d на уровень, порог %d",
+            self.size,
+            self.low_water,
+        )
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу дозаполнения."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -1,90 +1,295 @@
 """
 Модуль для инициализации и конфигурации Redis хранилища.
 
-Предоставляет функцию для создания RedisStorage с поддержкой
-единственного URL подключения и автоматической обработкой ошибок.
+Предоставляет функцию для создания RedisStorage для одиночного сервера,
+Redis Sentinel или Redis Cluster с явно настроенным пулом соединений,
+а также проверку доступности Redis с повторными попытками при запуске.
 """
 
+import asyncio
 import logging
 from os import getenv
+from typing import Any, cast
 
 from aiogram.fsm.storage.base import StorageKey
-from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+from redis.asyncio.retry import Retry
+from redis.asyncio.sentinel import Sentinel
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from codec import CompactRedisStorage
 
 _LOGGER = logging.getLogger(__name__)
 
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Максимум соединений в пуле одного процесса
+REDIS_MAX_CONNECTIONS = int(getenv("REDIS_MAX_CONNECTIONS", "50"))
+
+# Сколько секунд ждать свободного соединения из пула
+REDIS_POOL_TIMEOUT = float(getenv("REDIS_POOL_TIMEOUT", "5"))
+
+# Таймауты операций и установки соединения, секунды
+REDIS_SOCKET_TIMEOUT = float(getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(getenv("REDIS_CONNECT_TIMEOUT", "5"))
+
+# Интервал проверки простаивающих соединений (PING перед использованием)
+REDIS_HEALTH_CHECK_INTERVAL = int(getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+# Повторы команды при обрыве соединения или таймауте
+REDIS_RETRIES = int(getenv("REDIS_RETRIES", "3"))
+
+# Попытки подключения при запуске бота (0 — пытаться бесконечно)
+REDIS_CONNECT_ATTEMPTS = int(getenv("REDIS_CONNECT_ATTEMPTS", "10"))
+
+# Максимальная пауза между попытками подключения, секунды
+_CONNECT_BACKOFF_CAP = 30.0
+
+SENTINEL_SCHEME = "sentinel://"
+CLUSTER_SCHEME = "cluster://"
+
+
+# ============================================================================
+# Разбор адресов
+# ============================================================================
+
+
+def _parse_hosts(
+    netloc: str, default_port: int
+) -> tuple[str | None, list[tuple[str, int]]]:
+    """
+    Разбирает "[:password@]host[:port],host[:port],...".
+
+    Returns:
+        tuple: (пароль или None, список (host, port))
+    """
+    password: str | None = None
+    if "@" in netloc:
+        credentials, netloc = netloc.rsplit("@", 1)
+        password = credentials.split(":", 1)[-1] or None
+
+    hosts: list[tuple[str, int]] = []
+    for item in netloc.split(","):
+        host, _, port = item.strip().partition(":")
+        if not host:
+            raise ValueError(f"Invalid Redis host in {netloc!r}")
+        hosts.append((host, int(port) if port else default_port))
+    return password, hosts
+
+
+def _connection_kwargs() -> dict[str, Any]:
+    """Общие параметры соединений: таймауты, keepalive, проверки и повторы."""
+    return {
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "retry": Retry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES),
+        "retry_on_error": [RedisConnectionError, RedisTimeoutError],
+    }
+
+
+# ============================================================================
+# Хранилище для Redis Cluster
+# ============================================================================
+
+
+class ClusterKeyBuilder(DefaultKeyBuilder):
+    """
+    Строитель ключей с hash tag: ключи состояния и данных одного пользователя
+    попадают в один слот кластера, поэтому их можно читать одним MGET
+    и записывать одним скриптом.
+    """
+
+    def build(self, key: StorageKey, part: Any = None) -> str:
+        base: str = "{" + super().build(key) + "}"
+        return f"{base}{self.separator}{part}" if part else base
+
+
+class ClusterStorage(CompactRedisStorage):
+    """CompactRedisStorage поверх RedisCluster."""
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+# ============================================================================
+# Инициализация
+# ============================================================================
+
+
+def _single_storage(redis_url: str) -> RedisStorage:
+    """Хранилище для одиночного сервера."""
+    # Формируем полный URL с протоколом redis:// если он отсутствует
+    if not redis_url.startswith(("redis://", "rediss://", "unix://")):
+        redis_url = f"redis://{redis_url}"
+    _LOGGER.info("Trying to connect to Redis at %s", redis_url)
+
+    # Блокирующий пул: при нехватке соединений команда ждёт свободное,
+    # а не получает ошибку "Too many connections"
+    pool = BlockingConnectionPool.from_url(
+        redis_url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        **_connection_kwargs(),
+    )
+    # Данные пользователей хранятся в компактном формате (см. codec.py)
+    return CompactRedisStorage(redis=Redis(connection_pool=pool))
+
+
+def _sentinel_storage(redis_url: str) -> RedisStorage:
+    """Хранилище для Redis Sentinel: sentinel://h1:26379,h2:26379/master[/db]."""
+    netloc, _, path = redis_url[len(SENTINEL_SCHEME) :].partition("/")
+    password, sentinels = _parse_hosts(netloc, 26379)
+    service, _, db = path.partition("/")
+    if not service:
+        raise ValueError("Sentinel URL must contain master name: sentinel://host/name")
+    _LOGGER.info("Trying to connect to Redis master %r via %s", service, sentinels)
+
+    kwargs: dict[str, Any] = _connection_kwargs()
+    sentinel = Sentinel(
+        sentinels,
+        sentinel_kwargs={
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+            "password": password,
+        },
+        **kwargs,
+    )
+    redis: Redis = sentinel.master_for(
+        service,
+        db=int(db or 0),
+        password=password,
+        max_connections=REDIS_MAX_CONNECTIONS,
+    )
+    return CompactRedisStorage(redis=redis)
+
 
-def init_redis() -> RedisStorage:
+def _cluster_storage(redis_url: str) -> RedisStorage:
+    """Хранилище для Redis Cluster: cluster://h1:6379,h2:6379."""
+    password, nodes = _parse_hosts(redis_url[len(CLUSTER_SCHEME) :].rstrip("/"), 6379)
+    _LOGGER.info("Trying to connect to Redis Cluster via %s", nodes)
+
+    redis = RedisCluster(
+        startup_nodes=[ClusterNode(host, port) for host, port in nodes],
+        password=password,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        **_connection_kwargs(),
+    )
+    return ClusterStorage(redis=cast(Redis, redis), key_builder=ClusterKeyBuilder())
+
+
+def init_redis(redis_env: str | None = None) -> RedisStorage:
     """
     Инициализирует Redis хранилище для FSM (Finite State Machine).
 
-    Читает URL подключения из переменной окружения REDIS и создаёт
-    экземпляр RedisStorage. Поддерживается только одиночный URL подключения.
+    Читает адрес из аргумента или переменной окружения REDIS и создаёт
+    экземпляр RedisStorage с настроенным пулом соединений. Соединение
+    устанавливается лениво; проверить доступность Redis можно через
+    wait_for_redis().
+
+    Args:
+        redis_env: Адрес Redis (None — из переменной окружения REDIS)
 
     Environment Variables:
-        REDIS: URL подключения к Redis в формате "host:port" или "redis://host:port"
+        REDIS: Адрес Redis в одном из форматов:
+            - "host:port" или "redis://host:port/db" — одиночный сервер
+            - "sentinel://[:password@]h1:26379,h2:26379/master[/db]" — Sentinel
+            - "cluster://[:password@]h1:6379,h2:6379" — Cluster
 
     Returns:
         RedisStorage: Инициализированное хранилище Redis для FSM
 
     Raises:
-        ValueError: Если переменная окружения REDIS не задана или содержит несколько URL
-        ConnectionError: Если не удаётся подключиться к Redis (поднимается aiogram)
+        ValueError: Если переменная окружения REDIS не задана или адрес некорректен
 
     Examples:
         >>> # В .env файле: REDIS=localhost:6379
         >>> storage = init_redis()
         >>> type(storage)
-        <class 'aiogram.fsm.storage.redis.RedisStorage'>
+        <class 'codec.CompactRedisStorage'>
 
-        >>> # Также поддерживается полный URL
-        >>> # REDIS=redis://localhost:6379/0
+        >>> # Sentinel с мастером "mymaster"
+        >>> # REDIS=sentinel://s1:26379,s2:26379,s3:26379/mymaster
         >>> storage = init_redis()
 
     Note:
-        - Поддерживается только один URL подключения к Redis
-        - При наличии нескольких URL (через запятую) будет выброшено исключение
-        - Для отказоустойчивости рекомендуется использовать Redis Sentinel или Cluster
-          (требует отдельной конфигурации)
+        - Несколько адресов через запятую допустимы только для sentinel:// и cluster://
+        - В режиме Cluster ключи пользователя размещаются в одном слоте (hash tag)
     """
-    redis_env: str | None = getenv("REDIS")
-    if not redis_env:
+    if redis_env is None:
+        redis_env = getenv("REDIS")
+    if not redis_env or not redis_env.strip():
         _LOGGER.error("REDIS environment variable is not set")
         raise ValueError("REDIS environment variable is not set")
+    redis_url: str = redis_env.strip()
 
-    redis_urls: list[str] = redis_env.split(",")
+    try:
+        # Случай 1: Redis Sentinel
+        if redis_url.startswith(SENTINEL_SCHEME):
+            storage: RedisStorage = _sentinel_storage(redis_url)
 
-    # Проверка: переменная окружения не задана
-    if not redis_urls[0]:
-        _LOGGER.error("REDIS environment variable is not set")
-        raise ValueError("REDIS environment variable is not set")
+        # Случай 2: Redis Cluster
+        elif redis_url.startswith(CLUSTER_SCHEME):
+            storage = _cluster_storage(redis_url)
+
+        # Случай 3: Несколько URL без схемы (не поддерживается)
+        elif "," in redis_url:
+            raise ValueError(
+                "REDIS environment variable is set to multiple URLs. "
+                f"Use {SENTINEL_SCHEME} or {CLUSTER_SCHEME} for several nodes."
+            )
 
-    # Случай 1: Одиночный URL (основной сценарий использования)
-    elif len(redis_urls) == 1:
-        _LOGGER.info("REDIS environment variable is set to a single URL")
+        # Случай 4: Одиночный URL (основной сценарий использования)
+        else:
+            storage = _single_storage(redis_url)
+    except Exception as e:
+        _LOGGER.error("Failed to initialize Redis storage: %s", e)
+        raise
 
-        # Формируем полный URL с протоколом redis:// если он отсутствует
-        redis_url: str = redis_urls[0].strip()
-        if not redis_url.startswith("redis://"):
-            redis_url = f"redis://{redis_url}"
+    _LOGGER.info("Successfully initialized Redis storage")
+    return storage
 
-        _LOGGER.info(f"Trying to connect to Redis at {redis_url}")
 
+async def wait_for_redis(
+    storage: RedisStorage, attempts: int = REDIS_CONNECT_ATTEMPTS
+) -> None:
+    """
+    Ждёт доступности Redis, повторяя PING с экспоненциальной паузой.
+
+    Вызывается при запуске бота: вместо перехода на MemoryStorage бот
+    дожидается Redis, а если тот так и не стал доступен — завершается
+    с ошибкой, чтобы его перезапустил оркестратор.
+
+    Args:
+        storage: Хранилище Redis
+        attempts: Число попыток (0 — бесконечно)
+
+    Raises:
+        redis.exceptions.ConnectionError: Если Redis недоступен после всех попыток
+    """
+    attempt: int = 0
+    while True:
+        attempt += 1
         try:
-            storage: RedisStorage = RedisStorage.from_url(redis_url)
-            _LOGGER.info("Successfully initialized Redis storage")
-            return storage
-        except Exception as e:
-            _LOGGER.error(f"Failed to connect to Redis: {e}")
-            raise
-
-    # Случай 2: Несколько URL (не поддерживается)
-    else:
-        _LOGGER.error(
-            f"REDIS environment variable is set to {len(redis_urls)} URLs. "
-            "Multiple Redis URLs are not supported. Please provide a single Redis URL."
-        )
-        raise ValueError(
-            "REDIS environment variable is set to multiple URLs. "
-            "Only single Redis URL is supported."
-        )
+            await storage.redis.ping()
+            _LOGGER.info("Redis is available")
+            return
+        except (RedisConnectionError, RedisTimeoutError, OSError) as e:
+            if attempts and attempt >= attempts:
+                _LOGGER.error("Redis is unavailable after %d attempts: %s", attempt, e)
+                raise RedisConnectionError(f"Redis is unavailable: {e}") from e
+            delay: float = min(2 ** (attempt - 1), _CONNECT_BACKOFF_CAP)
+            _LOGGER.warning(
+                "Redis is unavailable (attempt %d): %s. Retrying in %ss",
+                attempt,
+                e,
+                delay,
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,151 @@
+"""
+Объединение ответов бота на одно обновление.
+
+Всё, что обработчик отправляет через reply(), копится в буфере и после
+завершения обработчика уходит минимальным числом вызовов sendMessage:
+соседние сообщения склеиваются через пустую строку. Сообщения с
+separate=True (например, одиночный эмодзи, который Telegram показывает
+крупной анимацией) отправляются отдельным пузырём. Если задан
+SendScheduler, сообщения уходят через него с учётом лимитов Telegram.
+"""
+
+import logging
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from functools import partial
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+from metrics import Counter
+from sender import Priority, SendScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Разделитель склеенных сообщений
+SEPARATOR = "\n\n"
+
+REPLY_MESSAGES = Counter(
+    "bot_reply_messages_total",
+    "Ответы бота: запрошенные обработчиками и отправленные после склейки",
+    ("stage",),
+)
+
+
+class ReplyBuffer:
+    """
+    Ответы на одно сообщение пользователя, ожидающие отправки.
+
+    Attributes:
+        message: Сообщение, на которое отвечает бот
+        scheduler: Планировщик отправки (None — отправлять сразу)
+    """
+
+    def __init__(
+        self, message: Message, scheduler: SendScheduler | None = None
+    ) -> None:
+        self.message = message
+        self.scheduler = scheduler
+        self._parts: list[tuple[str, bool, int]] = []
+
+    def add(
+        self, text: str, separate: bool = False, priority: int = Priority.NORMAL
+    ) -> None:
+        """Добавляет ответ; separate=True — отдельным сообщением."""
+        self._parts.append((text, separate, priority))
+        REPLY_MESSAGES.inc("queued")
+
+    def batches(self) -> list[tuple[str, int]]:
+        """Тексты сообщений после склейки соседних ответов и их приоритеты."""
+        batches: list[tuple[str, int]] = []
+        mergeable: bool = False
+        for text, separate, priority in self._parts:
+            if (
+                mergeable
+                and not separate
+                and len(batches[-1][0]) + len(SEPARATOR) + len(text)
+                <= MAX_MESSAGE_LENGTH
+            ):
+                merged, merged_priority = batches[-1]
+                batches[-1] = (
+                    merged + SEPARATOR + text,
+                    min(merged_priority, priority),
+                )
+            else:
+                batches.append((text, priority))
+            mergeable = not separate
+        return batches
+
+    async def flush(self) -> None:
+        """Отправляет накопленные ответы по порядку и очищает буфер."""
+        batches: list[tuple[str, int]] = self.batches()
+        self._parts.clear()
+        chat_id: int = self.message.chat.id
+        for text, priority in batches:
+            REPLY_MESSAGES.inc("sent")
+            if self.scheduler is not None:
+                self.scheduler.submit(
+                    chat_id, partial(self.message.answer, text), priority
+                )
+                continue
+            try:
+                await self.message.answer(text)
+            except Exception as e:
+                _LOGGER.error("Не удалось отправить ответ в чат %s: %s", chat_id, e)
+
+
+_BUFFER: ContextVar[ReplyBuffer | None] = ContextVar("reply_buffer", default=None)
+
+
+async def reply(
+    message: Message,
+    text: str,
+    *,
+    separate: bool = False,
+    priority: int = Priority.NORMAL,
+) -> None:
+    """
+    Отвечает пользователю.
+
+    Внутри обработчика с ReplyMiddleware ответ откладывается до конца
+    обработки и склеивается с соседними, иначе отправляется сразу.
+
+    Args:
+        message: Сообщение пользователя
+        text: Текст ответа
+        separate: Отправить отдельным сообщением, не склеивая с соседними
+        priority: Приоритет отправки (см. sender.Priority)
+    """
+    buffer: ReplyBuffer | None = _BUFFER.get()
+    if buffer is not None and buffer.message.chat.id == message.chat.id:
+        buffer.add(text, separate, priority)
+        return
+    await message.answer(text)
+
+
+class ReplyMiddleware(BaseMiddleware):
+    """Внутренний middleware сообщений: копит ответы обработчика и отправляет их."""
+
+    def __init__(self, scheduler: SendScheduler | None = None) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message):
+            return await handler(event, data)
+
+        buffer = ReplyBuffer(event, self.scheduler)
+        token = _BUFFER.set(buffer)
+        try:
+            return await handler(event, data)
+        finally:
+            _BUFFER.reset(token)
+            await buffer.flush()
@@ -0,0 +1,390 @@
+"""
+Планировщик исходящих сообщений с ограничением скорости.
+
+Telegram ограничивает ботов примерно 30 сообщениями в секунду в целом
+и примерно одним сообщением в секунду в одном чате. Планировщик держит
+два уровня token bucket (общий и на каждый чат), отдаёт приоритет новым
+примерам перед поздравлениями, сохраняет порядок сообщений внутри чата
+и при ответе 429 повторяет отправку через retry_after, не теряя сообщение.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from enum import IntEnum
+from itertools import count
+from os import getenv
+from typing import Any
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from metrics import Counter
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Общий лимит отправки, сообщений в секунду
+SEND_GLOBAL_RATE = float(getenv("SEND_GLOBAL_RATE", "30"))
+
+# Лимит отправки в один чат, сообщений в секунду, и допустимый всплеск
+SEND_CHAT_RATE = float(getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(getenv("SEND_CHAT_BURST", "3"))
+
+# Сколько раз повторять сообщение после ответа 429
+SEND_MAX_RETRIES = int(getenv("SEND_MAX_RETRIES", "5"))
+
+# Сколько секунд при остановке ждать отправки оставшихся сообщений
+SEND_DRAIN_TIMEOUT = float(getenv("SEND_DRAIN_TIMEOUT", "10"))
+
+# Как часто удалять состояние неактивных чатов, секунды
+_SWEEP_INTERVAL = 60.0
+
+SEND_RETRIES = Counter(
+    "bot_send_retries_total", "Повторы отправки после ответа 429", ()
+)
+SEND_FAILURES = Counter(
+    "bot_send_failures_total", "Сообщения, которые не удалось отправить", ()
+)
+
+
+class Priority(IntEnum):
+    """Приоритет сообщения: меньше — раньше."""
+
+    PROBLEM = 0
+    NORMAL = 1
+
+
+# ============================================================================
+# Token bucket
+# ============================================================================
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше burst накопленных.
+
+    Attributes:
+        rate: Скорость пополнения, токенов в секунду
+        burst: Ёмкость
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена (0 — можно сейчас)."""
+        self._refill(now)
+        wait: float = max(self.blocked_until - now, 0.0)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float) -> None:
+        """Забирает один токен."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Запрещает отправку на seconds секунд (ответ 429)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def full(self, now: float) -> bool:
+        """Восстановлена ли ёмкость полностью."""
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+# ============================================================================
+# Планировщик
+# ============================================================================
+
+
+class _Item:
+    """Сообщение в очереди."""
+
+    __slots__ = ("send", "priority", "seq", "attempts", "future")
+
+    def __init__(
+        self,
+        send: Callable[[], Awaitable[Any]],
+        priority: int,
+        seq: int,
+        future: asyncio.Future[Any] | None,
+    ) -> None:
+        self.send = send
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.future = future
+
+
+class _Chat:
+    """Очередь и лимит одного чата."""
+
+    __slots__ = ("queue", "bucket", "busy", "scheduled")
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.queue: deque[_Item] = deque()
+        self.bucket = TokenBucket(rate, burst)
+        # Идёт отправка сообщения этого чата (сообщения чата уходят по одному)
+        self.busy = False
+        # Чат уже в очереди готовых или ждёт таймера
+        self.scheduled = False
+
+
+class SendScheduler:
+    """
+    Очередь исходящих сообщений с общим и початовым лимитами.
+
+    Сообщения одного чата отправляются строго по порядку и по одному;
+    между чатами выбирается тот, чьё первое сообщение приоритетнее.
+
+    Attributes:
+        global_rate: Общий лимит, сообщений в секунду
+        chat_rate: Лимит одного чата, сообщений в секунду
+        chat_burst: Допустимый всплеск в одном чате
+        max_retries: Число повторов после ответа 429
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: float = SEND_CHAT_BURST,
+        max_retries: int = SEND_MAX_RETRIES,
+    ) -> None:
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int | str, _Chat] = {}
+        self._ready: list[tuple[int, int, int | str]] = []
+        self._seq = count()
+        self._wakeup = asyncio.Event()
+        self._inflight: set[asyncio.Task[None]] = set()
+        self._task: asyncio.Task[None] | None = None
+        # Планировщик остановлен: сообщения отправляются сразу, без очереди
+        self._closed = False
+
+    # ------------------------------------------------------------------------
+    # Постановка в очередь
+    # ------------------------------------------------------------------------
+
+    def submit(
+        self,
+        chat_id: int | str,
+        send: Callable[[], Awaitable[Any]],
+        priority: int = Priority.NORMAL,
+    ) -> None:
+        """
+        Ставит сообщение в очередь; ошибки отправки только логируются.
+
+        После остановки планировщика сообщение отправляется сразу,
+        без лимитов (обновление, обработка которого не успела завершиться).
+
+        Args:
+            chat_id: Чат получателя
+            send: Функция, выполняющая запрос к Bot API
+            priority: Приоритет (см. Priority)
+        """
+        item = _Item(send, priority, next(self._seq), None)
+        if self._closed:
+            task = asyncio.create_task(self._deliver_now(chat_id, item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            return
+        self._enqueue(chat_id, item)
+
+    async def send(
+        self,
+        chat_id: int | str,
+        send: Callable[[], Awaitable[Any]],
+        priority: int = Priority.NORMAL,
+    ) -> Any:
+        """Ставит сообщение в очередь и ждёт результата отправки."""
+        if self._closed:
+            return await send()
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, _Item(send, priority, next(self._seq), future))
+        return await future
+
+    def _enqueue(self, chat_id: int | str, item: _Item) -> None:
+        chat: _Chat | None = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+        chat.queue.append(item)
+        self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int | str) -> None:
+        """Ставит чат в очередь готовых, как только его лимит позволит."""
+        chat: _Chat | None = self._chats.get(chat_id)
+        if chat is None or chat.busy or chat.scheduled or not chat.queue:
+            return
+        chat.scheduled = True
+        delay: float = chat.bucket.delay(time.monotonic())
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._ready_later, chat_id)
+            return
+        head: _Item = chat.queue[0]
+        heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        self._wakeup.set()
+
+    def _ready_later(self, chat_id: int | str) -> None:
+        chat: _Chat | None = self._chats.get(chat_id)
+        if chat is not None:
+            chat.scheduled = False
+            self._schedule(chat_id)
+
+    # ------------------------------------------------------------------------
+    # Отправка
+    # ------------------------------------------------------------------------
+
+    def depth(self) -> dict[str, int]:
+        """Число сообщений в очереди по приоритетам ("problem", "normal")."""
+        depth: dict[str, int] = {priority.name.lower(): 0 for priority in Priority}
+        for chat in self._chats.values():
+            for item in chat.queue:
+                depth[Priority(item.priority).name.lower()] += 1
+        return depth
+
+    async def _run(self) -> None:
+        """Выбирает следующий чат с учётом приоритета и общего лимита."""
+        last_sweep: float = time.monotonic()
+        while True:
+            now: float = time.monotonic()
+            if now - last_sweep >= _SWEEP_INTERVAL:
+                self._sweep(now)
+                last_sweep = now
+            if not self._ready:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), _SWEEP_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay: float = self._global.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat: _Chat = self._chats[chat_id]
+            chat.scheduled = False
+            chat.busy = True
+            self._global.take(now)
+            chat.bucket.take(now)
+            task = asyncio.create_task(
+                self._deliver(chat_id, chat, chat.queue.popleft())
+            )
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id: int | str, chat: _Chat, item: _Item) -> None:
+        """Отправляет сообщение, при 429 возвращая его в начало очереди чата."""
+        try:
+            result: Any = await item.send()
+        except TelegramRetryAfter as e:
+            item.attempts += 1
+            if item.attempts <= self.max_retries:
+                SEND_RETRIES.inc()
+                _LOGGER.warning(
+                    "429 в чате %s, повтор через %s с", chat_id, e.retry_after
+                )
+                chat.bucket.block(e.retry_after)
+                chat.queue.appendleft(item)
+            else:
+                self._fail(chat_id, item, e)
+        except Exception as e:
+            self._fail(chat_id, item, e)
+        else:
+            if item.future is not None and not item.future.done():
+                item.future.set_result(result)
+        finally:
+            chat.busy = False
+            self._schedule(chat_id)
+
+    async def _deliver_now(self, chat_id: int | str, item: _Item) -> None:
+        """Отправляет сообщение в обход очереди (планировщик остановлен)."""
+        try:
+            await item.send()
+        except Exception as e:
+            self._fail(chat_id, item, e)
+
+    def _fail(self, chat_id: int | str, item: _Item, error: Exception) -> None:
+        SEND_FAILURES.inc()
+        if item.future is not None:
+            if not item.future.done():
+                item.future.set_exception(error)
+        else:
+            _LOGGER.error("Не удалось отправить сообщение в чат %s: %s", chat_id, error)
+
+    def _sweep(self, now: float) -> None:
+        """Удаляет чаты без сообщений, чей лимит полностью восстановился."""
+        idle: list[int | str] = [
+            chat_id
+            for chat_id, chat in self._chats.items()
+            if not chat.queue and not chat.busy and chat.bucket.full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    # ------------------------------------------------------------------------
+    # Запуск и остановка
+    # ------------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Запускает фоновую задачу отправки."""
+        if self._task is not None:
+            return
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = SEND_DRAIN_TIMEOUT) -> None:
+        """
+        Ждёт до timeout секунд отправки оставшихся сообщений и останавливается.
+
+        Сообщения, не отправленные за это время, отбрасываются (ожидающие
+        их send() получают RuntimeError); новые сообщения после остановки
+        отправляются сразу (см. submit).
+        """
+        if self._task is None:
+            return
+        deadline: float = time.monotonic() + timeout
+        while sum(self.depth().values()) or self._inflight:
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.05)
+        remaining: int = sum(self.depth().values())
+        if remaining:
+            _LOGGER.warning("При остановке не отправлено сообщений: %d", remaining)
+        self._closed = True
+        for chat in self._chats.values():
+            for item in chat.queue:
+                if item.future is not None and not item.future.done():
+                    item.future.set_exception(RuntimeError("SendScheduler is stopped"))
+            chat.queue.clear()
+        self._ready.clear()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,346 @@
+"""
+Сессия FSM на время обработки одного обновления.
+
+Состояние и данные пользователя читаются из хранилища один раз (для Redis —
+одним MGET), все изменения внутри обработчика копятся в памяти и по его
+завершении записываются одной атомарной транзакцией (MULTI/EXEC).
+"""
+
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from typing import Any, Protocol, cast, runtime_checkable
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import TelegramObject
+from redis.asyncio.cluster import RedisCluster
+
+from codec import decode_data, encode_data
+from metrics import storage_call
+
+_LOGGER = logging.getLogger(__name__)
+
+# Атомарная запись в Redis Cluster, где MULTI/EXEC недоступен через клиент:
+# KEYS — ключи состояния и данных (один слот), ARGV — тройки (операция,
+# значение, TTL в миллисекундах) для каждого ключа
+_SAVE_SCRIPT = """
+for i = 1, 2 do
+  local op = ARGV[i * 3 - 2]
+  if op == 'set' then
+    local ttl = tonumber(ARGV[i * 3])
+    if ttl > 0 then
+      redis.call('SET', KEYS[i], ARGV[i * 3 - 1], 'PX', ttl)
+    else
+      redis.call('SET', KEYS[i], ARGV[i * 3 - 1])
+    end
+  elseif op == 'del' then
+    redis.call('DEL', KEYS[i])
+  end
+end
+"""
+
+
+# ============================================================================
+# Чтение и запись записи пользователя
+# ============================================================================
+
+
+@runtime_checkable
+class RecordStorage(Protocol):
+    """Хранилище, которое само читает и пишет запись пользователя целиком."""
+
+    async def load_record(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        ...
+
+    async def save_record(
+        self,
+        key: StorageKey,
+        state: str | None,
+        data: dict[str, Any] | None,
+        *,
+        state_changed: bool,
+        data_changed: bool,
+    ) -> None:
+        ...
+
+
+async def load_record(
+    storage: BaseStorage, key: StorageKey
+) -> tuple[str | None, dict[str, Any]]:
+    """
+    Читает состояние и данные пользователя.
+
+    Для RedisStorage оба ключа читаются одним MGET, хранилища с
+    интерфейсом RecordStorage (например, кэш) читают запись сами.
+
+    Returns:
+        tuple: (состояние, данные)
+    """
+    if isinstance(storage, RecordStorage):
+        return await storage.load_record(key)
+    if not isinstance(storage, RedisStorage):
+        return await storage.get_state(key), await storage.get_data(key)
+
+    state_key: str = storage.key_builder.build(key, "state")
+    data_key: str = storage.key_builder.build(key, "data")
+    raw_state, raw_data = await storage.redis.mget(state_key, data_key)
+
+    if isinstance(raw_state, bytes):
+        raw_state = raw_state.decode("utf-8")
+    if raw_data is None:
+        return raw_state, {}
+    return raw_state, decode_data(raw_data, storage.json_loads)
+
+
+async def save_record(
+    storage: BaseStorage,
+    key: StorageKey,
+    state: str | None,
+    data: dict[str, Any] | None,
+    *,
+    state_changed: bool,
+    data_changed: bool,
+    publish: tuple[str, str] | None = None,
+) -> None:
+    """
+    Записывает изменённые части записи пользователя.
+
+    Для RedisStorage запись выполняется одной транзакцией MULTI/EXEC
+    (в Redis Cluster — одним Lua-скриптом), поэтому состояние и данные
+    не могут разойтись.
+
+    Args:
+        publish: (канал, сообщение) для PUBLISH в той же транзакции
+            (только для RedisStorage вне кластера)
+    """
+    if isinstance(storage, RecordStorage):
+        await storage.save_record(
+            key, state, data, state_changed=state_changed, data_changed=data_changed
+        )
+        return
+    if not isinstance(storage, RedisStorage):
+        if state_changed:
+            await storage.set_state(key, state)
+        if data_changed:
+            await storage.set_data(key, data or {})
+        return
+    if isinstance(storage.redis, RedisCluster):
+        await _save_cluster_record(
+            storage,
+            key,
+            state,
+            data,
+            state_changed=state_changed,
+            data_changed=data_changed,
+        )
+        return
+
+    async with storage.redis.pipeline(transaction=True) as pipe:
+        if state_changed:
+            state_key: str = storage.key_builder.build(key, "state")
+            if state is None:
+                pipe.delete(state_key)
+            else:
+                pipe.set(state_key, state, ex=storage.state_ttl)
+        if data_changed:
+            data_key: str = storage.key_builder.build(key, "data")
+            if not data:
+                pipe.delete(data_key)
+            else:
+                pipe.set(
+                    data_key,
+                    encode_data(data, storage.json_dumps),
+                    ex=storage.data_ttl,
+                )
+        if publish:
+            pipe.publish(*publish)
+        await pipe.execute()
+
+
+def _ttl_ms(ttl: int | timedelta | None) -> int:
+    """TTL хранилища в миллисекундах (0 — без срока)."""
+    if ttl is None:
+        return 0
+    if isinstance(ttl, timedelta):
+        return int(ttl.total_seconds() * 1000)
+    return int(ttl) * 1000
+
+
+async def _save_cluster_record(
+    storage: RedisStorage,
+    key: StorageKey,
+    state: str | None,
+    data: dict[str, Any] | None,
+    *,
+    state_changed: bool,
+    data_changed: bool,
+) -> None:
+    """Записывает запись пользователя в Redis Cluster одним Lua-скриптом."""
+    args: list[Any] = []
+    if not state_changed:
+        args += ["keep", "", 0]
+    elif state is None:
+        args += ["del", "", 0]
+    else:
+        args += ["set", state, _ttl_ms(storage.state_ttl)]
+    if not data_changed:
+        args += ["keep", "", 0]
+    elif not data:
+        args += ["del", "", 0]
+    else:
+        args += ["set", encode_data(data, storage.json_dumps), _ttl_ms(storage.data_ttl)]
+
+    await storage.redis.eval(
+        _SAVE_SCRIPT,
+        2,
+        storage.key_builder.build(key, "state"),
+        storage.key_builder.build(key, "data"),
+        *args,
+    )
+
+
+# ============================================================================
+# Контекст сессии
+# ============================================================================
+
+
+class SessionContext(FSMContext):
+    """
+    FSMContext, работающий с копией записи пользователя в памяти.
+
+    Чтения не обращаются к хранилищу, записи помечают запись изменённой;
+    flush() сохраняет изменения одной операцией.
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        key: StorageKey,
+        state: str | None,
+        data: dict[str, Any],
+    ) -> None:
+        super().__init__(storage=storage, key=key)
+        self._state = state
+        self._data = data
+        self._state_changed = False
+        self._data_changed = False
+
+    @classmethod
+    async def load(cls, storage: BaseStorage, key: StorageKey) -> "SessionContext":
+        """Создаёт сессию, прочитав запись пользователя из хранилища."""
+        with storage_call("load"):
+            state, data = await load_record(storage, key)
+        return cls(storage, key, state, data)
+
+    async def set_state(self, state: StateType = None) -> None:
+        self._state = state.state if isinstance(state, State) else state
+        self._state_changed = True
+
+    async def get_state(self) -> str | None:
+        return self._state
+
+    async def set_data(self, data: dict[str, Any]) -> None:
+        self._data = data.copy()
+        self._data_changed = True
+
+    async def get_data(self) -> dict[str, Any]:
+        return self._data.copy()
+
+    async def get_value(self, key: str, default: Any | None = None) -> Any | None:
+        return self._data.get(key, default)
+
+    async def update_data(
+        self, data: dict[str, Any] | None = None, **kwargs: Any
+    ) -> dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        self._data.update(kwargs)
+        self._data_changed = True
+        return self._data.copy()
+
+    @property
+    def changed(self) -> bool:
+        """Есть ли несохранённые изменения."""
+        return self._state_changed or self._data_changed
+
+    async def flush(self) -> None:
+        """Сохраняет накопленные изменения в хранилище."""
+        if not self.changed:
+            return
+        with storage_call("save"):
+            await save_record(
+                self.storage,
+                self.key,
+                self._state,
+                self._data,
+                state_changed=self._state_changed,
+                data_changed=self._data_changed,
+            )
+        self._state_changed = self._data_changed = False
+
+
+# ============================================================================
+# Middleware
+# ============================================================================
+
+
+class SessionMiddleware(FSMContextMiddleware):
+    """
+    Замена стандартного FSMContextMiddleware, передающая обработчикам SessionContext.
+
+    Запись пользователя читается после взятия блокировки events_isolation
+    и сохраняется до её освобождения.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        bot: Bot = cast(Bot, data["bot"])
+        context: FSMContext | None = self.resolve_event_context(bot, data)
+        data["fsm_storage"] = self.storage
+        if not context:
+            return await handler(event, data)
+
+        async with self.events_isolation.lock(key=context.key):
+            session: SessionContext = await SessionContext.load(
+                self.storage, context.key
+            )
+            data.update({"state": session, "raw_state": session._state})
+            try:
+                return await handler(event, data)
+            finally:
+                try:
+                    await session.flush()
+                except Exception as e:
+                    _LOGGER.error("Ошибка сохранения сессии %s: %s", context.key, e)
+                    raise
+
+
+def setup_sessions(dp: Dispatcher) -> SessionMiddleware:
+    """
+    Заменяет FSM middleware диспетчера на SessionMiddleware.
+
+    Должна вызываться сразу после создания Dispatcher, до регистрации
+    других outer middleware, чтобы сохранить их порядок.
+
+    Returns:
+        SessionMiddleware: Установленный middleware
+    """
+    fsm: FSMContextMiddleware = dp.fsm
+    session = SessionMiddleware(
+        storage=fsm.storage,
+        events_isolation=fsm.events_isolation,
+        strategy=fsm.strategy,
+    )
+    dp.update.outer_middleware.unregister(fsm)
+    dp.update.outer_middleware(session)
+    dp.fsm = session
+    return session
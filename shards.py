@@ -0,0 +1,365 @@
+"""
+Запуск бота в нескольких процессах с разбиением пользователей по чатам.
+
+Включается переменной окружения BOT_MODE=sharded (или python -m shards).
+Процесс-супервизор получает обновления long polling'ом и раздаёт их
+SHARDS рабочим процессам по хэшу id чата: обновления одного чата всегда
+попадают в один процесс. Поэтому кэш записей FSM, пул примеров и
+последовательная обработка обновлений пользователя (KeyedEventIsolation)
+остаются локальными и не требуют блокировок между процессами.
+
+Супервизор не разбирает обновления и не импортирует aiogram: getUpdates
+вызывается напрямую через aiohttp, а рабочий процесс передаёт словарь
+обновления в Dispatcher.feed_raw_update. Ответы рабочие процессы
+отправляют сами; общий лимит отправки SEND_GLOBAL_RATE делится между
+ними поровну, а сервер метрик процесса i слушает METRICS_PORT + i.
+
+Упавший рабочий процесс перезапускается (с растущей паузой, если он
+падает сразу после запуска); обновления, пришедшие за это время, ждут
+в его очереди. По SIGTERM/SIGINT супервизор прекращает получать
+обновления, рабочие процессы дообрабатывают очереди и останавливаются.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import time
+import zlib
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from os import getenv
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from bot import Config
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Число рабочих процессов
+SHARDS = int(getenv("SHARDS", str(os.cpu_count() or 1)))
+
+# Адрес Bot API (например, локальный telegram-bot-api или заглушка loadtest)
+TELEGRAM_API = getenv("TELEGRAM_API", "https://api.telegram.org")
+
+# Таймаут long polling, секунды
+SHARD_POLLING_TIMEOUT = int(getenv("SHARD_POLLING_TIMEOUT", "10"))
+
+# Пауза перед перезапуском упавшего процесса, секунды (удваивается,
+# если процесс падает быстрее SHARD_STABLE_AFTER после запуска)
+SHARD_RESTART_DELAY = float(getenv("SHARD_RESTART_DELAY", "1"))
+SHARD_MAX_RESTART_DELAY = 30.0
+SHARD_STABLE_AFTER = 10.0
+
+# Сколько секунд ждать завершения рабочих процессов при остановке
+SHARD_SHUTDOWN_TIMEOUT = float(getenv("SHARD_SHUTDOWN_TIMEOUT", "30"))
+
+# Поля обновления, в которых есть сообщение с чатом
+_MESSAGE_FIELDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+)
+
+_ID = struct.Struct("<q")
+
+
+# ============================================================================
+# Маршрутизация
+# ============================================================================
+
+
+def update_chat_id(update: dict[str, Any]) -> int:
+    """
+    id чата, к которому относится обновление.
+
+    Для обновлений без чата используется id отправителя, а если нет
+    и его — update_id (такие обновления распределяются равномерно).
+    """
+    for field in _MESSAGE_FIELDS:
+        message: dict[str, Any] | None = update.get(field)
+        if message is not None:
+            return int(message["chat"]["id"])
+    for value in update.values():
+        if isinstance(value, dict):
+            message = value.get("message")
+            if isinstance(message, dict) and "chat" in message:
+                return int(message["chat"]["id"])
+            sender: dict[str, Any] | None = value.get("from") or value.get("user")
+            if sender is not None:
+                return int(sender["id"])
+    return int(update["update_id"])
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    """Номер процесса для чата: одинаковый при каждом запуске."""
+    return zlib.crc32(_ID.pack(chat_id)) % shards
+
+
+# ============================================================================
+# Рабочий процесс
+# ============================================================================
+
+
+def _worker_env(index: int, shards: int) -> None:
+    """Настраивает переменные окружения рабочего процесса до сборки бота."""
+    global_rate: float = float(getenv("SEND_GLOBAL_RATE", "30"))
+    os.environ["SEND_GLOBAL_RATE"] = str(global_rate / shards)
+    metrics_port: str = getenv("METRICS_PORT", "")
+    if metrics_port:
+        os.environ["METRICS_PORT"] = str(int(metrics_port) + index)
+
+
+def run_worker(
+    index: int, shards: int, config: "Config", api: str, updates: Queue
+) -> None:
+    """Точка входа рабочего процесса: обрабатывает обновления из очереди."""
+    _worker_env(index, shards)
+    # В рабочем процессе SIGINT получает вся группа процессов:
+    # остановкой управляет супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index, config, api, updates))
+
+
+async def _worker_main(
+    index: int, config: "Config", api: str, updates: Queue
+) -> None:
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    from bot import create_app, setup_logging
+    from logs import stop_logging
+
+    setup_logging(config.log_level)
+    dp = create_app(config)
+    bot = Bot(
+        config.token or "",
+        session=AiohttpSession(api=TelegramAPIServer.from_base(api)),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    workflow_data: dict[str, Any] = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    workflow_data.pop("bot", None)
+
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task[Any]] = set()
+    await dp.emit_startup(bot=bot, **workflow_data)
+    _LOGGER.info("Процесс %d (pid %d) запущен", index, os.getpid())
+    try:
+        while True:
+            batch: list[dict[str, Any]] | None = await loop.run_in_executor(
+                None, updates.get
+            )
+            if batch is None:
+                break
+            # Как при polling с handle_as_tasks: порядок обновлений одного
+            # пользователя сохраняет KeyedEventIsolation
+            for update in batch:
+                task = asyncio.create_task(dp.feed_raw_update(bot, update))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        try:
+            await dp.emit_shutdown(bot=bot, **workflow_data)
+        finally:
+            await bot.session.close()
+            _LOGGER.info("Процесс %d остановлен", index)
+            stop_logging()
+
+
+# ============================================================================
+# Супервизор
+# ============================================================================
+
+
+class Supervisor:
+    """
+    Получает обновления и раздаёт их рабочим процессам.
+
+    Attributes:
+        config: Настройки бота
+        shards: Число рабочих процессов
+        api: Адрес Bot API
+        restarts: Число перезапусков по процессам
+    """
+
+    def __init__(
+        self, config: "Config", shards: int = SHARDS, api: str = TELEGRAM_API
+    ) -> None:
+        if shards < 1:
+            raise ValueError("SHARDS must be at least 1")
+        self.config = config
+        self.shards = shards
+        self.api = api.rstrip("/")
+        self.restarts: list[int] = [0] * shards
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: list[Queue] = [self._context.Queue() for _ in range(shards)]
+        self._processes: list[BaseProcess | None] = [None] * shards
+        self._started: list[float] = [0.0] * shards
+        self._delays: list[float] = [SHARD_RESTART_DELAY] * shards
+        self._stopping = asyncio.Event()
+
+    def _spawn(self, index: int) -> None:
+        process: BaseProcess = self._context.Process(
+            target=run_worker,
+            args=(index, self.shards, self.config, self.api, self._queues[index]),
+            name=f"shard-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+        self._started[index] = time.monotonic()
+
+    def route(self, updates: list[dict[str, Any]]) -> None:
+        """Раскладывает обновления по очередям процессов (порядок сохраняется)."""
+        batches: dict[int, list[dict[str, Any]]] = {}
+        for update in updates:
+            index: int = shard_for(update_chat_id(update), self.shards)
+            batches.setdefault(index, []).append(update)
+        for index, batch in batches.items():
+            self._queues[index].put(batch)
+
+    async def _poll(self, session: aiohttp.ClientSession) -> None:
+        """Получает обновления long polling'ом до сигнала остановки."""
+        url: str = f"{self.api}/bot{self.config.token}/getUpdates"
+        offset: int = 0
+        delay: float = 1.0
+        while not self._stopping.is_set():
+            try:
+                async with session.post(
+                    url, data={"offset": offset, "timeout": SHARD_POLLING_TIMEOUT}
+                ) as response:
+                    result: Any = await response.json()
+                if not isinstance(result, dict):
+                    raise ValueError(f"unexpected response: {result!r:.100}")
+            # ContentTypeError (не JSON, например страница ошибки прокси) —
+            # это ClientError, а тело, которое не разбирается, — ValueError
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                _LOGGER.error("Ошибка getUpdates: %s, повтор через %.0f с", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, SHARD_MAX_RESTART_DELAY)
+                continue
+            if not result.get("ok"):
+                retry: float = float(
+                    result.get("parameters", {}).get("retry_after", delay)
+                )
+                _LOGGER.error(
+                    "getUpdates: %s, повтор через %.0f с", result.get("description"), retry
+                )
+                await asyncio.sleep(retry)
+                continue
+            delay = 1.0
+            updates: list[dict[str, Any]] = result.get("result") or []
+            if updates:
+                self.route(updates)
+                offset = updates[-1]["update_id"] + 1
+
+    async def _watch(self) -> None:
+        """Перезапускает упавшие рабочие процессы."""
+        while not self._stopping.is_set():
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                uptime: float = time.monotonic() - self._started[index]
+                if uptime >= SHARD_STABLE_AFTER:
+                    self._delays[index] = SHARD_RESTART_DELAY
+                delay: float = self._delays[index]
+                _LOGGER.error(
+                    "Процесс %d завершился с кодом %s, перезапуск через %.0f с",
+                    index,
+                    process.exitcode,
+                    delay,
+                )
+                self._processes[index] = None
+                self._delays[index] = min(delay * 2, SHARD_MAX_RESTART_DELAY)
+                self.restarts[index] += 1
+                asyncio.get_running_loop().call_later(delay, self._respawn, index)
+            await asyncio.sleep(0.5)
+
+    def _respawn(self, index: int) -> None:
+        if not self._stopping.is_set() and self._processes[index] is None:
+            self._spawn(index)
+
+    def stop(self) -> None:
+        """Прекращает получение обновлений и останавливает процессы."""
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """Запускает процессы и раздаёт обновления до вызова stop()."""
+        for index in range(self.shards):
+            self._spawn(index)
+        _LOGGER.info("Запущено процессов: %d", self.shards)
+
+        watch: asyncio.Task[None] = asyncio.create_task(self._watch())
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=SHARD_POLLING_TIMEOUT + 10)
+        ) as session:
+            poll: asyncio.Task[None] = asyncio.create_task(self._poll(session))
+            stopping: asyncio.Task[bool] = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait((poll, stopping), return_when=asyncio.FIRST_COMPLETED)
+            if poll.done() and not self._stopping.is_set():
+                # Без получения обновлений процессы простаивали бы молча
+                _LOGGER.error(
+                    "Получение обновлений остановилось, завершаем работу",
+                    exc_info=poll.exception(),
+                )
+                self.stop()
+            poll.cancel()
+            try:
+                await poll
+            except (asyncio.CancelledError, Exception):
+                # Ошибка уже записана в лог выше
+                pass
+        await watch
+        await self._shutdown()
+
+    async def _shutdown(self) -> None:
+        """Просит процессы дообработать очереди и ждёт их завершения."""
+        for queue in self._queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        deadline: float = time.monotonic() + SHARD_SHUTDOWN_TIMEOUT
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            timeout: float = max(deadline - time.monotonic(), 0.0)
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                _LOGGER.warning("Процесс %d не остановился, завершаем", index)
+                process.terminate()
+                await loop.run_in_executor(None, process.join)
+        _LOGGER.info("Все процессы остановлены")
+
+
+async def run_sharded(config: "Config", shards: int = SHARDS) -> None:
+    """
+    Запускает супервизор и рабочие процессы до SIGTERM/SIGINT.
+
+    Args:
+        config: Настройки бота (передаются рабочим процессам)
+        shards: Число рабочих процессов
+    """
+    supervisor = Supervisor(config, shards)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, supervisor.stop)
+    await supervisor.run()
+
+
+if __name__ == "__main__":
+    from bot import Config, main
+
+    asyncio.run(main(Config.from_env()._replace(mode="sharded")))
@@ -0,0 +1,6 @@
+"""Общие настройки тестов: модули бота лежат в корне репозитория."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,30 @@
+"""Тесты разбора ответов."""
+
+import pytest
+
+from answers import AnswerKind, parse_answer
+
+
+@pytest.mark.parametrize("text", ["²", "3²", "⁴²", "½", "1" * 17 + "²"])
+def test_unicode_non_decimal_digits_are_garbage(text: str) -> None:
+    """Надстрочные цифры и дроби — не число, а не исключение."""
+    assert parse_answer(text).kind is AnswerKind.GARBAGE
+
+
+@pytest.mark.parametrize(
+    ("text", "kind", "value"),
+    [
+        ("12", AnswerKind.INTEGER, 12),
+        ("１２", AnswerKind.INTEGER, 12),
+        ("٣", AnswerKind.INTEGER, 3),
+        ("-3,5", AnswerKind.FLOAT, -3.5),
+        ("=7", AnswerKind.INTEGER, -7),
+        ("/start", AnswerKind.COMMAND, None),
+        ("abc", AnswerKind.GARBAGE, None),
+        ("", AnswerKind.EMPTY, None),
+    ],
+)
+def test_parse_answer(text: str, kind: AnswerKind, value: int | float | None) -> None:
+    parsed = parse_answer(text)
+    assert parsed.kind is kind
+    assert parsed.value == value
@@ -0,0 +1,30 @@
+"""Тесты кэша записей FSM."""
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from fakeredis import FakeAsyncRedis
+
+from cache import CachedStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+def test_size_zero_disables_cache() -> None:
+    """FSM_CACHE_SIZE=0: записи не кэшируются, чтения идут в Redis."""
+
+    async def scenario() -> None:
+        storage = CachedStorage(RedisStorage(FakeAsyncRedis()), size=0)
+        await storage.start()
+        # Даже при подписке на канал кэш не заполняется
+        storage._subscribed = True
+        await storage.set_state(KEY, "solving")
+        await storage.set_data(KEY, {"answer": 4})
+        assert await storage.get_state(KEY) == "solving"
+        assert await storage.get_data(KEY) == {"answer": 4}
+        assert storage.size == 0
+        assert len(storage) == 0
+        await storage.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,117 @@
+"""Тесты бинарного формата данных пользователя."""
+
+import json
+from typing import Any
+
+import pytest
+
+from codec import (
+    MAGIC,
+    RECENT_FIELD,
+    decode_data,
+    encode_data,
+    pack_user_data,
+    unpack_user_data,
+)
+
+RECORD: dict[str, Any] = {
+    "difficulty": 3,
+    "points": 120,
+    "answer": 41,
+    "expression": "12 × 3 + 10 ÷ 2",
+    "user_name": "Маша 🦊",
+}
+
+
+def test_round_trip() -> None:
+    packed = pack_user_data(RECORD)
+    assert packed is not None
+    assert packed[0] == MAGIC
+    assert unpack_user_data(packed) == RECORD
+    assert decode_data(encode_data(RECORD)) == RECORD
+
+
+def test_expression_with_ascii_ops_round_trips() -> None:
+    """Выражение с * или / хранится как есть, без замены на × и ÷."""
+    data = {"expression": "2 * 3 × 4"}
+    packed = pack_user_data(data)
+    assert packed is not None
+    assert unpack_user_data(packed) == data
+
+
+def test_partial_and_empty_records() -> None:
+    for data in ({}, {"points": 0}, {"user_name": ""}):
+        packed = pack_user_data(data)
+        assert packed is not None
+        assert unpack_user_data(packed) == data
+
+
+@pytest.mark.parametrize(
+    ("name", "low", "high"),
+    [
+        ("difficulty", -(2**7), 2**7 - 1),
+        ("points", -(2**15), 2**15 - 1),
+        ("answer", -(2**31), 2**31 - 1),
+    ],
+)
+def test_int_edges(name: str, low: int, high: int) -> None:
+    for value in (low, high):
+        packed = pack_user_data({name: value})
+        assert packed is not None
+        assert unpack_user_data(packed) == {name: value}
+    for value in (low - 1, high + 1):
+        data = {name: value}
+        assert pack_user_data(data) is None
+        encoded = encode_data(data)
+        assert isinstance(encoded, str)
+        assert decode_data(encoded) == data
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"points": 1.5},
+        {"points": True},
+        {"user_name": 7},
+        {"extra": 1},
+        {RECENT_FIELD: [0x10000]},
+        {RECENT_FIELD: [1] * 256},
+    ],
+)
+def test_json_fallback(data: dict[str, Any]) -> None:
+    """Данные вне формата пишутся в JSON и читаются обратно."""
+    assert pack_user_data(data) is None
+    encoded = encode_data(data)
+    assert isinstance(encoded, str)
+    assert decode_data(encoded) == data
+
+
+def test_legacy_json_record() -> None:
+    """Запись в JSON (до бинарного формата) читается из bytes и из str."""
+    raw = json.dumps(RECORD, ensure_ascii=False)
+    assert decode_data(raw) == RECORD
+    assert decode_data(raw.encode("utf-8")) == RECORD
+
+
+def test_json_codec() -> None:
+    assert encode_data(RECORD, codec="json") == json.dumps(RECORD)
+
+
+def test_recent_hashes() -> None:
+    data = {**RECORD, RECENT_FIELD: [0, 1, 0xFFFF]}
+    packed = pack_user_data(data)
+    assert packed is not None
+    assert unpack_user_data(packed) == data
+
+    without = pack_user_data(RECORD)
+    assert without is not None
+    assert RECENT_FIELD not in unpack_user_data(without)
+
+    empty = pack_user_data({RECENT_FIELD: []})
+    assert empty is not None
+    assert unpack_user_data(empty) == {RECENT_FIELD: []}
+
+    full = {RECENT_FIELD: list(range(255))}
+    packed = pack_user_data(full)
+    assert packed is not None
+    assert unpack_user_data(packed) == full
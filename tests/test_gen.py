@@ -0,0 +1,75 @@
+"""Тесты генератора примеров и настроек уровней."""
+
+import importlib.util
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+import gen
+from gen import LevelConfig, load_level_configs
+
+
+def write(tmp_path: Path, levels: object) -> str:
+    path = tmp_path / "levels.json"
+    path.write_text(json.dumps(levels), encoding="utf-8")
+    return str(path)
+
+
+def test_load_level_configs(tmp_path: Path) -> None:
+    path = write(tmp_path, {"3": {"max_operand": 30, "op_weights": [2, 2, 1, 0]}})
+    assert load_level_configs(path) == {
+        3: LevelConfig(max_operand=30, op_weights=(2, 2, 1, 0))
+    }
+
+
+@pytest.mark.parametrize(
+    ("levels", "message"),
+    [
+        ({"9": {}}, "must be in 0..5"),
+        ({"-1": {}}, "must be in 0..5"),
+        ({"hard": {}}, "not an integer"),
+        ({"2": {"max_operands": 30}}, "unknown fields \\['max_operands'\\]"),
+        ({"2": {"mul_left": 5}}, "level '2'"),
+        ({"2": {"mul_left": [11, 20], "mul_right": [11, 20]}}, "must not exceed 10"),
+        ([1, 2], "expected an object"),
+    ],
+)
+def test_load_level_configs_errors(
+    tmp_path: Path, levels: object, message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        load_level_configs(write(tmp_path, levels))
+
+
+def test_one_factor_at_most_ten() -> None:
+    LevelConfig(mul_left=(2, 10), mul_right=(11, 99)).validate()
+    with pytest.raises(ValueError):
+        LevelConfig(mul_right=(2, 11)).validate()
+
+
+def test_import_does_not_read_levels(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Файл GEN_LEVELS читается при первом вызове level_config, не при импорте."""
+    monkeypatch.setenv("GEN_LEVELS", write(tmp_path, {"9": {}}))
+    # Отдельная копия модуля: импортированный gen остаётся прежним
+    spec = importlib.util.spec_from_file_location("gen_lazy", gen.__file__)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with pytest.raises(ValueError, match="must be in 0..5"):
+        module.level_config(3)
+
+
+@pytest.mark.parametrize("difficulty", range(gen.MAX_DIFICULTY + 1))
+def test_generate_matches_legacy(difficulty: int) -> None:
+    """Дерево даёт те же примеры и тот же расход random, что эталон на строках."""
+    for seed in range(2000):
+        random.seed(seed)
+        expected = gen.generate_legacy(difficulty)
+        state = random.getstate()
+        random.seed(seed)
+        assert gen.generate(difficulty) == expected, seed
+        assert random.getstate() == state, seed
@@ -0,0 +1,53 @@
+"""Тесты KeyedEventIsolation."""
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+from ordering import KeyedEventIsolation
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+def test_close_keeps_held_locks() -> None:
+    """close() во время обработки не ломает обновления, держащие блокировку."""
+
+    async def scenario() -> None:
+        isolation = KeyedEventIsolation()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def update() -> None:
+            async with isolation.lock(KEY):
+                started.set()
+                await release.wait()
+
+        first = asyncio.create_task(update())
+        second = asyncio.create_task(update())
+        await started.wait()
+        await isolation.close()
+        release.set()
+        await asyncio.gather(first, second)
+        assert isolation.active_keys == 0
+
+    asyncio.run(scenario())
+
+
+def test_lock_serializes_one_key() -> None:
+    """Обновления одного ключа выполняются по очереди."""
+
+    async def scenario() -> None:
+        isolation = KeyedEventIsolation()
+        order: list[int] = []
+
+        async def update(index: int) -> None:
+            async with isolation.lock(KEY):
+                order.append(index)
+                await asyncio.sleep(0)
+                order.append(index)
+
+        await asyncio.gather(*(update(i) for i in range(3)))
+        assert order == [0, 0, 1, 1, 2, 2]
+        assert isolation.active_keys == 0
+
+    asyncio.run(scenario())
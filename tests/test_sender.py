@@ -0,0 +1,33 @@
+"""Тесты SendScheduler."""
+
+import asyncio
+
+from sender import SendScheduler
+
+
+def test_send_after_stop_does_not_hang() -> None:
+    """После остановки send() и submit() отправляют сообщение сразу."""
+
+    async def scenario() -> None:
+        scheduler = SendScheduler()
+        sent: list[str] = []
+
+        def message(text: str):
+            async def send() -> str:
+                sent.append(text)
+                return text
+
+            return send
+
+        await scheduler.start()
+        assert await scheduler.send(1, message("queued")) == "queued"
+        await scheduler.stop()
+
+        result = await asyncio.wait_for(scheduler.send(1, message("direct")), 1)
+        assert result == "direct"
+        scheduler.submit(1, message("submitted"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert sent == ["queued", "direct", "submitted"]
+
+    asyncio.run(scenario())
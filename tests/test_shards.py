@@ -0,0 +1,52 @@
+"""Тесты супервизора рабочих процессов."""
+
+import asyncio
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot import Config
+from shards import Supervisor
+
+
+def test_poll_survives_non_json_responses() -> None:
+    """Ответ прокси не в JSON не останавливает получение обновлений."""
+
+    async def scenario() -> None:
+        responses: list[web.Response] = [
+            web.Response(
+                status=502, text="<html>Bad Gateway</html>", content_type="text/html"
+            ),
+            web.Response(text="{not json", content_type="application/json"),
+            web.json_response({"ok": True, "result": [{"update_id": 7}]}),
+        ]
+
+        async def get_updates(request: web.Request) -> web.Response:
+            if responses:
+                return responses.pop(0)
+            await asyncio.sleep(10)
+            return web.json_response({"ok": True, "result": []})
+
+        app = web.Application()
+        app.router.add_post("/botTOKEN/getUpdates", get_updates)
+        server = TestServer(app)
+        await server.start_server()
+
+        supervisor = Supervisor(
+            Config(token="TOKEN"), shards=1, api=str(server.make_url(""))
+        )
+        routed: list[dict[str, Any]] = []
+
+        def route(updates: list[dict[str, Any]]) -> None:
+            routed.extend(updates)
+            supervisor.stop()
+
+        supervisor.route = route  # type: ignore[method-assign]
+        async with aiohttp.ClientSession() as session:
+            await asyncio.wait_for(supervisor._poll(session), 10)
+        await server.close()
+        assert routed == [{"update_id": 7}]
+
+    asyncio.run(scenario())
@@ -0,0 +1,62 @@
+"""Тесты webhook-сервера."""
+
+import asyncio
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestServer
+
+from webhook import create_webhook_app
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "text": "42",
+    },
+}
+
+
+def test_shutdown_waits_for_update_in_flight() -> None:
+    """Диспетчер останавливается только после обновления в обработке."""
+
+    async def scenario() -> None:
+        events: list[str] = []
+        started = asyncio.Event()
+        release = asyncio.Event()
+        dp = Dispatcher()
+
+        @dp.message()
+        async def handler(message: Message) -> None:
+            started.set()
+            await release.wait()
+            events.append("handled")
+
+        async def on_shutdown() -> None:
+            events.append("shutdown")
+
+        dp.shutdown.register(on_shutdown)
+        bot = Bot("42:TEST")
+        server = TestServer(
+            create_webhook_app(dp, bot, secret_token=None, webhook_url=None)
+        )
+        await server.start_server()
+        async with aiohttp.ClientSession() as session:
+            request = asyncio.create_task(
+                session.post(server.make_url("/webhook"), json=UPDATE)
+            )
+            await started.wait()
+            closing = asyncio.create_task(server.close())
+            await asyncio.sleep(0.1)
+            assert events == []
+            release.set()
+            response = await request
+            await closing
+            assert response.status == 200
+        assert events == ["handled", "shutdown"]
+        assert bot.session._session is None or bot.session._session.closed
+
+    asyncio.run(scenario())
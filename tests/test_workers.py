@@ -0,0 +1,40 @@
+"""Тесты генерации пачек примеров."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import gen
+from workers import generate_batch
+
+
+def test_generate_batch_calls_generator_once() -> None:
+    """Пачка генерируется одним вызовом generate_many."""
+    calls: list[int] = []
+
+    def generator(difficulty: int, count: int) -> list[tuple[str, int]]:
+        calls.append(count)
+        return gen.generate_many(difficulty, count)
+
+    batch = generate_batch(generator, 2, 20)
+    assert calls == [20]
+    assert len(batch.problems) == len(batch.durations) == 20
+
+
+def test_generate_batch_stats_per_thread() -> None:
+    """Параллельные пачки не учитывают отказы друг друга."""
+    seeds = range(4)
+    barrier = threading.Barrier(len(seeds))
+
+    def run(seed: int, wait: bool) -> int:
+        def generator(difficulty: int, n: int) -> list[tuple[str, int]]:
+            if wait:
+                barrier.wait()
+            return gen.generate_many(difficulty, n, seed=seed)
+
+        # Уровень 3 объединяет поддеревья, поэтому отказы есть
+        return generate_batch(generator, 3, 500).rejections
+
+    expected = [run(seed, False) for seed in seeds]
+    assert all(rejections > 0 for rejections in expected)
+    with ThreadPoolExecutor(len(seeds)) as executor:
+        assert list(executor.map(run, seeds, [True] * len(seeds))) == expected
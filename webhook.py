@@ -0,0 +1,171 @@
+"""
+Режим webhook: aiohttp-сервер, принимающий обновления от Telegram.
+
+Альтернатива long polling, позволяющая запускать несколько реплик бота
+за балансировщиком нагрузки. Включается переменной окружения BOT_MODE=webhook.
+"""
+
+import asyncio
+import logging
+import signal
+from collections.abc import Awaitable, Callable
+from os import getenv
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Публичный адрес, который регистрируется в Telegram (без пути);
+# если не задан, setWebhook не вызывается (например, за внешним прокси)
+WEBHOOK_URL = getenv("WEBHOOK_URL")
+
+# Путь, по которому сервер принимает обновления
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET")
+
+# Адрес и порт HTTP-сервера
+WEBHOOK_HOST = getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(getenv("WEBHOOK_PORT", "8080"))
+
+# Максимум одновременно обрабатываемых обновлений
+WEBHOOK_MAX_CONCURRENCY = int(getenv("WEBHOOK_MAX_CONCURRENCY", "100"))
+
+# Сколько секунд ждать завершения обновлений в обработке при остановке
+WEBHOOK_SHUTDOWN_TIMEOUT = float(getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "30"))
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+# ============================================================================
+# Приложение
+# ============================================================================
+
+
+def concurrency_limit(limit: int) -> Callable[[web.Request, Handler], Awaitable[web.StreamResponse]]:
+    """
+    aiohttp middleware, ограничивающий число одновременно обрабатываемых запросов.
+
+    Обновления обрабатываются в рамках запроса, поэтому лишние запросы ждут
+    своей очереди, а Telegram не присылает новые, пока не получит ответ.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    @web.middleware
+    async def middleware(request: web.Request, handler: Handler) -> web.StreamResponse:
+        async with semaphore:
+            return await handler(request)
+
+    return middleware
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    path: str = WEBHOOK_PATH,
+    secret_token: str | None = WEBHOOK_SECRET,
+    max_concurrency: int = WEBHOOK_MAX_CONCURRENCY,
+    webhook_url: str | None = WEBHOOK_URL,
+) -> web.Application:
+    """
+    Создаёт aiohttp-приложение, передающее обновления в диспетчер.
+
+    Приложение можно запускать как обычный сервер или поднимать в тестах
+    через aiohttp TestClient и отправлять ему обновления POST-запросами.
+
+    Args:
+        dp: Диспетчер с зарегистрированными обработчиками
+        bot: Экземпляр бота
+        path: Путь для приёма обновлений
+        secret_token: Ожидаемый секрет (None — без проверки)
+        max_concurrency: Максимум одновременно обрабатываемых обновлений
+        webhook_url: Публичный адрес для setWebhook (None — не регистрировать)
+
+    Returns:
+        web.Application: Настроенное приложение
+    """
+    app = web.Application(middlewares=[concurrency_limit(max_concurrency)])
+
+    # Обработка внутри запроса: сервер дожидается её при остановке
+    request_handler = SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,
+        secret_token=secret_token,
+    )
+    # Не register() и setup_application(): они закрывают сессию бота
+    # и останавливают диспетчер в on_shutdown, то есть до того, как сервер
+    # дождётся обновлений в обработке, и ответы на них уже не отправляются
+    app.router.add_route("POST", path, request_handler.handle)
+    workflow_data: dict[str, Any] = {
+        "app": app,
+        "dispatcher": dp,
+        **dp.workflow_data,
+        "bot": bot,
+    }
+
+    async def emit_startup(_: web.Application) -> None:
+        await dp.emit_startup(**workflow_data)
+
+    async def emit_shutdown(_: web.Application) -> None:
+        # on_cleanup вызывается после завершения запросов в обработке
+        try:
+            await dp.emit_shutdown(**workflow_data)
+        finally:
+            await request_handler.close()
+
+    app.on_startup.append(emit_startup)
+    app.on_cleanup.append(emit_shutdown)
+
+    if webhook_url:
+
+        async def register_webhook(_: web.Application) -> None:
+            await bot.set_webhook(
+                f"{webhook_url.rstrip('/')}{path}",
+                secret_token=secret_token,
+                max_connections=min(max_concurrency, 100),
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            _LOGGER.info("Webhook зарегистрирован: %s%s", webhook_url, path)
+
+        app.on_startup.append(register_webhook)
+
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Запускает webhook-сервер и работает до SIGINT/SIGTERM.
+
+    При остановке сервер перестаёт принимать соединения и ждёт до
+    WEBHOOK_SHUTDOWN_TIMEOUT секунд завершения обновлений в обработке;
+    только после этого останавливается диспетчер (планировщик отправки,
+    пул примеров, хранилище FSM) и закрывается сессия бота.
+    """
+    app: web.Application = create_webhook_app(dp, bot)
+    runner = web.AppRunner(app, shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    _LOGGER.info(
+        "Webhook-сервер слушает %s:%d%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        _LOGGER.info("Остановка webhook-сервера, ждём обновления в обработке")
+    finally:
+        await runner.cleanup()
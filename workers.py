@@ -0,0 +1,170 @@
+"""
+Исполнитель для генерации примеров вне event loop.
+
+По умолчанию генерация идёт в основном процессе (в пуле потоков asyncio).
+Переменная окружения GEN_EXECUTOR=process включает ProcessPoolExecutor,
+чтобы генерация использовала несколько ядер и не блокировала бота.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from os import getenv
+from typing import Any, NamedTuple, TypeVar
+
+from bank import install_bank
+from gen import (
+    DEFAULT_GENERATOR,
+    MAX_DIFICULTY,
+    SamplingStats,
+    generate,
+    thread_stats,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# ============================================================================
+# Конфигурация
+# ============================================================================
+
+# Режим выполнения: "inline" (основной процесс) или "process" (пул процессов)
+GEN_EXECUTOR = getenv("GEN_EXECUTOR", "inline")
+
+# Размер пула процессов
+GEN_WORKERS = int(getenv("GEN_WORKERS", str(os.cpu_count() or 1)))
+
+
+# ============================================================================
+# Функции, выполняемые в рабочих процессах
+# ============================================================================
+
+
+def init_worker() -> None:
+    """
+    Инициализирует рабочий процесс.
+
+    После fork все процессы наследуют одно и то же состояние random,
+    поэтому каждый рабочий процесс пересевает генератор своей энтропией.
+    Процесс, запущенный без fork, сам открывает банк примеров (PROBLEM_BANK).
+    """
+    random.seed(os.urandom(16) + os.getpid().to_bytes(4, "little"))
+    if DEFAULT_GENERATOR.bank is None:
+        install_bank()
+
+
+class GeneratedBatch(NamedTuple):
+    """Пачка примеров со статистикой генерации."""
+
+    problems: list[tuple[str, int]]
+    durations: list[float]
+    rejections: int
+    retries: int
+
+
+def generate_batch(
+    generator: Callable[[int, int], list[tuple[str, int]]],
+    difficulty: int,
+    count: int,
+) -> GeneratedBatch:
+    """
+    Генерирует count примеров одним вызовом generator.
+
+    Пачка генерируется целиком (generate_many настраивается и логирует один
+    раз на пачку), поэтому время одного примера — среднее по пачке.
+    Статистика считается по приращению счётчиков потока, где шла генерация
+    (gen.thread_stats), поэтому верна и при параллельных пачках в пуле
+    потоков, и в пуле процессов.
+
+    Args:
+        generator: Функция (difficulty, n) -> список примеров
+        difficulty: Уровень сложности
+        count: Число примеров
+
+    Returns:
+        GeneratedBatch: Примеры, длительности (секунды), отказы и повторы
+    """
+    stats: SamplingStats = thread_stats()
+    rejections: int = sum(stats.rejections.values())
+    retries: int = stats.retries[difficulty]
+    start: float = time.perf_counter()
+    problems: list[tuple[str, int]] = generator(difficulty, count)
+    elapsed: float = time.perf_counter() - start
+    durations: list[float] = [elapsed / len(problems)] * len(problems)
+    return GeneratedBatch(
+        problems,
+        durations,
+        sum(stats.rejections.values()) - rejections,
+        stats.retries[difficulty] - retries,
+    )
+
+
+def warm_up() -> int:
+    """Генерирует по примеру каждого уровня, прогревая импорт и кэши процесса."""
+    for difficulty in range(MAX_DIFICULTY):
+        generate(difficulty)
+    return os.getpid()
+
+
+# ============================================================================
+# Исполнитель
+# ============================================================================
+
+
+class GenerationExecutor:
+    """
+    Выполняет CPU-задачи генерации в потоке или в пуле процессов.
+
+    Attributes:
+        mode: "inline" или "process"
+        workers: Размер пула процессов (для режима "process")
+    """
+
+    def __init__(self, mode: str = GEN_EXECUTOR, workers: int = GEN_WORKERS) -> None:
+        if mode not in ("inline", "process"):
+            raise ValueError(f"Unknown GEN_EXECUTOR mode: {mode}")
+        self.mode = mode
+        self.workers = max(workers, 1)
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Выполняет func(*args) вне event loop и возвращает результат.
+
+        В режиме "process" функция и аргументы должны сериализоваться pickle.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def generate(self, difficulty: int) -> tuple[str, int]:
+        """Генерирует один пример заданной сложности."""
+        return await self.run(generate, difficulty)
+
+    async def start(self) -> None:
+        """Создаёт и прогревает пул процессов (в режиме "process")."""
+        if self.mode != "process" or self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_worker
+        )
+        pids: list[int] = await asyncio.gather(
+            *(self.run(warm_up) for _ in range(self.workers))
+        )
+        _LOGGER.info(
+            "Пул генерации запущен: %d из %d процессов", len(set(pids)), self.workers
+        )
+
+    async def stop(self) -> None:
+        """Останавливает пул процессов."""
+        if self._executor is None:
+            return
+        executor: ProcessPoolExecutor = self._executor
+        self._executor = None
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )